@@ -4,6 +4,8 @@ import numpy as np
 import torch
 from torch.utils.data import Dataset
 
+from ..leaf_shards import open_shards
+
 
 def read_data(train_data_dir,test_data_dir):
     users = []
@@ -60,6 +62,11 @@ def batch_data(data, batch_size):
 
 
 def load_partition_data_HPWREN(batch_size,dataset_dir):
+    # memory-mapped shards written by leaf_shards.py, if any
+    shards = open_shards(dataset_dir)
+    if shards is not None:
+        return shards.partition(batch_size, 6)
+
     train_path = dataset_dir+"/train"
     test_path = dataset_dir+"/test"
     groups, users, train_data, test_data = read_data(train_path, test_path)
@@ -0,0 +1,206 @@
+"""
+    Pre-processed, memory-mapped shards of LEAF JSON datasets (shakespeare, HAR, HPWREN).
+
+    convert_leaf() parses the train / test JSON files once, applies the
+    dataset's x / y preprocessing (e.g. word_to_indices for shakespeare) and
+    writes per split one contiguous x and y .npy array with the samples of all
+    clients, plus the per-client offsets, to <dataset_dir>/shards. The samples
+    of every client are stored in the order batch_data() shuffles them into
+    (np.random.seed(100)), so a client's batches are plain slices.
+
+    open_shards() memory-maps them; the load_partition_data_* functions of the
+    three datasets use the shards when present and up to date with the JSON
+    files, and fall back to parsing the JSON otherwise.
+
+    usage (from the FedML directory):
+        python -m fedml_api.data_preprocessing.leaf_shards --dataset shakespeare --data_dir ./data/shakespeare
+"""
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import torch
+
+SHARD_DIR = "shards"
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+SPLITS = ("train", "test")
+
+
+def _source_files(dataset_dir):
+    """ (split, file name, size, mtime) of the JSON files, to detect stale shards """
+    files = []
+    for split in SPLITS:
+        split_dir = os.path.join(dataset_dir, split)
+        if not os.path.isdir(split_dir):
+            continue
+        for f in sorted(os.listdir(split_dir)):
+            if f.endswith(".json"):
+                stat = os.stat(os.path.join(split_dir, f))
+                files.append([split, f, stat.st_size, stat.st_mtime_ns])
+    return files
+
+
+def _shuffle_order(n):
+    # the permutation batch_data() applies to a client's samples
+    order = np.arange(n)
+    np.random.seed(100)
+    np.random.shuffle(order)
+    return order
+
+
+class LeafShards(object):
+    """ memory-mapped x / y arrays of a converted dataset and the per-client offsets """
+
+    def __init__(self, shard_dir, index):
+        self.shard_dir = shard_dir
+        self.users = index["users"]
+        self.splits = {}
+        for split in SPLITS:
+            # copy-on-write, so torch.from_numpy gets writable views without reading the file
+            x = np.load(os.path.join(shard_dir, split + ".x.npy"), mmap_mode="c")
+            y = np.load(os.path.join(shard_dir, split + ".y.npy"), mmap_mode="c")
+            offsets = np.load(os.path.join(shard_dir, split + ".offsets.npy"))
+            self.splits[split] = (x, y, offsets)
+
+    def client_num(self):
+        return len(self.users)
+
+    def sample_num(self, split, client_idx):
+        offsets = self.splits[split][2]
+        return int(offsets[client_idx + 1] - offsets[client_idx])
+
+    def batches(self, split, client_idx, batch_size):
+        """ [(x, y)] tensors of one client, views of the memory-mapped arrays """
+        x, y, offsets = self.splits[split]
+        start, end = int(offsets[client_idx]), int(offsets[client_idx + 1])
+        return [(torch.from_numpy(x[i:min(i + batch_size, end)]), torch.from_numpy(y[i:min(i + batch_size, end)]))
+                for i in range(start, end, batch_size)]
+
+    def partition(self, batch_size, output_dim):
+        """ the return value of the load_partition_data_* functions """
+        train_data_local_dict = dict()
+        test_data_local_dict = dict()
+        train_data_local_num_dict = dict()
+        train_data_global = list()
+        test_data_global = list()
+        for client_idx in range(self.client_num()):
+            train_data_local_num_dict[client_idx] = self.sample_num("train", client_idx)
+            train_batch = self.batches("train", client_idx, batch_size)
+            test_batch = self.batches("test", client_idx, batch_size)
+            train_data_local_dict[client_idx] = train_batch
+            test_data_local_dict[client_idx] = test_batch
+            train_data_global += train_batch
+            test_data_global += test_batch
+        train_data_num = int(self.splits["train"][2][-1])
+        test_data_num = int(self.splits["test"][2][-1])
+        return (
+            self.client_num(),
+            train_data_num,
+            test_data_num,
+            train_data_global,
+            test_data_global,
+            train_data_local_num_dict,
+            train_data_local_dict,
+            test_data_local_dict,
+            output_dim,
+        )
+
+
+def open_shards(dataset_dir):
+    """ LeafShards of dataset_dir, None if it has not been converted or the JSON files changed since """
+    shard_dir = os.path.join(dataset_dir, SHARD_DIR)
+    index_path = os.path.join(shard_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        index = json.load(f)
+    if index.get("version") != FORMAT_VERSION:
+        logging.warning("leaf shards in %s have format version %s, expected %d; reading the JSON files" % (
+            shard_dir, index.get("version"), FORMAT_VERSION))
+        return None
+    sources = _source_files(dataset_dir)
+    # without the JSON files around, the shards are all there is
+    if sources and sources != index["sources"]:
+        logging.warning("leaf shards in %s are older than the JSON files; reading the JSON files" % shard_dir)
+        return None
+    logging.info("loading memory-mapped leaf shards from %s" % shard_dir)
+    return LeafShards(shard_dir, index)
+
+
+def convert_leaf(dataset_dir, read_data, process_x=None, process_y=None):
+    """
+        Write the shards of dataset_dir.
+
+        read_data(train_dir, test_dir) -> (users, train_data, test_data) with the
+        users in client index order; process_x / process_y map a list of raw
+        samples to a list of processed ones, as in batch_data().
+    """
+    shard_dir = os.path.join(dataset_dir, SHARD_DIR)
+    os.makedirs(shard_dir, exist_ok=True)
+    sources = _source_files(dataset_dir)
+    users, train_data, test_data = read_data(os.path.join(dataset_dir, "train"), os.path.join(dataset_dir, "test"))
+
+    for split, split_data in (("train", train_data), ("test", test_data)):
+        xs, ys, offsets = [], [], [0]
+        for u in users:
+            order = _shuffle_order(len(split_data[u]["x"]))
+            raw_x = [split_data[u]["x"][i] for i in order]
+            raw_y = [split_data[u]["y"][i] for i in order]
+            xs.extend(process_x(raw_x) if process_x else raw_x)
+            ys.extend(process_y(raw_y) if process_y else raw_y)
+            offsets.append(len(xs))
+        for name, array in ((".x.npy", np.asarray(xs)), (".y.npy", np.asarray(ys)),
+                            (".offsets.npy", np.asarray(offsets, dtype=np.int64))):
+            path = os.path.join(shard_dir, split + name)
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+        logging.info("leaf shards: %s, %d clients, %d samples" % (split, len(users), offsets[-1]))
+
+    # the index is written last, shards without it are incomplete
+    index_path = os.path.join(shard_dir, INDEX_FILE)
+    with open(index_path + ".tmp", "w") as f:
+        json.dump({"version": FORMAT_VERSION, "users": users, "sources": sources}, f)
+    os.replace(index_path + ".tmp", index_path)
+    return shard_dir
+
+
+def _readers():
+    from .shakespeare import data_loader as shakespeare
+    from .HAR import data_loader as har
+    from .HPWREN import data_loader as hpwren
+
+    def shakespeare_read(train_dir, test_dir):
+        users, _, train_data, test_data = shakespeare.read_data(train_dir, test_dir)
+        return users, train_data, test_data
+
+    def har_read(module):
+        def read(train_dir, test_dir):
+            _, users, train_data, test_data = module.read_data(train_dir, test_dir)
+            return users, train_data, test_data
+        return read
+
+    # dataset -> (read_data, process_x, process_y)
+    return {
+        "shakespeare": (shakespeare_read, shakespeare.process_x, shakespeare.process_y),
+        "har": (har_read(har), None, None),
+        "hpwren": (har_read(hpwren), None, None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, required=True, choices=['shakespeare', 'har', 'hpwren'])
+    parser.add_argument('--data_dir', type=str, required=True, help='directory with the train and test JSON dirs')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    read_data, process_x, process_y = _readers()[args.dataset]
+    print(convert_leaf(args.data_dir, read_data, process_x, process_y))
+
+
+if __name__ == '__main__':
+    main()
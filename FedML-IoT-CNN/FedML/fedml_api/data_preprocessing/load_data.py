@@ -9,6 +9,9 @@ from .cifar10.data_loader import load_cifar10_data, get_dataloader_CIFAR10, get_
 from .shakespeare.data_loader import get_shakespeare_dataloader
 from .HAR.data_loader import get_HAR_dataloader
 from .HPWREN.data_loader import get_HPWREN_dataloader
+from .lazy_loaders import LazyLoaderDict, subset_loader_factory
+from .partitioner import Partitioner, partition_counts
+from .partition_plan import PartitionPlanCache, plan_key
 
 
 def uniform(N, k):
@@ -152,12 +155,12 @@ class NonIIDLoader(Loader):
 
 
 def record_net_data_stats(y_train, net_dataidx_map):
+    # all clients' class counts in one bincount pass
+    clients, labels, counts = partition_counts(y_train, net_dataidx_map)
     net_cls_counts = {}
-
-    for net_i, dataidx in net_dataidx_map.items():
-        unq, unq_cnt = np.unique(y_train[dataidx], return_counts=True)
-        tmp = {unq[i]: unq_cnt[i] for i in range(len(unq))}
-        net_cls_counts[net_i] = tmp
+    for row, net_i in enumerate(clients):
+        present = np.nonzero(counts[row])[0]
+        net_cls_counts[net_i] = {labels[c]: counts[row, c] for c in present}
     logging.debug('Data statistics: %s' % str(net_cls_counts))
     return net_cls_counts
 
@@ -165,7 +168,7 @@ def record_net_data_stats(y_train, net_dataidx_map):
 def partition_data(dataset, datadir, partition_method, partition_label,
                    partition_alpha, partition_secondary,
                    partition_min_cls, partition_max_cls,
-                   n_clients, data_size_per_client):
+                   n_clients, data_size_per_client, vectorized=True, seed=None, plan_dir=None):
     """
     Partition data to IID or non-IID distribution on each client
     Assign a static dataset to each client
@@ -183,6 +186,10 @@ def partition_data(dataset, datadir, partition_method, partition_label,
         partition_max_cls: used in noniid loader, the max number of classes on one client
         n_clients: int, the total number of clients
         data_size_per_client: int, the total number of samples on each client
+        vectorized: True to use the NumPy Partitioner, False for the list-based Loaders
+        seed: seed of the Partitioner, drawn from np.random if None
+        plan_dir: directory of the partition plan cache; the vectorized partition is
+            stored there once per configuration and loaded on later runs (seed None is seed 0)
     Return:
         X_train, y_train: the whole training dataset of samples and labels
         X_test, y_test: the whole testing dataset of samples and labels
@@ -200,6 +207,24 @@ def partition_data(dataset, datadir, partition_method, partition_label,
     else:
         raise ValueError("dataset {} not supported!".format(dataset))
 
+    if vectorized:
+        def build():
+            return _partition_vectorized(
+                y_train, y_test, partition_method, partition_label, partition_alpha, partition_secondary,
+                partition_min_cls, partition_max_cls, n_clients, data_size_per_client, seed)
+
+        if plan_dir is not None:
+            seed = 0 if seed is None else seed
+            key = plan_key(dataset, partition_method, partition_label, partition_alpha, partition_secondary,
+                           partition_min_cls, partition_max_cls, n_clients, data_size_per_client, seed)
+            partition = PartitionPlanCache(plan_dir).get_or_create(key, build)
+        else:
+            partition = build()
+        net_dataidx_map = partition.dataidx_map()
+        traindata_cls_counts = partition.cls_counts()
+        logging.debug('Data statistics: %s' % str(traindata_cls_counts))
+        return X_train, y_train, X_test, y_test, net_dataidx_map, traindata_cls_counts
+
     if partition_method == "iid": # IID data distribution
         loader = Loader(X_train, y_train, X_test, y_test)
         net_dataidx_map = {}
@@ -245,7 +270,34 @@ def partition_data(dataset, datadir, partition_method, partition_label,
     return X_train, y_train, X_test, y_test, net_dataidx_map, traindata_cls_counts
 
 
-def get_dataloader(dataset, datadir, train_bs, test_bs, dataidxs=None):
+def _partition_vectorized(y_train, y_test, partition_method, partition_label,
+                          partition_alpha, partition_secondary,
+                          partition_min_cls, partition_max_cls,
+                          n_clients, data_size_per_client, seed=None):
+    """ the Partition of partition_data from the Partitioner """
+    labels = list(np.sort(np.unique(y_test)))
+    partitioner = Partitioner(y_train, labels, seed)
+    if partition_method == "iid":
+        counts = partitioner.iid_counts(n_clients, data_size_per_client)
+    elif partition_method == "bias":
+        label_weights = {
+            "uniform": uniform(n_clients, len(labels)),
+            "normal": normal(n_clients, len(labels))
+        }[partition_label]
+        counts = partitioner.bias_counts(n_clients, data_size_per_client, partition_alpha,
+                                         partition_secondary, label_weights)
+    elif partition_method == "noniid":
+        counts = partitioner.noniid_counts(n_clients, data_size_per_client, partition_min_cls, partition_max_cls)
+    else:
+        raise ValueError("partition method {} not supported!".format(partition_method))
+
+    return partitioner.extract(counts)
+
+
+def get_dataloader(dataset, datadir, train_bs, test_bs, dataidxs=None, tensor_cache=None):
+    # pre-normalized tensors served batch-wise, see tensor_cache.py
+    if tensor_cache is not None and tensor_cache.supports(dataset):
+        return tensor_cache.get_dataloader(dataset, datadir, train_bs, test_bs, dataidxs)
     if dataset == "mnist":
         dataloader = get_dataloader_MNIST(datadir, train_bs, test_bs, dataidxs)
     elif dataset == "fashionmnist":
@@ -347,19 +399,33 @@ def load_partition_data_HPWREN(batch_size,dataset_dir):
 def load_partition_data(dataset, data_dir, partition_method, partition_label,
                         partition_alpha, partition_secondary,
                         partition_min_cls, partition_max_cls,
-                        client_number, batch_size, data_size_per_client):
+                        client_number, batch_size, data_size_per_client,
+                        lazy_loaders=True, max_cached_loaders=64,
+                        partition_seed=None, partition_plan_dir=None, tensor_cache=None):
+    """
+    With lazy_loaders, train_data_local_dict builds a client's loader on first
+    access, as an index view of the one global train dataset, and keeps at most
+    max_cached_loaders of them; test_data_local_dict hands every client the
+    global test loader (the local test data is the whole test set). Otherwise
+    all loaders are built up front, each with its own dataset.
+    partition_seed and partition_plan_dir are the seed and plan_dir of partition_data.
+    tensor_cache: a TensorCache to serve pre-normalized tensors batch-wise, None for the
+    per-sample transform pipelines.
+    """
     # Partition the data
     X_train, y_train, X_test, y_test, net_dataidx_map, traindata_cls_counts = \
         partition_data(dataset, data_dir, partition_method, partition_label,
                        partition_alpha, partition_secondary,
                        partition_min_cls, partition_max_cls,
-                       client_number, data_size_per_client)
+                       client_number, data_size_per_client,
+                       seed=partition_seed, plan_dir=partition_plan_dir)
 
     class_num = len(np.unique(y_train))
     logging.info("traindata_cls_counts = " + str(traindata_cls_counts))
     train_data_num = sum([len(net_dataidx_map[r]) for r in range(client_number)])
 
-    train_data_global, test_data_global = get_dataloader(dataset, data_dir, batch_size, batch_size)
+    train_data_global, test_data_global = get_dataloader(dataset, data_dir, batch_size, batch_size,
+                                                         tensor_cache=tensor_cache)
     logging.info("train_dl_global number = " + str(len(train_data_global)))
     logging.info("test_dl_global number = " + str(len(test_data_global)))
     test_data_num = len(test_data_global)
@@ -369,6 +435,18 @@ def load_partition_data(dataset, data_dir, partition_method, partition_label,
     train_data_local_dict = dict()
     test_data_local_dict = dict()
 
+    if lazy_loaders:
+        for client_idx in range(client_number):
+            data_local_num_dict[client_idx] = len(net_dataidx_map[client_idx])
+        train_data_local_dict = LazyLoaderDict(
+            range(client_number),
+            subset_loader_factory(train_data_global.dataset, net_dataidx_map, batch_size),
+            max_cached_loaders)
+        test_data_local_dict = LazyLoaderDict(range(client_number), lambda client_idx: test_data_global,
+                                              max_cached_loaders)
+        return train_data_num, test_data_num, train_data_global, test_data_global, \
+               data_local_num_dict, train_data_local_dict, test_data_local_dict, class_num
+
     for client_idx in range(client_number):
         dataidxs = net_dataidx_map[client_idx]
         local_data_num = len(dataidxs)
@@ -380,16 +458,27 @@ def load_partition_data(dataset, data_dir, partition_method, partition_label,
         # test_data_local: the total test dataset, each batch is of batch_size
         train_data_local, test_data_local = get_dataloader(dataset, data_dir,
                                                            batch_size, batch_size,
-                                                           dataidxs)
+                                                           dataidxs, tensor_cache)
         logging.info("client_idx = %d, batch_num_train_local = %d, batch_num_test_local = %d" % (
             client_idx, len(train_data_local), len(test_data_local)))
         train_data_local_dict[client_idx] = train_data_local
         test_data_local_dict[client_idx] = test_data_local
     return train_data_num, test_data_num, train_data_global, test_data_global, \
            data_local_num_dict, train_data_local_dict, test_data_local_dict, class_num
-           
-           
-           
-           
-           
-           
+
+
+def load_partition_data_client(dataset, data_dir, client_idx, dataidxs, batch_size, train_data_num, class_num,
+                               tensor_cache=None):
+    """
+    load_partition_data for one client whose sample indexes come from a partition
+    plan: only its own train loader and the test loader are built, nothing is
+    partitioned. The dicts hold client_idx alone and train_data_global is None.
+    """
+    train_data_local, test_data_local = get_dataloader(dataset, data_dir, batch_size, batch_size, dataidxs,
+                                                       tensor_cache)
+    logging.info("client_idx = %d, local_sample_number = %d" % (client_idx, len(dataidxs)))
+    data_local_num_dict = {client_idx: len(dataidxs)}
+    train_data_local_dict = {client_idx: train_data_local}
+    test_data_local_dict = {client_idx: test_data_local}
+    return train_data_num, len(test_data_local), None, test_data_local, \
+           data_local_num_dict, train_data_local_dict, test_data_local_dict, class_num
@@ -0,0 +1,114 @@
+"""
+    Partition plans: the partitioner output persisted once, keyed by a hash of
+    the partition configuration, so that the server and every client use the
+    same client -> sample index assignment without re-running partition_data.
+
+    File layout (little endian):
+        header  "FMLP", version u8, index dtype u8 (4 or 8 bytes), n_clients u64,
+                n_labels u64, n_indices u64
+        labels  n_labels int64
+        offsets (n_clients + 1) uint64
+        counts  n_clients x n_labels uint32, the class counts of every client
+        indices n_indices uint32 / uint64, client-major
+
+    client_slice() reads one client's indexes with a seek, so the executor
+    can serve them without loading the whole plan.
+"""
+import hashlib
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+from .partitioner import Partition
+
+MAGIC = b"FMLP"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBQQQ")
+PLAN_SUFFIX = ".plan"
+
+
+def plan_key(dataset, partition_method, partition_label, partition_alpha, partition_secondary,
+             partition_min_cls, partition_max_cls, n_clients, data_size_per_client, seed):
+    """ hash of everything the partition depends on """
+    config = [str(dataset), str(partition_method), str(partition_label), float(partition_alpha),
+              bool(partition_secondary), int(partition_min_cls), int(partition_max_cls), int(n_clients),
+              int(data_size_per_client), int(seed), VERSION]
+    return hashlib.sha1(json.dumps(config).encode('utf-8')).hexdigest()[:20]
+
+
+def save_plan(path, partition):
+    indices = np.asarray(partition.indices)
+    index_dtype = np.uint32 if len(indices) == 0 or indices.max() < 2 ** 32 else np.uint64
+    labels = np.asarray(partition.labels, dtype=np.int64)
+    offsets = np.asarray(partition.offsets, dtype=np.uint64)
+    counts = np.asarray(partition.counts, dtype=np.uint32)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, np.dtype(index_dtype).itemsize, len(offsets) - 1,
+                             len(labels), len(indices)))
+        for array in (labels, offsets, counts, indices.astype(index_dtype)):
+            f.write(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<")).tobytes())
+    os.replace(tmp_path, path)
+
+
+def _read_header(f):
+    magic, version, index_size, n_clients, n_labels, n_indices = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a version {} partition plan".format(VERSION))
+    return index_size, n_clients, n_labels, n_indices
+
+
+def load_plan(path):
+    """ the Partition stored at path """
+    with open(path, "rb") as f:
+        index_size, n_clients, n_labels, n_indices = _read_header(f)
+        labels = np.fromfile(f, dtype="<i8", count=n_labels)
+        offsets = np.fromfile(f, dtype="<u8", count=n_clients + 1).astype(np.int64)
+        counts = np.fromfile(f, dtype="<u4", count=n_clients * n_labels).reshape(n_clients, n_labels)
+        indices = np.fromfile(f, dtype="<u4" if index_size == 4 else "<u8", count=n_indices).astype(np.int64)
+    return Partition(indices, offsets, counts.astype(np.int64), labels.tolist())
+
+
+def client_slice(path, client_idx):
+    """ the sample indexes of one client, without reading the rest of the plan """
+    with open(path, "rb") as f:
+        index_size, n_clients, n_labels, n_indices = _read_header(f)
+        if not 0 <= client_idx < n_clients:
+            raise IndexError("client {} not in a plan of {} clients".format(client_idx, n_clients))
+        f.seek(_HEADER.size + 8 * n_labels + 8 * client_idx)
+        start, end = np.fromfile(f, dtype="<u8", count=2)
+        indices_start = _HEADER.size + 8 * n_labels + 8 * (n_clients + 1) + 4 * n_clients * n_labels
+        f.seek(indices_start + index_size * int(start))
+        return np.fromfile(f, dtype="<u4" if index_size == 4 else "<u8", count=int(end - start)).astype(np.int64)
+
+
+class PartitionPlanCache(object):
+    """ partition plans in plan_dir, one <key>.plan file per configuration """
+
+    def __init__(self, plan_dir):
+        self.plan_dir = plan_dir
+        os.makedirs(plan_dir, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.plan_dir, key + PLAN_SUFFIX)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def get_or_create(self, key, build):
+        """ the stored Partition of key, or build() stored under key """
+        path = self.path(key)
+        if os.path.exists(path):
+            logging.info("partition plan %s loaded from %s" % (key, path))
+            return load_plan(path)
+        partition = build()
+        save_plan(path, partition)
+        logging.info("partition plan %s saved to %s (%d clients, %d indexes)" % (
+            key, path, len(partition), len(partition.indices)))
+        return partition
+
+    def client_slice(self, key, client_idx):
+        return client_slice(self.path(key), client_idx)
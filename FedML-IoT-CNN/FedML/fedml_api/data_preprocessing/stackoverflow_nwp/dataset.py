@@ -2,6 +2,8 @@ import h5py
 import numpy as np
 import torch.utils.data as data
 
+from ..h5_pool import get_h5_file, client_blocks
+
 class StackOverflowDataset(data.Dataset):
     """StackOverflow dataset"""
 
@@ -24,6 +26,7 @@ class StackOverflowDataset(data.Dataset):
         self.datast = datast
         self.client_id = self.get_client_id_list()[client_idx]
         self.preprocess = preprocess
+        self._len = None
 
     def get_client_id_list(self):
         if self.datast == "train":
@@ -41,11 +44,24 @@ class StackOverflowDataset(data.Dataset):
 
 
     def __len__(self):
-        with h5py.File(self.h5_path, 'r') as h5_file:
-            return len(h5_file[self._EXAMPLE][self.client_id][self._TOKENS][()])
+        # the shape only, no data is read
+        if self._len is None:
+            self._len = get_h5_file(self.h5_path)[self._EXAMPLE][self.client_id][self._TOKENS].shape[0]
+        return self._len
 
     def __getitem__(self, idx):
-        with h5py.File(self.h5_path, 'r') as h5_file:
-            sample = h5_file[self._EXAMPLE][self.client_id][self._TOKENS][()][idx].decode('utf8')
-            sample = self.preprocess(sample)
-        return np.asarray(sample[:-1]), np.asarray(sample[1:])
\ No newline at end of file
+        sample = self._block()[idx]
+        return np.asarray(sample[:-1]), np.asarray(sample[1:])
+
+    def _block(self):
+        # the preprocess callable is part of the key, so datasets with another tokenizer never share a block
+        return client_blocks().get((self.h5_path, self.client_id, self.preprocess), self._load_block)
+
+    def _load_block(self):
+        """ all tokens of the client, read once and tokenized together into a (samples, seq_len + 1) array """
+        raw = get_h5_file(self.h5_path)[self._EXAMPLE][self.client_id][self._TOKENS][()]
+        sentences = [sentence.decode('utf8') for sentence in raw]
+        if self.preprocess is None:
+            return sentences, sum(len(sentence) for sentence in sentences)
+        block = np.asarray([self.preprocess(sentence) for sentence in sentences])
+        return block, block.nbytes
@@ -7,7 +7,16 @@ import wandb
 
 import torch
 
+try:
+    from fedml_core.aggregation.async_aggregator import AsyncAggregator
+    from fedml_core.aggregation.streaming_aggregator import StreamingAggregator
+    from fedml_core.trainer.evaluation import BackgroundEvaluator
+except ImportError:
+    from FedML.fedml_core.aggregation.async_aggregator import AsyncAggregator
+    from FedML.fedml_core.aggregation.streaming_aggregator import StreamingAggregator
+    from FedML.fedml_core.trainer.evaluation import BackgroundEvaluator
 from .utils import transform_list_to_tensor
+from .update_codec import UpdateCodec, DeltaUpdateAggregator, log_update_size
 
 
 class BaselineCNNAggregator(object):
@@ -30,7 +39,24 @@ class BaselineCNNAggregator(object):
         self.args = args
         
         
-        self.model_dict = dict()
+        # uploads are averaged on arrival instead of being kept until the round is complete
+        self.streaming_aggregator = StreamingAggregator()
+        # optional delta / quantized updates: once the clients hold a global model,
+        # uploads and broadcasts are encoded deltas against it
+        codec = UpdateCodec.from_args(args)
+        self.delta_aggregator = None
+        if codec is not None:
+            self.delta_aggregator = DeltaUpdateAggregator(codec, bool(getattr(args, "delta_error_feedback", 1)))
+        self.global_model_update = None
+        # asynchronous / semi-synchronous rounds: versioned global model, uploads mixed in by staleness
+        self.async_aggregator = AsyncAggregator.from_args(args)
+        if self.async_aggregator is not None and self.delta_aggregator is not None:
+            # deltas are taken against one synced model, async clients train from different versions
+            raise ValueError("delta updates need aggregation_mode sync")
+        # optional: the global model is evaluated on a snapshot in a worker thread, so
+        # that the next round is broadcast without waiting for the test
+        self.background_evaluator = BackgroundEvaluator() if getattr(args, "eval_async", 0) else None
+        self.eval_classifier = None
         self.sample_num_dict = dict()
         self.flag_client_model_uploaded_dict = dict()
         
@@ -43,11 +69,65 @@ class BaselineCNNAggregator(object):
     def set_global_model_params(self, model_parameters):
         self.classifier.set_model_params(model_parameters)
 
+    def get_global_model_update(self):
+        """ encoded delta to broadcast instead of the full model, None when the full model has to be sent """
+        return self.global_model_update
+
+    def set_delta_reference(self, model_params):
+        """ the model the clients get with the init message, their first uploads are deltas against it """
+        if self.delta_aggregator is not None:
+            self.delta_aggregator.set_reference(model_params)
+            self.global_model_update = None
+
+    def get_model_version(self):
+        """ version of the global model, incremented by every asynchronous merge / semi-synchronous round """
+        return 0 if self.async_aggregator is None else self.async_aggregator.version
+
+    def merge_async_result(self, index, model_params, sample_num, model_version):
+        """ asynchronous mode: mixes one upload into the global model on arrival, returns whether it was used """
+        self._start_async()
+        staleness = self.async_aggregator.staleness(model_version)
+        alpha_t = self.async_aggregator.merge(model_params, model_version)
+        logging.info("client %d: staleness = %d, mixing weight = %f" % (index, staleness, alpha_t))
+        if alpha_t == 0.0:
+            return False
+        self.sample_num_dict[index] = sample_num
+        self.set_global_model_params(self.async_aggregator.model())
+        return True
+
+    def add_semi_sync_result(self, index, model_params, sample_num, model_version):
+        """ semi-synchronous mode: buffers one upload until close_semi_sync_round(), returns whether it was used """
+        self._start_async()
+        staleness = self.async_aggregator.staleness(model_version)
+        discount = self.async_aggregator.add(model_params, sample_num, model_version)
+        logging.info("client %d: staleness = %d, discount = %f" % (index, staleness, discount))
+        if discount == 0.0:
+            return False
+        self.sample_num_dict[index] = sample_num
+        return True
+
+    def close_semi_sync_round(self):
+        """ mixes the buffered uploads into the global model, returns whether there were any """
+        alpha_t = self.async_aggregator.commit()
+        if alpha_t == 0.0:
+            return False
+        logging.info("semi-synchronous round closed, mixing weight = %f" % alpha_t)
+        self.set_global_model_params(self.async_aggregator.model())
+        return True
 
+    def _start_async(self):
+        if not self.async_aggregator.has_model():
+            self.async_aggregator.set_model(self.get_global_model_params())
 
     def add_local_trained_result(self, index, model_params, sample_num):
         logging.info("add_model. index = %d" % index)
-        self.model_dict[index] = model_params
+        if self.flag_client_model_uploaded_dict[index]:
+            logging.warning("client %d already uploaded in this round, ignoring the duplicate" % index)
+            return
+        if self.delta_aggregator is not None and self.delta_aggregator.has_reference():
+            self.delta_aggregator.add(model_params, sample_num)
+        else:
+            self.streaming_aggregator.add(model_params, sample_num)
         self.sample_num_dict[index] = sample_num
         self.flag_client_model_uploaded_dict[index] = True
 
@@ -64,23 +144,24 @@ class BaselineCNNAggregator(object):
 
     
     def aggregate(self):
-        model_list = []
-        local_sample_number = self.args.data_size_per_client
-        training_num = self.args.client_num_per_round * self.args.data_size_per_client
-        w = local_sample_number / training_num
-        for idx in range(self.worker_num):
-            model_list.append(self.model_dict[idx])
-        
-        averaged_params = model_list[0]
-        for k in averaged_params.keys():
-            for i in range(0, len(model_list)):
-                local_model_params = model_list[i]
-                if i == 0:
-                    averaged_params[k] = local_model_params[k] * w
-                else:
-                    averaged_params[k] += local_model_params[k] * w
-                    
+        if self.delta_aggregator is not None and self.delta_aggregator.has_reference():
+            self.global_model_update, averaged_params = self.delta_aggregator.result()
+            self.delta_aggregator.reset()
+            log_update_size("global model update", self.global_model_update,
+                            self.delta_aggregator.synced.numel())
+        else:
+            # the weighted sum is already accumulated, only the normalization is left
+            averaged_params = self.streaming_aggregator.result()
+            self.streaming_aggregator.reset()
+            if self.delta_aggregator is not None:
+                # the full model goes out this round, deltas are taken against it from now on
+                self.delta_aggregator.set_reference(averaged_params)
+                self.global_model_update = None
+
         self.set_global_model_params(averaged_params)
+        # a round closed at its deadline did not go through check_whether_all_receive
+        for idx in range(self.worker_num):
+            self.flag_client_model_uploaded_dict[idx] = False
 
         print("Averaged")
         #print(type(averaged_params))
@@ -90,10 +171,25 @@ class BaselineCNNAggregator(object):
 
 
     def test_on_server_for_all_clients(self,round_idx,batch_selection=None):
+        if self.background_evaluator is not None:
+            if self.eval_classifier is None:
+                self.eval_classifier = copy.deepcopy(self.classifier)
+            return self.background_evaluator.submit(self._test_snapshot, round_idx, self.get_global_model_params(),
+                                                    batch_selection)
         print("Round: ", round_idx)
         accuracy = self.classifier.test(self.test_global, self.args, batch_selection)
         return accuracy
 
+    def finish_evaluation(self):
+        """ waits for the background evaluations """
+        if self.background_evaluator is not None:
+            self.background_evaluator.shutdown()
+
+    def _test_snapshot(self, round_idx, model_params, batch_selection):
+        self.eval_classifier.set_model_params(model_params)
+        print("Round: ", round_idx)
+        return self.eval_classifier.test(self.test_global, self.args, batch_selection)
+
 
 
 
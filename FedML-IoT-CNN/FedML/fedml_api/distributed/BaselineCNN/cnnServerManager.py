@@ -1,6 +1,7 @@
 import logging
 import os
 import sys
+import threading
 import torch
 import time
 
@@ -10,13 +11,14 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), "../../../")))
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), "../../../../FedML")))
 try:
     from FedML.fedml_core.distributed.communication.message import Message
+    from FedML.fedml_core.distributed.server.round_scheduler import RoundScheduler
     from FedML.fedml_core.distributed.server.server_manager import ServerManager
 except ModuleNotFoundError: # except ImportError
     from fedml_core.distributed.communication.message import Message
+    from fedml_core.distributed.server.round_scheduler import RoundScheduler
     from fedml_core.distributed.server.server_manager import ServerManager
 
 from .utils import transform_list_to_tensor
-from .utils import transform_tensor_to_list
 
 
 class BaselineCNNServerManager(ServerManager):
@@ -30,13 +32,48 @@ class BaselineCNNServerManager(ServerManager):
         self.batch_selection = batch_selection
         self.start_time = time.time()
 
+        # "sync": a round waits for every client; "async": every upload is merged on arrival
+        # and the sender gets the new model back; "semi_sync": a round closes after
+        # semi_sync_k uploads or round_deadline seconds, whichever comes first
+        self.aggregation_mode = getattr(args, "aggregation_mode", "sync")
+        self.semi_sync_k = getattr(args, "semi_sync_k", 0) or (size - 1)
+        self.round_deadline = getattr(args, "round_deadline", 0)
+        # sender id -> version of the last global model sent to it / number of uploads
+        self.client_model_versions = dict()
+        self.client_upload_num = dict()
+        self.num_uploads = 0
+        self.round_clients = []
+        self.round_timer = None
+        self.round_lock = threading.RLock()
+        self.finished = False
+
+        # sync rounds with a deadline / quorum / over-selection, see round_scheduler.py
+        self.round_scheduler = None
+        if self.aggregation_mode == "sync":
+            self.round_scheduler = RoundScheduler.from_args(args, range(1, size))
+        # sender id -> round of the last global model sent to it; a client that
+        # missed a broadcast has no reference for the next delta update
+        self.client_synced_round = dict()
+
     def run(self):
+        if self.aggregation_mode == "semi_sync":
+            self._start_round_timer()
+        if self.round_scheduler is not None and self.round_scheduler.round_idx is None:
+            # the clients start training on their own, all of them are in the first round
+            self.round_scheduler.start_round(self.round_idx, range(1, self.size), self._on_scheduled_deadline)
         super().run()
 
     def send_init_msg(self):
         global_model_params = self.aggregator.get_global_model_params()
-        for process_id in range(1, self.size):
-            self.send_message_init_config(process_id, global_model_params)
+        # the clients take the init model as their delta reference
+        self.aggregator.set_delta_reference(global_model_params)
+        receivers = range(1, self.size)
+        if self.round_scheduler is not None:
+            receivers = self.round_scheduler.select()
+        for process_id in receivers:
+            self.send_message_init_config(process_id, global_model_params, process_id - 1)
+        if self.round_scheduler is not None:
+            self.round_scheduler.start_round(self.round_idx, receivers, self._on_scheduled_deadline)
 
     def register_message_receive_handlers(self):
         self.register_message_receive_handler(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER,
@@ -44,12 +81,27 @@ class BaselineCNNServerManager(ServerManager):
 
     def handle_message_receive_model_from_client(self, msg_params):
         sender_id = msg_params.get(MyMessage.MSG_ARG_KEY_SENDER)
-        cnn_params = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_PARAMS)
-        
-        cnn_params = transform_list_to_tensor(cnn_params)
+        cnn_params = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_UPDATE)
+        if cnn_params is None:
+            cnn_params = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_PARAMS)
+            cnn_params = transform_list_to_tensor(cnn_params)
         
         local_sample_number = msg_params.get(MyMessage.MSG_ARG_KEY_NUM_SAMPLES)
 
+        if self.aggregation_mode != "sync":
+            model_version = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_VERSION)
+            if model_version is None:
+                model_version = self.client_model_versions.get(sender_id, 0)
+            if self.aggregation_mode == "async":
+                self._handle_async_upload(sender_id, cnn_params, local_sample_number, model_version)
+            else:
+                self._handle_semi_sync_upload(sender_id, cnn_params, local_sample_number, model_version)
+            return
+
+        if self.round_scheduler is not None:
+            self._handle_scheduled_upload(sender_id, cnn_params, local_sample_number)
+            return
+
         self.aggregator.add_local_trained_result(sender_id - 1, cnn_params, local_sample_number)
         b_all_received = self.aggregator.check_whether_all_receive()
         logging.info("b_all_received = " + str(b_all_received))
@@ -75,23 +127,152 @@ class BaselineCNNServerManager(ServerManager):
                 self.send_message_sync_model_to_client(receiver_id,
                                                        client_indexes[receiver_id - 1])
 
-    def send_message_init_config(self, receive_id, global_model_params, client_index):
-        
-        global_model_params = transform_tensor_to_list(global_model_params)
+    def _handle_scheduled_upload(self, sender_id, cnn_params, local_sample_number):
+        with self.round_scheduler.lock:
+            if self.finished:
+                return
+            if not self.round_scheduler.record_upload(sender_id):
+                # a straggler of an earlier round, idle again
+                for receiver_id in self.round_scheduler.top_up():
+                    self.send_message_sync_model_to_client(receiver_id, self.round_idx)
+                return
+            self.aggregator.add_local_trained_result(sender_id - 1, cnn_params, local_sample_number)
+            if self.round_scheduler.round_complete():
+                self._close_scheduled_round()
 
+    def _close_scheduled_round(self):
+        # round_scheduler.lock is held
+        self.round_scheduler.close_round()
+        # whatever arrived, weighted by its sample numbers
+        self.aggregator.aggregate()
+        self.aggregator.test_on_server_for_all_clients(self.round_idx, self.batch_selection)
+
+        self.round_idx += 1
+        if self.round_idx == self.round_num:
+            self.finish()
+            return
+        print("Time: ", time.time() - self.start_time)
+
+        receivers = self.round_scheduler.select()
+        for receiver_id in receivers:
+            self.send_message_sync_model_to_client(receiver_id, self.round_idx)
+        self.round_scheduler.start_round(self.round_idx, receivers, self._on_scheduled_deadline)
+
+    def _on_scheduled_deadline(self, round_idx):
+        if self.finished:
+            return
+        if self.round_scheduler.has_quorum():
+            logging.info("round %d deadline: aggregating %d uploads" % (round_idx, len(self.round_scheduler.arrived)))
+            self._close_scheduled_round()
+        else:
+            for receiver_id in self.round_scheduler.extend():
+                self.send_message_sync_model_to_client(receiver_id, self.round_idx)
+
+    def _handle_async_upload(self, sender_id, cnn_params, local_sample_number, model_version):
+        with self.round_lock:
+            if self.finished:
+                return
+            self.aggregator.merge_async_result(sender_id - 1, cnn_params, local_sample_number, model_version)
+            self._count_upload(sender_id)
+
+            # a round is as many uploads as there are clients
+            if self.num_uploads % (self.size - 1) == 0:
+                self.aggregator.test_on_server_for_all_clients(self.round_idx, self.batch_selection)
+                self.round_idx += 1
+                print("Time: ", time.time() - self.start_time)
+            if self.round_idx == self.round_num:
+                self.finish()
+                return
+
+            if self.client_upload_num[sender_id] < self.round_num:
+                self.send_message_sync_model_to_client(sender_id, self.round_idx)
+
+    def _handle_semi_sync_upload(self, sender_id, cnn_params, local_sample_number, model_version):
+        with self.round_lock:
+            if self.finished:
+                return
+            self.aggregator.add_semi_sync_result(sender_id - 1, cnn_params, local_sample_number, model_version)
+            self._count_upload(sender_id)
+            self.round_clients.append(sender_id)
+            logging.info("round %d: %d of %d uploads" % (self.round_idx, len(self.round_clients), self.semi_sync_k))
+            if len(self.round_clients) >= self.semi_sync_k:
+                self._close_semi_sync_round()
+
+    def _close_semi_sync_round(self):
+        # round_lock is held
+        self._cancel_round_timer()
+        if not self.round_clients:
+            # nothing arrived before the deadline, keep waiting
+            self._start_round_timer()
+            return
+        if self.aggregator.close_semi_sync_round():
+            self.aggregator.test_on_server_for_all_clients(self.round_idx, self.batch_selection)
+        self.round_idx += 1
+        print("Time: ", time.time() - self.start_time)
+
+        receivers, self.round_clients = self.round_clients, []
+        if self.round_idx == self.round_num or self.num_uploads == self.round_num * (self.size - 1):
+            self.finish()
+            return
+        # the clients that missed the round keep training and get the model when they report
+        for receiver_id in receivers:
+            if self.client_upload_num[receiver_id] < self.round_num:
+                self.send_message_sync_model_to_client(receiver_id, self.round_idx)
+        self._start_round_timer()
+
+    def _on_round_deadline(self, round_idx):
+        with self.round_lock:
+            if self.finished or round_idx != self.round_idx:
+                return
+            logging.info("round %d deadline: closing with %d of %d uploads" % (
+                round_idx, len(self.round_clients), self.semi_sync_k))
+            self._close_semi_sync_round()
+
+    def _start_round_timer(self):
+        if self.round_deadline and self.round_deadline > 0:
+            self.round_timer = threading.Timer(self.round_deadline, self._on_round_deadline, args=(self.round_idx,))
+            self.round_timer.daemon = True
+            self.round_timer.start()
+
+    def _cancel_round_timer(self):
+        if self.round_timer is not None:
+            self.round_timer.cancel()
+            self.round_timer = None
+
+    def _count_upload(self, sender_id):
+        self.num_uploads += 1
+        self.client_upload_num[sender_id] = self.client_upload_num.get(sender_id, 0) + 1
+
+    def finish(self):
+        self.finished = True
+        self._cancel_round_timer()
+        if self.round_scheduler is not None:
+            self.round_scheduler.cancel()
+            logging.info("client latency: %s" % str(self.round_scheduler.latency_summary()))
+        # the last round's evaluation may still be running in the background
+        self.aggregator.finish_evaluation()
+        super().finish()
+
+    def send_message_init_config(self, receive_id, global_model_params, client_index):
         message = Message(MyMessage.MSG_TYPE_S2C_INIT_CONFIG, self.get_sender_id(), receive_id)
         message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, global_model_params)
         message.add_params(MyMessage.MSG_ARG_KEY_CLIENT_INDEX, str(client_index))
+        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_VERSION, self.aggregator.get_model_version())
+        self.client_model_versions[receive_id] = self.aggregator.get_model_version()
+        self.client_synced_round[receive_id] = self.round_idx
         self.send_message(message)
 
     def send_message_sync_model_to_client(self, receive_id, client_index):
         logging.info("send_message_sync_model_to_client. receive_id = %d" % receive_id)
         
-        global_model_params = self.aggregator.get_global_model_params()
-
-        global_model_params = transform_tensor_to_list(global_model_params)
-
         message = Message(MyMessage.MSG_TYPE_S2C_SYNC_MODEL_TO_CLIENT, self.get_sender_id(), receive_id)
-        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, global_model_params)
+        global_model_update = self.aggregator.get_global_model_update()
+        if global_model_update is not None and self.client_synced_round.get(receive_id) == self.round_idx - 1:
+            message.add_params(MyMessage.MSG_ARG_KEY_MODEL_UPDATE, global_model_update)
+        else:
+            message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, self.aggregator.get_global_model_params())
         message.add_params(MyMessage.MSG_ARG_KEY_CLIENT_INDEX, str(client_index))
+        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_VERSION, self.aggregator.get_model_version())
+        self.client_model_versions[receive_id] = self.aggregator.get_model_version()
+        self.client_synced_round[receive_id] = self.round_idx
         self.send_message(message)
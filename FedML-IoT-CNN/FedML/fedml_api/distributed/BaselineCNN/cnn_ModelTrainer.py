@@ -7,8 +7,10 @@ import copy
 import numpy as np
 
 try:
+    from fedml_core.trainer.evaluation import CachedEvalSet
     from fedml_core.trainer.model_trainer import ModelTrainer
 except ImportError:
+    from FedML.fedml_core.trainer.evaluation import CachedEvalSet
     from FedML.fedml_core.trainer.model_trainer import ModelTrainer
 
 
@@ -20,6 +22,13 @@ class MyModelTrainer(ModelTrainer):
         self.round = 0
         self.device = device
         self.partition_method = args.partition_method
+        # optional flat parameter mode, see fedml_core/trainer/flat_params.py
+        self.flat_params = getattr(args, "flat_params", False)
+        if self.flat_params:
+            self.classifier.enable_flat_params()
+        # selected test batches, materialized by the first cached test(), see fedml_core/trainer/evaluation.py
+        self.eval_set = None
+        self.eval_set_key = None
         self.init_trainer(args)
 
     # trainer init
@@ -55,23 +64,39 @@ class MyModelTrainer(ModelTrainer):
 
     # get cnn parameters
     def get_model_params(self):
+        if self.flat_params:
+            # one contiguous float32 buffer, the model stays on its device
+            return self.classifier.get_flat_params(torch.device("cpu"))
         return copy.deepcopy(self.classifier.cpu().state_dict())
 
     # set cnn parameters
     def set_model_params(self, model_parameters):
-        self.classifier.load_state_dict(model_parameters)
+        if self.flat_params and torch.is_tensor(model_parameters):
+            self.classifier.set_flat_params(model_parameters)
+        else:
+            self.classifier.load_state_dict(model_parameters)
+
+    # detached copies of the trainable parameters, in model.parameters() order
+    def snapshot_parameters(self):
+        if self.flat_params:
+            layout = self.classifier.flat_layout
+            flat = self.classifier.get_flat_params()
+            return [flat[offset:offset + numel].view(shape)
+                    for offset, numel, shape, dtype in layout.index.values() if offset < layout.weight_numel]
+        return [param.detach().clone() for param in self.classifier.parameters()]
 
 
 
     # train
     def train(self, train_data, args):
-        old_model = copy.deepcopy(self.classifier)
-        old_model.to(self.device)
-        old_model.eval()
-
         model = self.classifier.to(self.device)
         model.train()
 
+        # starting point of the round, only needed for the fedasync proximal term
+        old_params = None
+        if args.method == 'fedasync':
+            old_params = self.snapshot_parameters()
+
         optimizer = self.optimizer
         criterion = self.criterion
 
@@ -116,10 +141,9 @@ class MyModelTrainer(ModelTrainer):
                 # Add regularization
                 if args.method == 'fedasync':
                     l2_loss = 0.0
-                    for paramA, paramB in zip(model.parameters(),
-                                              old_model.parameters()):
+                    for paramA, paramB in zip(model.parameters(), old_params):
                         l2_loss += args.rou / 2 * \
-                                   torch.sum(torch.square(paramA - paramB.detach()))
+                                   torch.sum(torch.square(paramA - paramB))
                     loss += l2_loss
                     batch_l2_loss.append(l2_loss.item())
 
@@ -143,6 +167,9 @@ class MyModelTrainer(ModelTrainer):
 
     # test
     def test(self, test_data, args, batch_selection):
+        if getattr(args, "eval_cache", 0) and args.dataset not in ("shakespeare", "hpwren"):
+            # models without state across batches: cached tensors, evaluated in large batches
+            return self._test_cached(test_data, args, batch_selection)
 
         model = self.classifier.to(self.device)
         self.classifier.eval()
@@ -155,9 +182,10 @@ class MyModelTrainer(ModelTrainer):
             batch_size, state_h, state_c = None, None, None
 
         total = args.batch_size * len(batch_selection)
+        selected = set(batch_selection)
         for batch_idx, (x, y) in enumerate(test_data):
 
-            if batch_idx not in batch_selection:
+            if batch_idx not in selected:
                 continue
 
             if args.dataset == "har":
@@ -204,6 +232,35 @@ class MyModelTrainer(ModelTrainer):
 
         return test_loss, acc
 
+    def _test_cached(self, test_data, args, batch_selection):
+        key = (id(test_data), tuple(batch_selection))
+        if self.eval_set_key != key:
+            self.eval_set = CachedEvalSet.from_loader(test_data, batch_selection,
+                                                      getattr(args, "eval_batch_size", 0), self.device)
+            self.eval_set_key = key
+
+        model = self.classifier.to(self.device)
+        model.eval()
+        # per sample losses, weighted back into the sum of per-batch means of test()
+        criterion = nn.CrossEntropyLoss(reduction="none")
+
+        test_loss = 0
+        correct = 0
+        with torch.inference_mode():
+            for x, y, weights in self.eval_set.batches():
+                if args.dataset == "har":
+                    x, y = x.type(torch.float), y.type(torch.long) - 1
+                else:
+                    y = y.type(torch.long)
+                outputs = model(x)
+                test_loss += (criterion(outputs, y) * weights).sum().item()
+                correct += outputs.argmax(1).eq(y).sum().item()
+
+        test_loss /= len(test_data)
+        acc = correct / (args.batch_size * len(batch_selection))
+
+        return test_loss, acc
+
     # not used
     def test_on_the_server(self, train_data_local_dict, test_data_local_dict, device, args=None) -> bool:
         return False
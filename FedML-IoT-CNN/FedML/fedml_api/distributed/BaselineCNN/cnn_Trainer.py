@@ -1,4 +1,5 @@
 from .utils import transform_tensor_to_list
+from .update_codec import UpdateCodec, DeltaUpdateEncoder
 
 
 class BaseCNN_Trainer(object):
@@ -19,8 +20,20 @@ class BaseCNN_Trainer(object):
         self.device = device
         self.args = args
 
+        # optional delta / quantized uploads, None sends the full model every round
+        codec = UpdateCodec.from_args(args)
+        self.update_encoder = None
+        if codec is not None:
+            self.update_encoder = DeltaUpdateEncoder(codec, bool(getattr(args, "delta_error_feedback", 1)))
+
     def update_model(self, cnn_params):
         self.trainer.set_model_params(cnn_params)
+        if self.update_encoder is not None:
+            self.update_encoder.set_reference(cnn_params)
+
+    def apply_model_update(self, encoded_update):
+        cnn_params = self.update_encoder.apply_update(encoded_update)
+        self.trainer.set_model_params(cnn_params)
 
 
     """ not used
@@ -35,6 +48,9 @@ class BaseCNN_Trainer(object):
         self.trainer.train(self.train_local, self.args)
 
         cnn_params = self.trainer.get_model_params()
+        if self.update_encoder is not None and self.update_encoder.has_reference():
+            # no reference before the first global model arrives, the full model is sent then
+            cnn_params = self.update_encoder.encode(cnn_params)
 
         return cnn_params, self.local_sample_number
 
@@ -19,7 +19,11 @@ class MyMessage(object):
     """
     MSG_ARG_KEY_NUM_SAMPLES = "num_samples"
     MSG_ARG_KEY_MODEL_PARAMS = "model_params"
+    # encoded delta against the last synced global model, see update_codec.py
+    MSG_ARG_KEY_MODEL_UPDATE = "model_update"
     MSG_ARG_KEY_CLIENT_INDEX = "client_idx"
+    # version of the global model a message carries / an upload was trained from (async aggregation)
+    MSG_ARG_KEY_MODEL_VERSION = "model_version"
 
     MSG_ARG_KEY_TRAIN_CORRECT = "train_correct"
     MSG_ARG_KEY_TRAIN_ERROR = "train_error"
@@ -0,0 +1,68 @@
+"""
+    One delta update round of BaselineCNN, server and clients in this process:
+    the init model, encoded client uploads, the aggregation and the encoded
+    broadcast applied on the clients.
+
+    usage (from the FedML directory):
+        python -m pytest fedml_api/distributed/BaselineCNN/test_delta_updates.py
+"""
+import argparse
+import copy
+
+import torch
+
+from .benchmark_update_codec import synthetic_data
+from .cnnAggregator import BaselineCNNAggregator
+from .cnn_ModelTrainer import MyModelTrainer
+from .cnn_Trainer import BaseCNN_Trainer
+from .update_codec import is_encoded_update
+from ...model.Baseline.HAR import HAR_Net
+
+
+def make_args(quantize_bits):
+    return argparse.Namespace(delta_updates=1, delta_quantize_bits=quantize_bits, delta_topk_ratio=0.0,
+                              delta_error_feedback=1, dataset="har", epochs=1, batch_size=16, lr=0.003,
+                              momentum=0.9, weight_decay=0.0, partition_method="homo", method="fedavg",
+                              flat_params=0)
+
+
+def run_round(quantize_bits, client_num=2):
+    torch.manual_seed(0)
+    args = make_args(quantize_bits)
+    train_local, train_num, test_global = synthetic_data("har", client_num, 32, 32, args.batch_size, 1.0)
+    device = torch.device("cpu")
+    model = HAR_Net()
+    aggregator = BaselineCNNAggregator(args, None, test_global, 0, train_local, None, train_num, client_num, device,
+                                       MyModelTrainer(copy.deepcopy(model), args, device))
+    trainers = [BaseCNN_Trainer(i, train_local, train_num, {i: None for i in train_local}, 0, device, args,
+                                MyModelTrainer(copy.deepcopy(model), args, device))
+                for i in range(client_num)]
+
+    # BaselineCNNServerManager.send_init_msg / BaseCNNClientManager.handle_message_init
+    init_params = aggregator.get_global_model_params()
+    aggregator.set_delta_reference(init_params)
+    for trainer in trainers:
+        trainer.update_model(copy.deepcopy(init_params))
+
+    for client_idx, trainer in enumerate(trainers):
+        cnn_params, local_sample_num = trainer.train()
+        assert is_encoded_update(cnn_params)
+        aggregator.add_local_trained_result(client_idx, cnn_params, local_sample_num)
+    assert aggregator.check_whether_all_receive()
+    global_params = aggregator.aggregate()
+
+    update = aggregator.get_global_model_update()
+    assert update is not None
+    for trainer in trainers:
+        trainer.apply_model_update(update)
+    return init_params, global_params, trainers
+
+
+def test_first_round_uploads_are_deltas():
+    for quantize_bits in (0, 8):
+        init_params, global_params, trainers = run_round(quantize_bits)
+        assert any(not torch.equal(init_params[k], global_params[k]) for k in global_params)
+        for trainer in trainers:
+            client_params = trainer.trainer.get_model_params()
+            for k in global_params:
+                assert torch.equal(client_params[k], global_params[k])
@@ -3,8 +3,17 @@ import numpy as np
 
 
 def transform_list_to_tensor(model_params_list):
+    # binary wire format already delivers tensors, json delivers nested lists
+    if not isinstance(model_params_list, dict):
+        # flat parameter buffer (see fedml_core/trainer/flat_params.py)
+        if torch.is_tensor(model_params_list):
+            return model_params_list.float()
+        return torch.from_numpy(np.asarray(model_params_list)).float()
     for k in model_params_list.keys():
-        model_params_list[k] = torch.from_numpy(np.asarray(model_params_list[k])).float()
+        if torch.is_tensor(model_params_list[k]):
+            model_params_list[k] = model_params_list[k].float()
+        else:
+            model_params_list[k] = torch.from_numpy(np.asarray(model_params_list[k])).float()
     return model_params_list
 
 
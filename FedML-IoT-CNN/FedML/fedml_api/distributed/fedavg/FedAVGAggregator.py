@@ -5,6 +5,8 @@ import time
 import numpy as np
 import wandb
 
+from fedml_core.aggregation.streaming_aggregator import StreamingAggregator
+from fedml_core.trainer.evaluation import BackgroundEvaluator, CachedEvalSet, fork_map
 from .utils import transform_list_to_tensor
 
 
@@ -26,7 +28,8 @@ class FedAVGAggregator(object):
         self.worker_num = worker_num
         self.device = device
         self.args = args
-        self.model_dict = dict()
+        # uploads are averaged on arrival instead of being kept until the round is complete
+        self.streaming_aggregator = StreamingAggregator()
         self.sample_num_dict = dict()
         self.flag_client_model_uploaded_dict = dict()
         for idx in range(self.worker_num):
@@ -34,6 +37,12 @@ class FedAVGAggregator(object):
 
         self.start_time = time.time()
 
+        # evaluation: test_global cached as tensors, per-client evaluations over
+        # eval_workers forked processes, optionally in the background on a snapshot
+        self.test_eval_set = None
+        self.background_evaluator = BackgroundEvaluator() if getattr(args, "eval_async", 0) else None
+        self.eval_trainer = None
+
     def get_global_model_params(self):
         return self.trainer.get_model_params()
 
@@ -42,7 +51,12 @@ class FedAVGAggregator(object):
 
     def add_local_trained_result(self, index, model_params, sample_num):
         logging.info("add_model. index = %d" % index)
-        self.model_dict[index] = model_params
+        if self.flag_client_model_uploaded_dict[index]:
+            logging.warning("client %d already uploaded in this round, ignoring the duplicate" % index)
+            return
+        if self.args.is_mobile == 1:
+            model_params = transform_list_to_tensor(model_params)
+        self.streaming_aggregator.add(model_params, sample_num)
         self.sample_num_dict[index] = sample_num
         self.flag_client_model_uploaded_dict[index] = True
 
@@ -56,27 +70,15 @@ class FedAVGAggregator(object):
 
     def aggregate(self):
         start_time = time.time()
-        model_list = []
-        training_num = 0
 
+        logging.info("number of aggregated models = " + str(self.streaming_aggregator.num_received))
+
+        # the sample-weighted sum is already accumulated, only the normalization is left
+        averaged_params = self.streaming_aggregator.result()
+        self.streaming_aggregator.reset()
+        # a round closed at its deadline did not go through check_whether_all_receive
         for idx in range(self.worker_num):
-            if self.args.is_mobile == 1:
-                self.model_dict[idx] = transform_list_to_tensor(self.model_dict[idx])
-            model_list.append((self.sample_num_dict[idx], self.model_dict[idx]))
-            training_num += self.sample_num_dict[idx]
-
-        logging.info("len of self.model_dict[idx] = " + str(len(self.model_dict)))
-
-        # logging.info("################aggregate: %d" % len(model_list))
-        (num0, averaged_params) = model_list[0]
-        for k in averaged_params.keys():
-            for i in range(0, len(model_list)):
-                local_sample_number, local_model_params = model_list[i]
-                w = local_sample_number / training_num
-                if i == 0:
-                    averaged_params[k] = local_model_params[k] * w
-                else:
-                    averaged_params[k] += local_model_params[k] * w
+            self.flag_client_model_uploaded_dict[idx] = False
 
         # update the global model which is cached at the server side
         self.set_global_model_params(averaged_params)
@@ -97,57 +99,84 @@ class FedAVGAggregator(object):
 
     def test_on_server_for_all_clients(self, round_idx):
         if round_idx % self.args.frequency_of_the_test == 0 or round_idx == self.args.comm_round - 1:
-            logging.info("################test_on_server_for_all_clients : {}".format(round_idx))
-            train_num_samples = []
-            train_tot_corrects = []
-            train_losses = []
+            # the time of the round, not of the end of a background evaluation queued behind others
             cur_time = time.time() - self.start_time
-
-            # Test on each client's local training dataset
-            for client_idx in range(self.args.client_num_in_total):
-                # train data
-                metrics = self.trainer.test(self.train_data_local_dict[client_idx], self.device, self.args)
-                train_tot_correct, train_num_sample, train_loss = metrics['test_correct'], metrics['test_total'], metrics['test_loss']
-                train_tot_corrects.append(copy.deepcopy(train_tot_correct))
-                train_num_samples.append(copy.deepcopy(train_num_sample))
-                train_losses.append(copy.deepcopy(train_loss))
-
-                """
-                Note: CI environment is CPU-based computing. 
-                The training speed for RNN training is to slow in this setting, so we only test a client to make sure there is no programming error.
-                """
-                if self.args.ci == 1:
-                    break
-
-            # test on training dataset
-            train_acc = sum(train_tot_corrects) / sum(train_num_samples)
-            train_loss = sum(train_losses) / sum(train_num_samples)
-            wandb.log({"Train/Acc": train_acc, "round": round_idx})
-            wandb.log({"Train/Loss": train_loss, "round": round_idx})
-            stats = {'training_acc': train_acc, 'training_loss': train_loss}
-            logging.info(stats)
-
-            # Test on global test dataset
-            test_num_samples = []
-            test_tot_corrects = []
-            test_losses = []
-            metrics = self.trainer.test(self.test_global, self.device, self.args)
-            test_tot_correct, test_num_sample, test_loss = metrics['test_correct'], metrics['test_total'], metrics[
-                'test_loss']
-            test_tot_corrects.append(copy.deepcopy(test_tot_correct))
-            test_num_samples.append(copy.deepcopy(test_num_sample))
-            test_losses.append(copy.deepcopy(test_loss))
-
-            # test on test dataset
-            test_acc = sum(test_tot_corrects) / sum(test_num_samples)
-            test_loss = sum(test_losses) / sum(test_num_samples)
-            wandb.log({"Test/Acc": test_acc, "round": round_idx})
-            wandb.log({"Test/Loss": test_loss, "round": round_idx})
-            stats = {'test_acc': test_acc, 'test_loss': test_loss}
-            logging.info(stats)
-
-            # Log time and stats
-            with open(self.args.result_dir + '/result.txt', 'a+') as f:
-                f.write("{},{},{},{},{}\n".format(
-                    cur_time, test_acc, test_loss, train_acc, train_loss
-                ))
\ No newline at end of file
+            if self.background_evaluator is not None:
+                # the next round is broadcast while a snapshot of this one is evaluated
+                if self.eval_trainer is None:
+                    self.eval_trainer = copy.deepcopy(self.trainer)
+                snapshot = copy.deepcopy(self.get_global_model_params())
+                return self.background_evaluator.submit(self._test_snapshot, round_idx, snapshot, cur_time)
+            self._test_on_server(round_idx, self.trainer, cur_time)
+
+    def finish_evaluation(self):
+        """ waits for the background evaluations """
+        if self.background_evaluator is not None:
+            self.background_evaluator.shutdown()
+
+    def _test_snapshot(self, round_idx, model_params, cur_time):
+        self.eval_trainer.set_model_params(model_params)
+        self._test_on_server(round_idx, self.eval_trainer, cur_time)
+
+    def _test_on_server(self, round_idx, trainer, cur_time):
+        logging.info("################test_on_server_for_all_clients : {}".format(round_idx))
+        train_num_samples = []
+        train_tot_corrects = []
+        train_losses = []
+
+        """
+        Note: CI environment is CPU-based computing. 
+        The training speed for RNN training is to slow in this setting, so we only test a client to make sure there is no programming error.
+        """
+        client_indexes = range(1 if self.args.ci == 1 else self.args.client_num_in_total)
+
+        def client_metrics(client_idx):
+            return trainer.test(self.train_data_local_dict[client_idx], self.device, self.args)
+
+        # Test on each client's local training dataset, CUDA state does not survive a fork
+        eval_workers = getattr(self.args, "eval_workers", 0) if str(self.device) == "cpu" else 0
+        for metrics in fork_map(client_metrics, client_indexes, eval_workers):
+            # train data
+            train_tot_correct, train_num_sample, train_loss = metrics['test_correct'], metrics['test_total'], metrics['test_loss']
+            train_tot_corrects.append(copy.deepcopy(train_tot_correct))
+            train_num_samples.append(copy.deepcopy(train_num_sample))
+            train_losses.append(copy.deepcopy(train_loss))
+
+        # test on training dataset
+        train_acc = sum(train_tot_corrects) / sum(train_num_samples)
+        train_loss = sum(train_losses) / sum(train_num_samples)
+        wandb.log({"Train/Acc": train_acc, "round": round_idx})
+        wandb.log({"Train/Loss": train_loss, "round": round_idx})
+        stats = {'training_acc': train_acc, 'training_loss': train_loss}
+        logging.info(stats)
+
+        # Test on global test dataset
+        test_num_samples = []
+        test_tot_corrects = []
+        test_losses = []
+        test_data = self.test_global
+        if getattr(self.args, "eval_cache", 0):
+            if self.test_eval_set is None:
+                self.test_eval_set = CachedEvalSet.from_loader(
+                    self.test_global, eval_batch_size=getattr(self.args, "eval_batch_size", 0), device=self.device)
+            test_data = self.test_eval_set
+        metrics = trainer.test(test_data, self.device, self.args)
+        test_tot_correct, test_num_sample, test_loss = metrics['test_correct'], metrics['test_total'], metrics[
+            'test_loss']
+        test_tot_corrects.append(copy.deepcopy(test_tot_correct))
+        test_num_samples.append(copy.deepcopy(test_num_sample))
+        test_losses.append(copy.deepcopy(test_loss))
+
+        # test on test dataset
+        test_acc = sum(test_tot_corrects) / sum(test_num_samples)
+        test_loss = sum(test_losses) / sum(test_num_samples)
+        wandb.log({"Test/Acc": test_acc, "round": round_idx})
+        wandb.log({"Test/Loss": test_loss, "round": round_idx})
+        stats = {'test_acc': test_acc, 'test_loss': test_loss}
+        logging.info(stats)
+
+        # Log time and stats
+        with open(self.args.result_dir + '/result.txt', 'a+') as f:
+            f.write("{},{},{},{},{}\n".format(
+                cur_time, test_acc, test_loss, train_acc, train_loss
+            ))
\ No newline at end of file
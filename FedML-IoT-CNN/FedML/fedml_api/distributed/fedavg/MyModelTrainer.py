@@ -66,7 +66,7 @@ class MyModelTrainer(ModelTrainer):
         }
 
         criterion = nn.CrossEntropyLoss().to(device)
-        with torch.no_grad():
+        with torch.inference_mode():
             for batch_idx, (x, target) in enumerate(test_data):
                 x = x.to(device)
                 target = target.to(device)
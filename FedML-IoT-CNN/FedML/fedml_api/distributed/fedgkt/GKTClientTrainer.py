@@ -1,5 +1,6 @@
 import logging
 
+import numpy as np
 import torch
 from torch import nn, optim
 
@@ -39,11 +40,17 @@ class GKTClientTrainer(object):
         self.criterion_KL = utils.KL_Loss(self.args.temperature)
 
         self.server_logits_dict = dict()
+        # the batch sizes of the last extraction pass, to unpack the server logits of a feature store server
+        self.extracted_batch_sizes = []
 
     def get_sample_number(self):
         return self.local_sample_number
 
     def update_large_model_logits(self, logits):
+        if isinstance(logits, np.ndarray):
+            # one packed (samples, classes) array from the server feature store, back to batch_index -> logits
+            offsets = np.cumsum(self.extracted_batch_sizes)[:-1]
+            logits = dict(enumerate(np.split(logits, offsets)))
         self.server_logits_dict = logits
 
     def train(self):
@@ -105,8 +112,10 @@ class GKTClientTrainer(object):
             So it is better to run this program in a 256G CPU host memory. 
             If deploying our algorithm in real world system, please optimize the memory usage by compression.
         """
+        self.extracted_batch_sizes = []
         for batch_idx, (images, labels) in enumerate(self.local_training_data):
             images, labels = images.to(self.device), labels.to(self.device)
+            self.extracted_batch_sizes.append(len(images))
 
             # logging.info("shape = " + str(images.shape))
             log_probs, extracted_features = self.client_model(images)
@@ -7,6 +7,10 @@ import wandb
 
 import torch
 
+try:
+    from fedml_core.aggregation.hd_bundler import HDBundler
+except ImportError:
+    from FedML.fedml_core.aggregation.hd_bundler import HDBundler
 from .utils import transform_list_to_tensor
 
 
@@ -30,7 +34,9 @@ class FedHDAggregator(object):
         self.args = args
         
         
-        self.model_dict = dict()
+        # class hypervectors are copied into a preallocated per-client buffer on arrival
+        # and bundled in one pass, see fedml_core/aggregation/hd_bundler.py
+        self.bundler = HDBundler.from_args(args, self.worker_num)
         self.sample_num_dict = dict()
         self.flag_client_model_uploaded_dict = dict()
         
@@ -44,11 +50,17 @@ class FedHDAggregator(object):
     def set_global_model_params(self, model_parameters):
         self.classifier.set_model_params(model_parameters)
 
+    def get_encoder_config(self):
+        return self.classifier.get_encoder_config()
+
 
 
     def add_local_trained_result(self, index, model_params, sample_num):
         logging.info("add_model. index = %d" % index)
-        self.model_dict[index] = model_params
+        if self.flag_client_model_uploaded_dict[index]:
+            logging.warning("client %d already uploaded in this round, ignoring the duplicate" % index)
+            return
+        self.bundler.add(index, model_params, sample_num)
         self.sample_num_dict[index] = sample_num
         self.flag_client_model_uploaded_dict[index] = True
 
@@ -67,17 +79,12 @@ class FedHDAggregator(object):
 
 
     def aggregate(self):
-        
-        num = len(self.model_dict)
-        
-        updated_params = self.classifier.get_model_params()
-        #updated_params = torch.zeros(10,self.args.D)
-        
-        for model_idx in self.model_dict:
-            updated_params += self.model_dict[model_idx]
-            
-        updated_params = updated_params / num
-        
+        updated_params = self.bundler.bundle().to(self.device)
+        self.bundler.reset()
+        # a round closed at its deadline did not go through check_whether_all_receive
+        for idx in range(self.worker_num):
+            self.flag_client_model_uploaded_dict[idx] = False
+
         self.set_global_model_params(updated_params)
         return updated_params
 
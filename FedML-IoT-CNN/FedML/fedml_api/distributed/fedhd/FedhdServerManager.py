@@ -5,19 +5,19 @@ import torch
 import time
 
 from .message_define import MyMessage
-from .utils import transform_tensor_to_list
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), "../../../")))
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), "../../../../FedML")))
 try:
     from FedML.fedml_core.distributed.communication.message import Message
+    from FedML.fedml_core.distributed.server.round_scheduler import RoundScheduler
     from FedML.fedml_core.distributed.server.server_manager import ServerManager
 except ModuleNotFoundError: # except ImportError
     from fedml_core.distributed.communication.message import Message
+    from fedml_core.distributed.server.round_scheduler import RoundScheduler
     from fedml_core.distributed.server.server_manager import ServerManager
 
 from .utils import transform_list_to_tensor
-from .utils import transform_tensor_to_list
 
 
 class FedHDServerManager(ServerManager):
@@ -30,14 +30,23 @@ class FedHDServerManager(ServerManager):
         self.is_preprocessed = is_preprocessed
         self.batch_selection = batch_selection
         self.start_time = time.time()
+        # rounds with a deadline / quorum / over-selection, see round_scheduler.py
+        self.round_scheduler = RoundScheduler.from_args(args, range(1, size))
+        self.finished = False
 
     def run(self):
+        if self.round_scheduler is not None and self.round_scheduler.round_idx is None:
+            # the clients start training on their own, all of them are in the first round
+            self.round_scheduler.start_round(self.round_idx, range(1, self.size), self._on_round_deadline)
         super().run()
 
     def send_init_msg(self):
         global_model_params = self.aggregator.get_global_model_params()
-        for process_id in range(1, self.size):
-            self.send_message_init_config(process_id, global_model_params)
+        receivers = range(1, self.size) if self.round_scheduler is None else self.round_scheduler.select()
+        for process_id in receivers:
+            self.send_message_init_config(process_id, global_model_params, process_id - 1)
+        if self.round_scheduler is not None:
+            self.round_scheduler.start_round(self.round_idx, receivers, self._on_round_deadline)
 
     def register_message_receive_handlers(self):
         self.register_message_receive_handler(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER,
@@ -55,11 +64,17 @@ class FedHDServerManager(ServerManager):
 
         vecs_tensor = transform_list_to_tensor(client_hyper_vecs)
 
+        if self.round_scheduler is not None:
+            self._handle_scheduled_upload(sender_id, vecs_tensor, local_sample_number)
+            return
+
         self.aggregator.add_local_trained_result(sender_id - 1, vecs_tensor, local_sample_number)
         b_all_received = self.aggregator.check_whether_all_receive()
         logging.info("b_all_received = " + str(b_all_received))
         if b_all_received:
-            global_model_params = self.aggregator.aggregate()
+            self.aggregator.aggregate()
+            # the message form of the bundle, bit-packed in bipolar mode (see fedhd_ModelTrainer.get_model_params)
+            global_model_params = self.aggregator.get_global_model_params()
             self.aggregator.test_on_server_for_all_clients(self.round_idx,self.batch_selection)
 
             # start the next round
@@ -80,6 +95,58 @@ class FedHDServerManager(ServerManager):
                 self.send_message_sync_model_to_client(receiver_id, global_model_params,
                                                        client_indexes[receiver_id - 1])
 
+    def _handle_scheduled_upload(self, sender_id, vecs_tensor, local_sample_number):
+        with self.round_scheduler.lock:
+            if self.finished:
+                return
+            if not self.round_scheduler.record_upload(sender_id):
+                # a straggler of an earlier round, idle again
+                self._send_to_late_joiners(self.round_scheduler.top_up())
+                return
+            self.aggregator.add_local_trained_result(sender_id - 1, vecs_tensor, local_sample_number)
+            if self.round_scheduler.round_complete():
+                self._close_scheduled_round()
+
+    def _close_scheduled_round(self):
+        # round_scheduler.lock is held
+        self.round_scheduler.close_round()
+        # whatever arrived, weighted by its sample numbers
+        self.aggregator.aggregate()
+        global_model_params = self.aggregator.get_global_model_params()
+        self.aggregator.test_on_server_for_all_clients(self.round_idx, self.batch_selection)
+
+        self.round_idx += 1
+        if self.round_idx == self.round_num:
+            self.finish()
+            return
+        print("Time: ", time.time() - self.start_time)
+
+        receivers = self.round_scheduler.select()
+        for receiver_id in receivers:
+            self.send_message_sync_model_to_client(receiver_id, global_model_params, self.round_idx)
+        self.round_scheduler.start_round(self.round_idx, receivers, self._on_round_deadline)
+
+    def _on_round_deadline(self, round_idx):
+        if self.finished:
+            return
+        if self.round_scheduler.has_quorum():
+            logging.info("round %d deadline: aggregating %d uploads" % (round_idx, len(self.round_scheduler.arrived)))
+            self._close_scheduled_round()
+        else:
+            self._send_to_late_joiners(self.round_scheduler.extend())
+
+    def _send_to_late_joiners(self, receivers):
+        global_model_params = self.aggregator.get_global_model_params()
+        for receiver_id in receivers:
+            self.send_message_sync_model_to_client(receiver_id, global_model_params, self.round_idx)
+
+    def finish(self):
+        self.finished = True
+        if self.round_scheduler is not None:
+            self.round_scheduler.cancel()
+            logging.info("client latency: %s" % str(self.round_scheduler.latency_summary()))
+        super().finish()
+
     def send_message_init_config(self, receive_id, global_model_params, client_index):
 
         #print("===========init s->c==================")
@@ -87,10 +154,11 @@ class FedHDServerManager(ServerManager):
         #print(type(global_model_params))
         #print("======================================")
 
-        vecs_list = transform_tensor_to_list(global_model_params)
-
         message = Message(MyMessage.MSG_TYPE_S2C_INIT_CONFIG, self.get_sender_id(), receive_id)
-        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, vecs_list)
+        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, global_model_params)
+        encoder_config = self.aggregator.get_encoder_config()
+        if encoder_config is not None:
+            message.add_params(MyMessage.MSG_ARG_KEY_ENCODER_CONFIG, encoder_config)
         message.add_params(MyMessage.MSG_ARG_KEY_CLIENT_INDEX, str(client_index))
         self.send_message(message)
 
@@ -102,9 +170,7 @@ class FedHDServerManager(ServerManager):
         #print(type(global_model_params))
         #print("======================================")
 
-        vecs_list = transform_tensor_to_list(global_model_params)
-
         message = Message(MyMessage.MSG_TYPE_S2C_SYNC_MODEL_TO_CLIENT, self.get_sender_id(), receive_id)
-        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, vecs_list)
+        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, global_model_params)
         message.add_params(MyMessage.MSG_ARG_KEY_CLIENT_INDEX, str(client_index))
         self.send_message(message)
@@ -0,0 +1,107 @@
+"""
+    Float versus bit-packed bipolar class hypervectors: accuracy, bytes on the
+    wire and inference latency.
+
+    The FedHD encoder is stood in for by a random projection with a sign
+    nonlinearity on synthetic class-separable data. Class hypervectors are
+    the bundled encodings of the training samples. The float path classifies
+    by cosine similarity on float32 encodings; the packed path binarizes the
+    class hypervectors and queries, packs them 64 dimensions per word, and
+    classifies by XOR + popcount Hamming distance.
+
+    usage (from the FedML directory):
+        python -m fedml_api.distributed.fedhd.benchmark_packed_hv --D 10000
+"""
+import argparse
+import time
+
+import torch
+
+from fedml_core.distributed.communication.message import Message
+
+from fedml_api.distributed.fedhd.message_define import MyMessage
+from fedml_api.distributed.fedhd.packed_hv import pack_bipolar, classify, to_message
+
+
+def payload_bytes(model_params, wire_format):
+    message = Message(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER, 1, 0)
+    message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, model_params)
+    payload = message.to_payload(wire_format)
+    return len(payload.encode('utf-8')) if isinstance(payload, str) else len(payload)
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--D', type=int, default=10000, help='hypervector dimension')
+    parser.add_argument('--features', type=int, default=561)
+    parser.add_argument('--classes', type=int, default=6)
+    parser.add_argument('--train_samples', type=int, default=6000)
+    parser.add_argument('--test_samples', type=int, default=2000)
+    parser.add_argument('--noise', type=float, default=8.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = torch.Generator().manual_seed(args.seed)
+    centers = torch.randn(args.classes, args.features, generator=generator)
+    projection = torch.randn(args.features, args.D, generator=generator)
+
+    def make(n):
+        y = torch.randint(0, args.classes, (n,), generator=generator)
+        return centers[y] + args.noise * torch.randn(n, args.features, generator=generator), y
+
+    def encode(x):
+        return torch.sign(x @ projection)
+
+    x_train, y_train = make(args.train_samples)
+    x_test, y_test = make(args.test_samples)
+    h_train = encode(x_train)
+    h_test = encode(x_test)
+
+    class_hvs = torch.zeros(args.classes, args.D)
+    class_hvs.index_add_(0, y_train, h_train)
+
+    def float_predict():
+        similarity = torch.nn.functional.normalize(h_test, dim=1) @ \
+                     torch.nn.functional.normalize(class_hvs, dim=1).t()
+        return similarity.argmax(dim=1)
+
+    packed_classes = pack_bipolar(class_hvs)
+
+    def packed_predict():
+        return torch.from_numpy(classify(pack_bipolar(h_test), packed_classes))
+
+    packed_queries = pack_bipolar(h_test)
+
+    def packed_predict_preencoded():
+        return torch.from_numpy(classify(packed_queries, packed_classes))
+
+    float_pred, float_time = timed(float_predict, args.repeat)
+    packed_pred, packed_time = timed(packed_predict, args.repeat)
+    _, packed_query_time = timed(packed_predict_preencoded, args.repeat)
+
+    print("D = %d, %d classes, %d test samples" % (args.D, args.classes, args.test_samples))
+    print("{:<28} {:>10} {:>14} {:>14}".format("path", "accuracy", "bytes (json)", "bytes (binary)"))
+    print("{:<28} {:>10.4f} {:>14,d} {:>14,d}".format(
+        "float32", (float_pred == y_test).float().mean().item(),
+        payload_bytes(class_hvs, "json"), payload_bytes(class_hvs, "binary")))
+    print("{:<28} {:>10.4f} {:>14,d} {:>14,d}".format(
+        "bipolar packed", (packed_pred == y_test).float().mean().item(),
+        payload_bytes(to_message(class_hvs), "json"), payload_bytes(to_message(class_hvs), "binary")))
+    print()
+    print("inference latency per test set:")
+    print("  float32 cosine                %.4f s" % float_time)
+    print("  packed, incl. packing queries %.4f s" % packed_time)
+    print("  packed, queries pre-packed    %.4f s" % packed_query_time)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,6 @@ except ImportError:
     from FedML.fedml_core.distributed.communication.message import Message
 from .message_define import MyMessage
 from .utils import transform_list_to_tensor
-from .utils import transform_tensor_to_list
 
 
 class FedHDClientManager(ClientManager):
@@ -44,7 +43,11 @@ class FedHDClientManager(ClientManager):
 
         client_index = msg_params.get(MyMessage.MSG_ARG_KEY_CLIENT_INDEX)
 
-        vecs_tensor = transform_list_to_tensor(gloal_hyper_ves)
+        encoder_config = msg_params.get(MyMessage.MSG_ARG_KEY_ENCODER_CONFIG)
+        if encoder_config is not None:
+            self.trainer.update_encoder(encoder_config)
+
+        vecs_tensor = transform_list_to_tensor(global_hyper_vecs)
 
         self.trainer.update_model(vecs_tensor)
 
@@ -83,10 +86,8 @@ class FedHDClientManager(ClientManager):
         #print(type(hyper_vecs))
         #print("======================================")
         
-        vecs_list = transform_tensor_to_list(hyper_vecs)
-        
         message = Message(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER, self.get_sender_id(), receive_id)
-        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, vecs_list)
+        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, hyper_vecs)
         message.add_params(MyMessage.MSG_ARG_KEY_NUM_SAMPLES, local_sample_num)
         self.send_message(message)
 
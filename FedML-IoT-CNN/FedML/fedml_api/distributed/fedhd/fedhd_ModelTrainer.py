@@ -9,6 +9,14 @@ try:
     from fedml_core.trainer.model_trainer import ModelTrainer
 except ImportError:
     from FedML.fedml_core.trainer.model_trainer import ModelTrainer
+from .packed_hv import to_message, is_packed, from_message, pack_bipolar, unpack_bipolar, classify
+from .encoded_cache import EncodedFeatureCache, encoder_fingerprint
+try:
+    from fedml_api.data_preprocessing.partition_plan import plan_key
+    from fedml_api.model.hd.encoders import build_encoder
+except ImportError:
+    from FedML.fedml_api.data_preprocessing.partition_plan import plan_key
+    from FedML.fedml_api.model.hd.encoders import build_encoder
 
 
 
@@ -21,13 +29,55 @@ class MyModelTrainer(ModelTrainer):
         self.round = 0;
         self.device = device
         self.partition_method = args.partition_method
+        # bipolar mode: class hypervectors are exchanged bit-packed and inference
+        # uses Hamming distance on packed encodings, see packed_hv.py
+        self.bipolar = bool(getattr(args, "hd_bipolar", 0))
+        self.packed_class_hvs = None
+        # the encoder is frozen, its outputs can be cached across epochs and rounds
+        self.encoded_cache = EncodedFeatureCache.from_args(args)
+        self._encoder_fingerprint = None
+
+    # data to iterate and whether it is already encoded
+    def encoded_batches(self, data, name, args):
+        if self.encoded_cache is None:
+            return data, False
+        if self._encoder_fingerprint is None:
+            self._encoder_fingerprint = encoder_fingerprint(self.encoder)
+        key = (self.partition_key(args), name, self.id, self._encoder_fingerprint)
+        return self.encoded_cache.get(key, data, self.encoder.to(self.device), self.device), True
+
+    # the samples of a client id depend on the whole partition configuration, as for the partition plans
+    def partition_key(self, args):
+        return plan_key(args.dataset, self.partition_method, getattr(args, "partition_label", None),
+                        getattr(args, "partition_alpha", 0.0), getattr(args, "partition_secondary", False),
+                        getattr(args, "partition_min_cls", 0), getattr(args, "partition_max_cls", 0),
+                        getattr(args, "client_num_in_total", 0), getattr(args, "data_size_per_client", 0),
+                        getattr(args, "partition_seed", 0))
+
+    # seeded encoders are described by their config, None for encoders that only exist as weights
+    def get_encoder_config(self):
+        if hasattr(self.encoder, "encoder_config"):
+            return self.encoder.encoder_config()
+        return None
+
+    # rebuild the encoder the server uses from its config
+    def set_encoder_config(self, encoder_config):
+        self.encoder = build_encoder(encoder_config)
+        self._encoder_fingerprint = None
 
     # get hypervectors
     def get_model_params(self):
+        if self.bipolar:
+            return to_message(self.classifier.class_hvs)
         return self.classifier.class_hvs.clone().to(self.device)
 
     # set hypervectors
     def set_model_params(self, model_parameters):
+        if is_packed(model_parameters):
+            self.packed_class_hvs, dim = from_message(model_parameters)
+            model_parameters = unpack_bipolar(self.packed_class_hvs, dim)
+        elif self.bipolar:
+            self.packed_class_hvs = pack_bipolar(model_parameters)
         self.classifier.class_hvs = nn.Parameter(model_parameters, requires_grad=False)
     
 
@@ -40,13 +90,15 @@ class MyModelTrainer(ModelTrainer):
         
         self.classifier.train()
 
+        train_data, encoded = self.encoded_batches(train_data, "train", args)
         for epoch in range(args.epochs):
             overall_acc = 0
             for batch_idx, (x, labels) in enumerate(train_data):
                 print("TRAINING------------------", batch_idx)
                 x = x.to(self.device)
                 labels = labels.to(self.device).type(torch.int)
-                x = encoder(x)
+                if not encoded:
+                    x = encoder(x)
 
                 labels_hat = self.classifier(x, labels)
                 
@@ -62,6 +114,9 @@ class MyModelTrainer(ModelTrainer):
             overall_acc /= (batch_idx + 1)
             self.classifier.oneshot = True
 
+        # class_hvs moved on, the packed copy is rebuilt at the next test
+        self.packed_class_hvs = None
+
         # if noniid, update lr
         self.round+=1
         if self.partition_method=="noniid":
@@ -84,6 +139,7 @@ class MyModelTrainer(ModelTrainer):
         self.classifier.eval()
 
         overall_acc = 0
+        test_data, encoded = self.encoded_batches(test_data, "test", args)
         for batch_idx, (x, target) in enumerate(test_data):
             if batch_selection!=None and batch_idx not in batch_selection:
                 continue
@@ -92,11 +148,16 @@ class MyModelTrainer(ModelTrainer):
             x = x.to(self.device)
             target = target.to(self.device)
             
-            x = encoder(x)
+            if not encoded:
+                x = encoder(x)
 
-            y_hat = self.classifier(x)
-            
-            _, y_hat = torch.max(y_hat, dim=1)
+            if self.bipolar:
+                if self.packed_class_hvs is None:
+                    self.packed_class_hvs = pack_bipolar(self.classifier.class_hvs)
+                y_hat = torch.from_numpy(classify(pack_bipolar(x), self.packed_class_hvs)).to(self.device)
+            else:
+                y_hat = self.classifier(x)
+                _, y_hat = torch.max(y_hat, dim=1)
             
             acc = accuracy(y_hat, target)
             overall_acc += acc
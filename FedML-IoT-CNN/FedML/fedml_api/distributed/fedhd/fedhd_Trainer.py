@@ -22,6 +22,9 @@ class fedHD_Trainer(object):
     def update_model(self, hyper_vecs):
         self.trainer.set_model_params(hyper_vecs)
 
+    def update_encoder(self, encoder_config):
+        self.trainer.set_encoder_config(encoder_config)
+
 
     """ not used
     def update_dataset(self, client_index):
@@ -0,0 +1,25 @@
+"""
+    Encoded feature cache keys of the FedHD encoders.
+
+    usage (from the FedML directory):
+        python -m pytest fedml_api/distributed/fedhd/test_encoded_cache.py
+"""
+from .encoded_cache import encoder_fingerprint
+from ...model.hd.encoders import DenseProjectionEncoder, LevelIDEncoder, SeededProjectionEncoder, \
+    SparseTernaryProjectionEncoder
+
+
+def test_fingerprint_tells_encoders_apart():
+    for encoder_class in (DenseProjectionEncoder, SparseTernaryProjectionEncoder, SeededProjectionEncoder,
+                          LevelIDEncoder):
+        reference = encoder_fingerprint(encoder_class(32, 256, seed=0))
+        assert encoder_fingerprint(encoder_class(32, 256, seed=0)) == reference
+        assert encoder_fingerprint(encoder_class(32, 256, seed=1)) != reference
+        assert encoder_fingerprint(encoder_class(32, 512, seed=0)) != reference
+        assert encoder_fingerprint(encoder_class(16, 256, seed=0)) != reference
+
+
+def test_fingerprint_covers_level_range():
+    reference = encoder_fingerprint(LevelIDEncoder(32, 256))
+    assert encoder_fingerprint(LevelIDEncoder(32, 256, high=2.0)) != reference
+    assert encoder_fingerprint(LevelIDEncoder(32, 256, levels=8)) != reference
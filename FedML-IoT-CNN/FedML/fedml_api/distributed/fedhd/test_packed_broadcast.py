@@ -0,0 +1,95 @@
+"""
+    The global model broadcast after a FedHD round is bit-packed in bipolar
+    mode, for rounds closed by the last upload and by the round scheduler.
+    The server runs on LocalComm (the MPI stand-in), the clients' uploads are
+    handed to its handler directly.
+
+    usage (from the FedML directory):
+        python -m pytest fedml_api/distributed/fedhd/test_packed_broadcast.py
+"""
+import argparse
+
+import torch
+from torch import nn
+
+from .FedhdAggregator import FedHDAggregator
+from .FedhdServerManager import FedHDServerManager
+from .fedhd_ModelTrainer import MyModelTrainer
+from .message_define import MyMessage
+from .packed_hv import is_packed
+from ...model.hd.encoders import SeededProjectionEncoder
+try:
+    from fedml_core.distributed.communication.message import Message
+    from fedml_core.distributed.communication.mpi.local_comm import LocalComm
+except ImportError:
+    from FedML.fedml_core.distributed.communication.message import Message
+    from FedML.fedml_core.distributed.communication.mpi.local_comm import LocalComm
+
+CLASSES, FEATURES, D = 3, 16, 256
+
+
+class CentroidClassifier(nn.Module):
+    """ the class hypervectors and a dot product score, enough for the server side """
+
+    def __init__(self):
+        super(CentroidClassifier, self).__init__()
+        self.class_hvs = nn.Parameter(torch.zeros(CLASSES, D), requires_grad=False)
+
+    def forward(self, x, labels=None):
+        return x @ self.class_hvs.t()
+
+
+def make_args(**kwargs):
+    args = dict(hd_bipolar=1, comm_round=2, client_num_per_round=2, partition_method="homo", dataset="har",
+                wire_format="binary")
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def run_round(args, client_num=2):
+    torch.manual_seed(0)
+    device = torch.device("cpu")
+    test_global = [(torch.rand(8, FEATURES), torch.randint(0, CLASSES, (8,)))]
+    trainer = MyModelTrainer((SeededProjectionEncoder(FEATURES, D), CentroidClassifier()), args, device)
+    trainer.set_id(0)
+    aggregator = FedHDAggregator(None, test_global, 0, None, None, None, client_num, device, args, trainer)
+
+    comms = LocalComm.create_world(client_num + 1)
+    # the only test batch is 0, the server test after the round selects none
+    manager = FedHDServerManager(args, aggregator, comms[0], 0, client_num + 1, backend="MPI", batch_selection=[1])
+    if manager.round_scheduler is not None:
+        # what run() does before it blocks on the receive loop
+        manager.round_scheduler.start_round(0, range(1, client_num + 1), manager._on_round_deadline)
+    try:
+        for sender_id in range(1, client_num + 1):
+            client = MyModelTrainer((SeededProjectionEncoder(FEATURES, D), CentroidClassifier()), args, device)
+            client.set_model_params(torch.randn(CLASSES, D))
+            message = Message(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER, sender_id, 0)
+            message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, client.get_model_params())
+            message.add_params(MyMessage.MSG_ARG_KEY_NUM_SAMPLES, 10)
+            manager.handle_message_receive_model_from_client(message)
+
+        received = []
+        for rank in range(1, client_num + 1):
+            message = Message()
+            message.init_from_payload(comms[rank].recv())
+            received.append(message)
+        return received
+    finally:
+        if manager.round_scheduler is not None:
+            manager.round_scheduler.cancel()
+        manager.com_manager.stop_receive_message()
+
+
+def check_sync_messages(received):
+    for message in received:
+        assert message.get_type() == MyMessage.MSG_TYPE_S2C_SYNC_MODEL_TO_CLIENT
+        assert is_packed(message.get(MyMessage.MSG_ARG_KEY_MODEL_PARAMS))
+
+
+def test_round_broadcast_is_packed():
+    check_sync_messages(run_round(make_args()))
+
+
+def test_scheduled_round_broadcast_is_packed():
+    check_sync_messages(run_round(make_args(round_target=2)))
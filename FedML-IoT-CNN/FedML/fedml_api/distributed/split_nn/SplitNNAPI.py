@@ -2,6 +2,9 @@ from mpi4py import MPI
 
 from fedml_api.distributed.split_nn.client import SplitNN_client
 from fedml_api.distributed.split_nn.client_manager import SplitNNClientManager
+from fedml_api.distributed.split_nn.pipeline import PipelinedSplitNN_client, PipelinedSplitNN_server
+from fedml_api.distributed.split_nn.pipeline_manager import PipelinedSplitNNClientManager, \
+    PipelinedSplitNNServerManager
 from fedml_api.distributed.split_nn.server import SplitNN_server
 from fedml_api.distributed.split_nn.server_manager import SplitNNServerManager
 
@@ -25,8 +28,12 @@ def SplitNN_distributed(process_id, worker_number, device, comm, client_model,
 def init_server(comm, server_model, process_id, worker_number, device, args):
     arg_dict = {"comm": comm, "model": server_model, "max_rank": worker_number - 1,
                 "rank": process_id, "device": device, "args": args}
-    server = SplitNN_server(arg_dict)
-    server_manager = SplitNNServerManager(arg_dict, server)
+    if getattr(args, "micro_batches", 0) > 0:
+        server = PipelinedSplitNN_server(arg_dict)
+        server_manager = PipelinedSplitNNServerManager(arg_dict, server)
+    else:
+        server = SplitNN_server(arg_dict)
+        server_manager = SplitNNServerManager(arg_dict, server)
     server_manager.run()
 
 def init_client(comm, client_model, worker_number, train_data_local, test_data_local,
@@ -34,6 +41,10 @@ def init_client(comm, client_model, worker_number, train_data_local, test_data_l
     arg_dict = {"comm": comm, "trainloader": train_data_local, "testloader": test_data_local,
                 "model": client_model, "rank": process_id, "server_rank": server_rank,
                 "max_rank": worker_number - 1, "epochs": epochs, "device": device, "args": args}
-    client = SplitNN_client(arg_dict)
-    client_manager = SplitNNClientManager(arg_dict, client)
+    if getattr(args, "micro_batches", 0) > 0:
+        client = PipelinedSplitNN_client(arg_dict)
+        client_manager = PipelinedSplitNNClientManager(arg_dict, client)
+    else:
+        client = SplitNN_client(arg_dict)
+        client_manager = SplitNNClientManager(arg_dict, client)
     client_manager.run()
@@ -39,4 +39,5 @@ class SplitNN_client():
 
     def train_mode(self):
         self.dataloader = iter(self.trainloader)
+        self.batch_idx = 0
         self.model.train()
@@ -0,0 +1,187 @@
+import logging
+
+import torch
+
+from fedml_api.distributed.split_nn.client import SplitNN_client
+from fedml_api.distributed.split_nn.server import SplitNN_server
+
+PAYLOAD_TYPES = ("float32", "float16", "int8")
+
+
+class PayloadCodec(object):
+    """
+        Encoding of the activations and gradients SplitNN sends: float32 as
+        is, float16, or int8 with one symmetric scale per tensor (sent as
+        [int8 tensor, scale]). Decoding always gives float32 back.
+    """
+
+    def __init__(self, payload="float32"):
+        if payload not in PAYLOAD_TYPES:
+            raise ValueError("unknown payload type: {} (expected one of {})".format(payload, ", ".join(PAYLOAD_TYPES)))
+        self.payload = payload
+
+    def encode(self, tensor):
+        tensor = tensor.detach()
+        if self.payload == "float16":
+            return tensor.half()
+        if self.payload == "int8":
+            scale = float(tensor.abs().max()) / 127.0 or 1.0
+            return [torch.round(tensor / scale).to(torch.int8), scale]
+        return tensor
+
+    def decode(self, payload, device):
+        if isinstance(payload, (list, tuple)):
+            quantized, scale = payload
+            return quantized.to(device).float().mul_(scale)
+        return payload.to(device).float()
+
+
+class PipelinedSplitNN_client(SplitNN_client):
+    """
+        SplitNN client that splits every batch into micro_batches parts and
+        sends their activations one after the other without waiting for the
+        gradients (GPipe schedule): the server computes micro-batch i while
+        the client computes i + 1. Gradients are applied as they come back
+        and accumulated; the optimizer steps once all micro-batches of the
+        batch are back, so a batch gets the same update as in lockstep.
+        At most micro_batches activation graphs are kept.
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        options = args["args"]
+        self.micro_batches = max(1, getattr(options, "micro_batches", 1))
+        self.codec = PayloadCodec(getattr(options, "splitnn_payload", "float32"))
+        # micro-batch index -> activations waiting for their gradient
+        self.in_flight = dict()
+
+    def next_batch(self):
+        """ the (inputs, labels) micro-batches of the next batch, None at the end of the loader """
+        try:
+            inputs, labels = next(self.dataloader)
+        except StopIteration:
+            return None
+        inputs, labels = inputs.to(self.device), labels.to(self.device)
+        return list(zip(inputs.chunk(self.micro_batches), labels.chunk(self.micro_batches)))
+
+    def forward_micro_batch(self, micro_idx, inputs):
+        if not self.model.training:
+            with torch.no_grad():
+                return self.codec.encode(self.model(inputs))
+        acts = self.model(inputs)
+        self.in_flight[micro_idx] = acts
+        return self.codec.encode(acts)
+
+    def backward_micro_batch(self, micro_idx, grads):
+        """ True once the gradients of every micro-batch of the batch are in """
+        acts = self.in_flight.pop(micro_idx)
+        acts.backward(self.codec.decode(grads, acts.device))
+        return not self.in_flight
+
+    def step(self):
+        self.optimizer.step()
+        self.optimizer.zero_grad()
+
+
+class _ClientState(object):
+    def __init__(self):
+        self.phase = "train"
+        self.epoch = 0
+        self.reset()
+
+    def reset(self):
+        self.total = 0
+        self.correct = 0
+        self.val_loss = 0
+        self.step = 0
+
+
+class PipelinedSplitNN_server(SplitNN_server):
+    """
+        SplitNN server for PipelinedSplitNN_client, serving every client
+        concurrently instead of the active_node round-robin.
+
+        Each micro-batch is forwarded and backwarded as soon as it arrives,
+        with its loss weighted by its share of the batch, so that the
+        accumulated gradient is the one of the whole batch; the optimizer
+        steps on the last micro-batch of a batch. Gradients of different
+        clients are accumulated apart: the .grad tensors of the model are
+        swapped for the ones of the client whose micro-batch comes in, which
+        costs nothing while a single client is sending.
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        options = args["args"]
+        self.device = args.get("device", torch.device("cpu"))
+        self.model.to(self.device)
+        self.codec = PayloadCodec(getattr(options, "splitnn_payload", "float32"))
+        self.params = list(self.model.parameters())
+        self.clients = dict()
+        self.grad_owner = None
+        # client -> its .grad tensors while another client owns the model's
+        self.grad_stash = dict()
+
+    def client_state(self, client):
+        if client not in self.clients:
+            self.clients[client] = _ClientState()
+        return self.clients[client]
+
+    def micro_batch(self, client, payload, labels, batch_size, last):
+        """ the encoded gradients of the activations, None in validation """
+        state = self.client_state(client)
+        acts = self.codec.decode(payload, self.device)
+        labels = labels.to(self.device)
+
+        if state.phase == "validation":
+            self.model.eval()
+            with torch.no_grad():
+                loss = self._forward(state, acts, labels)
+            state.val_loss += loss.item()
+            return None
+
+        self.model.train()
+        self._own_grads(client)
+        acts.requires_grad_()
+        loss = self._forward(state, acts, labels)
+        if state.step % self.log_step == 0:
+            logging.info("client={} phase=train acc={} loss={} epoch={} and step={}"
+                         .format(client, state.correct / state.total, loss.item(), state.epoch, state.step))
+        (loss * (labels.size(0) / batch_size)).backward()
+        if last:
+            self.optimizer.step()
+            self.optimizer.zero_grad()
+        return self.codec.encode(acts.grad)
+
+    def eval_mode(self, client):
+        state = self.client_state(client)
+        state.phase = "validation"
+        state.reset()
+
+    def validation_over(self, client):
+        state = self.client_state(client)
+        # per micro-batch, as the lockstep server's is per batch
+        logging.info("client={} phase={} acc={} loss={} epoch={} and step={}"
+                     .format(client, state.phase, state.correct / max(1, state.total),
+                             state.val_loss / max(1, state.step), state.epoch, state.step))
+        state.epoch += 1
+        state.phase = "train"
+        state.reset()
+
+    def _forward(self, state, acts, labels):
+        logits = self.model(acts)
+        loss = self.criterion(logits, labels)
+        state.total += labels.size(0)
+        state.correct += logits.argmax(1).eq(labels).sum().item()
+        state.step += 1
+        return loss
+
+    def _own_grads(self, client):
+        if self.grad_owner == client:
+            return
+        if self.grad_owner is not None:
+            self.grad_stash[self.grad_owner] = [p.grad for p in self.params]
+        grads = self.grad_stash.pop(client, None)
+        for i, p in enumerate(self.params):
+            p.grad = None if grads is None else grads[i]
+        self.grad_owner = client
@@ -0,0 +1,106 @@
+import logging
+
+from fedml_api.distributed.split_nn.client_manager import SplitNNClientManager
+from fedml_api.distributed.split_nn.message_define import MyMessage
+from fedml_api.distributed.split_nn.server_manager import SplitNNServerManager
+from fedml_core.distributed.client.client_manager import ClientManager
+from fedml_core.distributed.communication.message import Message
+
+
+class PipelinedSplitNNClientManager(SplitNNClientManager):
+    """
+        Drives a PipelinedSplitNN_client: every client starts training at
+        once (no semaphore), sends the micro-batches of a batch back to back
+        and fetches the next batch when the last gradient of the current one
+        has been applied. Validation runs after every epoch, as in lockstep.
+    """
+
+    def run(self):
+        logging.info("Starting the pipelined protocol at node {}".format(self.trainer.rank))
+        self.run_batch()
+        ClientManager.run(self)
+
+    def register_message_receive_handlers(self):
+        self.register_message_receive_handler(MyMessage.MSG_TYPE_S2C_GRADS,
+                                              self.handle_message_gradients)
+
+    def run_batch(self):
+        micro_batches = self.trainer.next_batch()
+        if micro_batches is None:
+            logging.info("Epoch over at node {}".format(self.rank))
+            self.run_eval()
+            return
+        self.send_micro_batches(micro_batches)
+        self.trainer.batch_idx += 1
+
+    def send_micro_batches(self, micro_batches):
+        batch_size = sum(labels.size(0) for _, labels in micro_batches)
+        for micro_idx, (inputs, labels) in enumerate(micro_batches):
+            payload = self.trainer.forward_micro_batch(micro_idx, inputs)
+            self.send_micro_batch_to_server(self.trainer.SERVER_RANK, payload, labels,
+                                            [micro_idx, len(micro_batches), batch_size])
+
+    def run_eval(self):
+        self.send_validation_signal_to_server(self.trainer.SERVER_RANK)
+        self.trainer.eval_mode()
+        micro_batches = self.trainer.next_batch()
+        while micro_batches is not None:
+            self.send_micro_batches(micro_batches)
+            micro_batches = self.trainer.next_batch()
+        self.send_validation_over_to_server(self.trainer.SERVER_RANK)
+        self.round_idx += 1
+        if self.round_idx == self.trainer.MAX_EPOCH_PER_NODE:
+            self.send_finish_to_server(self.trainer.SERVER_RANK)
+            self.finish()
+            return
+        self.trainer.train_mode()
+        self.run_batch()
+
+    def handle_message_gradients(self, msg_params):
+        grads = msg_params.get(MyMessage.MSG_ARG_KEY_GRADS)
+        micro_idx = msg_params.get(MyMessage.MSG_ARG_KEY_MICRO_BATCH)
+        if self.trainer.backward_micro_batch(micro_idx, grads):
+            self.trainer.step()
+            self.run_batch()
+
+    def send_micro_batch_to_server(self, receive_id, payload, labels, micro_batch):
+        message = Message(MyMessage.MSG_TYPE_C2S_SEND_ACTS, self.get_sender_id(), receive_id)
+        message.add_params(MyMessage.MSG_ARG_KEY_ACTS, (payload, labels))
+        message.add_params(MyMessage.MSG_ARG_KEY_MICRO_BATCH, micro_batch)
+        self.send_message(message)
+
+
+class PipelinedSplitNNServerManager(SplitNNServerManager):
+    """
+        Serves the micro-batches of every PipelinedSplitNNClientManager in
+        arrival order and finishes once all clients have.
+    """
+
+    def __init__(self, arg_dict, trainer, backend="MPI"):
+        super().__init__(arg_dict, trainer, backend)
+        self.finished_clients = set()
+
+    def handle_message_acts(self, msg_params):
+        sender = msg_params.get(MyMessage.MSG_ARG_KEY_SENDER)
+        payload, labels = msg_params.get(MyMessage.MSG_ARG_KEY_ACTS)
+        micro_idx, num_micro_batches, batch_size = msg_params.get(MyMessage.MSG_ARG_KEY_MICRO_BATCH)
+        grads = self.trainer.micro_batch(sender, payload, labels, batch_size, micro_idx == num_micro_batches - 1)
+        if grads is not None:
+            self.send_micro_batch_grads_to_client(sender, grads, micro_idx)
+
+    def handle_message_validation_mode(self, msg_params):
+        self.trainer.eval_mode(msg_params.get(MyMessage.MSG_ARG_KEY_SENDER))
+
+    def handle_message_validation_over(self, msg_params):
+        self.trainer.validation_over(msg_params.get(MyMessage.MSG_ARG_KEY_SENDER))
+
+    def handle_message_finish_protocol(self, msg_params):
+        self.finished_clients.add(msg_params.get(MyMessage.MSG_ARG_KEY_SENDER))
+        if len(self.finished_clients) == self.trainer.MAX_RANK:
+            self.finish()
+
+    def send_micro_batch_grads_to_client(self, receive_id, grads, micro_idx):
+        message = Message(MyMessage.MSG_TYPE_S2C_GRADS, self.get_sender_id(), receive_id)
+        message.add_params(MyMessage.MSG_ARG_KEY_GRADS, grads)
+        message.add_params(MyMessage.MSG_ARG_KEY_MICRO_BATCH, micro_idx)
+        self.send_message(message)
@@ -38,9 +38,9 @@ class SplitNN_server():
         self.reset_local_params()
 
     def forward_pass(self, acts, labels):
-        self.acts = acts
+        # the activations arrive detached from the client's graph
+        self.acts = acts.requires_grad_()
         self.optimizer.zero_grad()
-        self.acts.retain_grad()
         logits = self.model(acts)
         _, predictions = logits.max(1)
         self.loss = self.criterion(logits, labels)
@@ -1,3 +1,5 @@
+import logging
+
 from fedml_api.distributed.split_nn.message_define import MyMessage
 from fedml_core.distributed.server.server_manager import ServerManager
 from fedml_core.distributed.communication.message import Message
@@ -41,5 +43,11 @@ class SplitNNServerManager(ServerManager):
     def handle_message_validation_over(self, msg_params):
         self.trainer.validation_over()
 
-    def handle_message_finish_protocol(self):
+    def handle_message_finish_protocol(self, msg_params):
         self.finish()
+
+    def finish(self):
+        # stops the receive loop instead of ServerManager.finish()'s MPI.COMM_WORLD.Abort(), so that
+        # every rank returns from run() once the protocol is over
+        logging.info("__finish server")
+        self.com_manager.stop_receive_message()
@@ -1,21 +1,12 @@
 import numpy as np
 
+from fedml_core.security.finite_field import batch_inv_mod, lagrange_coeffs, matmul_mod, mul_mod, pow_mod, \
+    prod_mod, vandermonde
 
-def modular_inv(a, p):
-    x, y, m = 1, 0, p
-    while a > 1:
-        q = a // m
-        t = m
-
-        m = np.mod(a, m)
-        a = t
-        t = y
-
-        y, x = x - np.int64(q) * np.int64(y), t
 
-        if x < 0:
-            x = np.mod(x, p)
-    return np.mod(x, p)
+def modular_inv(a, p):
+    # a scalar or an array, all inverted with a single exponentiation
+    return batch_inv_mod(a, p)
 
 
 def divmod(_num, _den, _p):
@@ -24,39 +15,17 @@ def divmod(_num, _den, _p):
     _den = np.mod(_den, _p)
     _inv = modular_inv(_den, _p)
     # print(_num,_den,_inv)
-    return np.mod(np.int64(_num) * np.int64(_inv), _p)
+    return mul_mod(_num, _inv, _p)
 
 
 def PI(vals, p):  # upper-case PI -- product of inputs
-    accum = 1
-
-    for v in vals:
-        tmp = np.mod(v, p)
-        accum = np.mod(accum * tmp, p)
-    return accum
+    return prod_mod(vals, p)[()]
 
 
 def gen_Lagrange_coeffs(alpha_s, beta_s, p, is_K1=0):
     if is_K1 == 1:
-        num_alpha = 1
-    else:
-        num_alpha = len(alpha_s)
-    U = np.zeros((num_alpha, len(beta_s)), dtype='int64')
-    #         U = [[0 for col in range(len(beta_s))] for row in range(len(alpha_s))]
-    # print(alpha_s)
-    # print(beta_s)
-    for i in range(num_alpha):
-        for j in range(len(beta_s)):
-            cur_beta = beta_s[j]
-
-            den = PI([cur_beta - o for o in beta_s if cur_beta != o], p)
-            num = PI([alpha_s[i] - o for o in beta_s if cur_beta != o], p)
-            U[i][j] = divmod(num, den, p)
-            # for debugging
-            # print(i,j,cur_beta,alpha_s[i])
-            # print(test)
-            # print(den,num) 
-    return U.astype('int64')
+        alpha_s = alpha_s[:1]
+    return lagrange_coeffs(alpha_s, beta_s, p)
 
 
 def BGW_encoding(X, N, T, p):
@@ -65,26 +34,17 @@ def BGW_encoding(X, N, T, p):
 
     alpha_s = range(1, N + 1)
     alpha_s = np.int64(np.mod(alpha_s, p))
-    X_BGW = np.zeros((N, m, d), dtype='int64')
     R = np.random.randint(p, size=(T + 1, m, d))
     R[0, :, :] = np.mod(X, p)
 
-    for i in range(N):
-        for t in range(T + 1):
-            X_BGW[i, :, :] = np.mod(X_BGW[i, :, :] + R[t, :, :] * (alpha_s[i] ** t), p)
+    # X_BGW[i] = sum_t R[t] * alpha_i^t
+    X_BGW = matmul_mod(vandermonde(alpha_s, T + 1, p), R, p)
     return X_BGW
 
 
 def gen_BGW_lambda_s(alpha_s, p):
-    lambda_s = np.zeros((1, len(alpha_s)), dtype='int64')
-
-    for i in range(len(alpha_s)):
-        cur_alpha = alpha_s[i]
-
-        den = PI([cur_alpha - o for o in alpha_s if cur_alpha != o], p)
-        num = PI([0 - o for o in alpha_s if cur_alpha != o], p)
-        lambda_s[0][i] = divmod(num, den, p)
-    return lambda_s.astype('int64')
+    # the Lagrange basis polynomials of alpha_s at 0
+    return lagrange_coeffs([0], alpha_s, p)
 
 
 def BGW_decoding(f_eval, worker_idx, p):  # decode the output from T+1 evaluation points
@@ -102,7 +62,7 @@ def BGW_decoding(f_eval, worker_idx, p):  # decode the output from T+1 evaluatio
     lambda_s = gen_BGW_lambda_s(alpha_s_eval, p).astype('int64')
     # t2 = time.time()
     # print(lambda_s.shape)
-    f_recon = np.mod(np.dot(lambda_s, f_eval), p)
+    f_recon = matmul_mod(lambda_s, f_eval, p)
     # t3 = time.time()
     # print 'time info for BGW_dec', t1-t0, t2-t1, t3-t2
     return f_recon
@@ -127,10 +87,7 @@ def LCC_encoding(X, N, K, T, p):
     U = gen_Lagrange_coeffs(alpha_s, beta_s, p)
     # print U
 
-    X_LCC = np.zeros((N, m // K, d), dtype='int64')
-    for i in range(N):
-        for j in range(K + T):
-            X_LCC[i, :, :] = np.mod(X_LCC[i, :, :] + np.mod(U[i][j] * X_sub[j, :, :], p), p)
+    X_LCC = matmul_mod(U, X_sub, p)
     return X_LCC
 
 
@@ -157,10 +114,7 @@ def LCC_encoding_w_Random(X, R_, N, K, T, p):
     U = gen_Lagrange_coeffs(alpha_s, beta_s, p)
     # print U
 
-    X_LCC = np.zeros((N, m // K, d), dtype='int64')
-    for i in range(N):
-        for j in range(K + T):
-            X_LCC[i, :, :] = np.mod(X_LCC[i, :, :] + np.mod(U[i][j] * X_sub[j, :, :], p), p)
+    X_LCC = matmul_mod(U, X_sub, p)
     return X_LCC
 
 
@@ -184,11 +138,7 @@ def LCC_encoding_w_Random_partial(X, R_, N, K, T, p, worker_idx):
     U = gen_Lagrange_coeffs(alpha_s_eval, beta_s, p)
     # print U
 
-    N_out = U.shape[0]
-    X_LCC = np.zeros((N_out, m // K, d), dtype='int64')
-    for i in range(N_out):
-        for j in range(K + T):
-            X_LCC[i, :, :] = np.mod(X_LCC[i, :, :] + np.mod(U[i][j] * X_sub[j, :, :], p), p)
+    X_LCC = matmul_mod(U, X_sub, p)
     return X_LCC
 
 
@@ -206,9 +156,9 @@ def LCC_decoding(f_eval, f_deg, N, K, T, worker_idx, p):
 
     # print U_dec 
 
-    f_recon = np.mod((U_dec).dot(f_eval), p)
+    f_recon = matmul_mod(U_dec, f_eval, p)
 
-    return f_recon.astype('int64')
+    return f_recon
 
 
 def Gen_Additive_SS(d, n_out, p):
@@ -234,16 +184,10 @@ def LCC_encoding_with_points(X, alpha_s, beta_s, p):
     # beta_s = np.concatenate((alpha_s, beta_s))
     # print beta_s
 
-    U = gen_Lagrange_coeffs(beta_s, alpha_s, p).astype('int')
+    U = gen_Lagrange_coeffs(beta_s, alpha_s, p)
     # print U
 
-    X_LCC = np.zeros((len(beta_s), d), dtype='int')
-    for i in range(len(beta_s)):
-        X_LCC[i, :] = np.dot(np.reshape(U[i, :], (1, len(alpha_s))), X)
-    # print X
-    # print np.mod(X_LCC, p)
-
-    return np.mod(X_LCC, p)
+    return matmul_mod(U, X, p)
 
 
 def LCC_decoding_with_points(f_eval, eval_points, target_points, p):
@@ -254,7 +198,7 @@ def LCC_decoding_with_points(f_eval, eval_points, target_points, p):
 
     # print U_dec 
 
-    f_recon = np.mod((U_dec).dot(f_eval), p)
+    f_recon = matmul_mod(U_dec, f_eval, p)
     # print f_recon
 
     return f_recon
@@ -265,11 +209,11 @@ def my_pk_gen(my_sk, p, g):
     if g == 0:
         return my_sk
     else:
-        return np.mod(g ** my_sk, p)
+        return pow_mod(g, my_sk, p)
 
 
 def my_key_agreement(my_sk, u_pk, p, g):
     if g == 0:
-        return np.mod(my_sk * u_pk, p)
+        return mul_mod(np.mod(my_sk, p), np.mod(u_pk, p), p)
     else:
-        return np.mod(u_pk ** my_sk, p)
+        return pow_mod(u_pk, my_sk, p)
@@ -6,6 +6,11 @@ from torchvision import datasets, transforms
 from torch.optim.lr_scheduler import StepLR
 import copy
 
+try:
+    from fedml_core.trainer.flat_params import FlatParamsMixin
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamsMixin
+
 
 
 class BasicBlock(nn.Module):
@@ -67,7 +72,7 @@ class Bottleneck(nn.Module):
         return out
 
 
-class CIFAR10_Net(nn.Module):
+class CIFAR10_Net(FlatParamsMixin, nn.Module):
     def __init__(self, block=BasicBlock, num_blocks=[2,2,2,2], num_classes=10):
         super(CIFAR10_Net, self).__init__()
         self.in_planes = 64
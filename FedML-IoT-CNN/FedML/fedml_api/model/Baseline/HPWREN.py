@@ -6,6 +6,11 @@ from torchvision import datasets, transforms
 from torch.optim.lr_scheduler import StepLR
 import copy
 
+try:
+    from fedml_core.trainer.flat_params import FlatParamsMixin
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamsMixin
+
 
 SEQ_LEN = 24
 NUM_INPUT = 12  # input_size, corresponds to the number of features in the input
@@ -13,7 +18,7 @@ NUM_OUTPUT = 12  # output_size, the number of items in the output
 NUM_HIDDEN = 128
 NUM_LAYERS = 1
 
-class HPWREN_Net(nn.Module):
+class HPWREN_Net(FlatParamsMixin, nn.Module):
 
     def __init__(self):
         super(HPWREN_Net, self).__init__()
@@ -0,0 +1,84 @@
+"""
+    Encode throughput of the FedHD encoders on CPU.
+
+    For every D and encoder, the table reports samples/s, the memory held by
+    the encoder, and how well the encoding keeps the geometry of the input:
+    the correlation between the pairwise cosine similarities of a sample set
+    in input space and in hypervector space (1.0 = perfectly preserved).
+
+    usage (from the FedML directory):
+        python -m fedml_api.model.hd.benchmark_encoders --dims 2000 5000 10000
+"""
+import argparse
+import time
+
+import torch
+
+from fedml_api.model.hd.encoders import DenseProjectionEncoder, SparseTernaryProjectionEncoder, \
+    SeededProjectionEncoder, LevelIDEncoder
+
+
+def encoder_bytes(encoder):
+    total = 0
+    for tensor in encoder.buffers():
+        if tensor.layout == torch.sparse_csr:
+            total += sum(t.numel() * t.element_size() for t in
+                         [tensor.crow_indices(), tensor.col_indices(), tensor.values()])
+        else:
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def similarity_correlation(x, h):
+    def pairwise(v):
+        v = torch.nn.functional.normalize(v.float(), dim=1)
+        sim = v @ v.t()
+        return sim[torch.triu_indices(len(v), len(v), offset=1).unbind()]
+    a, b = pairwise(x), pairwise(h)
+    return torch.corrcoef(torch.stack([a, b]))[0, 1].item()
+
+
+def throughput(encoder, x, repeat):
+    with torch.no_grad():
+        encoder(x)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            encoder(x)
+    return repeat * x.shape[0] / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dims', type=int, nargs='+', default=[2000, 5000, 10000])
+    parser.add_argument('--in_features', type=int, default=2048)
+    parser.add_argument('--batch_size', type=int, default=128)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=0, help='torch threads, 0 keeps the default')
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    generator = torch.Generator().manual_seed(0)
+    # features in [0, 1], with structure so that similarities are not all equal
+    centers = torch.rand(8, args.in_features, generator=generator)
+    x = (centers[torch.randint(0, 8, (args.batch_size,), generator=generator)] +
+         0.2 * torch.rand(args.batch_size, args.in_features, generator=generator)).clamp(0, 1)
+
+    print("{:>6} {:<16} {:>12} {:>14} {:>12}".format("D", "encoder", "samples/s", "memory (B)", "sim. corr."))
+    for dim in args.dims:
+        encoders = [
+            DenseProjectionEncoder(args.in_features, dim),
+            SparseTernaryProjectionEncoder(args.in_features, dim),
+            SeededProjectionEncoder(args.in_features, dim),
+            LevelIDEncoder(args.in_features, dim),
+        ]
+        for encoder in encoders:
+            with torch.no_grad():
+                h = encoder(x)
+            print("{:>6} {:<16} {:>12,.0f} {:>14,d} {:>12.4f}".format(
+                dim, encoder.TYPE, throughput(encoder, x, args.repeat), encoder_bytes(encoder),
+                similarity_correlation(x, h)))
+
+
+if __name__ == '__main__':
+    main()
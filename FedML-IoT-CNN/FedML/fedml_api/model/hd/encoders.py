@@ -0,0 +1,207 @@
+import math
+
+import torch
+import torch.nn as nn
+
+
+class HDEncoder(nn.Module):
+    """
+        Base of the FedHD encoders: (batch, in_features) -> (batch, D).
+
+        Every encoder is fully determined by encoder_config(), a small dict that
+        goes into the init message, so clients rebuild the same encoder from the
+        seed with build_encoder() instead of downloading its weights.
+    """
+
+    def __init__(self, in_features, D, seed):
+        super(HDEncoder, self).__init__()
+        self.in_features = in_features
+        self.D = D
+        self.seed = seed
+
+    def encoder_config(self):
+        return {"type": self.TYPE, "in_features": self.in_features, "D": self.D, "seed": self.seed}
+
+    def _generator(self, offset=0):
+        return torch.Generator().manual_seed(self.seed * 1000003 + offset)
+
+
+class DenseProjectionEncoder(HDEncoder):
+    """
+        Reference: x @ P with a dense Gaussian (in_features x D) matrix, what the
+        torch_hd RandomProjectionEncoder does, but generated from a seed.
+        in_features * D floats of memory and multiply-adds per sample.
+    """
+    TYPE = "dense"
+
+    def __init__(self, in_features, D, seed=0):
+        super(DenseProjectionEncoder, self).__init__(in_features, D, seed)
+        self.register_buffer("projection", torch.randn(in_features, D, generator=self._generator()))
+
+    def forward(self, x):
+        return x.float() @ self.projection
+
+
+class SparseTernaryProjectionEncoder(HDEncoder):
+    """
+        Very sparse random projection (Li et al.): entries are +1 / -1 with
+        probability density / 2 each and 0 otherwise, density 1 / sqrt(in_features)
+        by default. Stored as a sparse CSR matrix, so memory and multiply-adds
+        are density times those of the dense projection; pairwise distances are
+        preserved in expectation like with the Gaussian matrix.
+    """
+    TYPE = "sparse_ternary"
+
+    def __init__(self, in_features, D, seed=0, density=None):
+        super(SparseTernaryProjectionEncoder, self).__init__(in_features, D, seed)
+        self.density = density if density is not None else 1.0 / math.sqrt(in_features)
+        generator = self._generator()
+        mask = torch.rand(D, in_features, generator=generator) < self.density
+        signs = torch.randint(0, 2, (D, in_features), generator=generator).float() * 2 - 1
+        # transposed (D x in_features) so that forward is one sparse @ dense product
+        projection_t = (signs * mask).to_sparse_csr()
+        self.register_buffer("projection_t", projection_t)
+
+    def encoder_config(self):
+        config = super(SparseTernaryProjectionEncoder, self).encoder_config()
+        config["density"] = self.density
+        return config
+
+    def forward(self, x):
+        return torch.sparse.mm(self.projection_t, x.float().t()).t()
+
+
+class SeededProjectionEncoder(HDEncoder):
+    """
+        Bipolar random projection that is never materialized: the (in_features x
+        block_size) column blocks are regenerated from the seed on every call, so
+        the encoder holds no weights and the working memory is one block. Trades
+        memory for generating the block, which is amortized over the batch.
+    """
+    TYPE = "seeded"
+    _SHIFTS = torch.arange(8, dtype=torch.uint8)
+
+    def __init__(self, in_features, D, seed=0, block_size=1024):
+        super(SeededProjectionEncoder, self).__init__(in_features, D, seed)
+        self.block_size = block_size
+
+    def encoder_config(self):
+        config = super(SeededProjectionEncoder, self).encoder_config()
+        config["block_size"] = self.block_size
+        return config
+
+    def forward(self, x):
+        x = x.float()
+        out = torch.empty(x.shape[0], self.D, dtype=torch.float32, device=x.device)
+        for block, start in enumerate(range(0, self.D, self.block_size)):
+            end = min(start + self.block_size, self.D)
+            out[:, start:end] = x @ self._block(block, end - start).to(x.device)
+        return out
+
+    def _block(self, block, columns):
+        # 8 random bits per draw, unpacked into +1 / -1
+        random_bytes = torch.randint(0, 256, (self.in_features, (columns + 7) // 8), dtype=torch.uint8,
+                                     generator=self._generator(block))
+        bits = (random_bytes.unsqueeze(2) >> self._SHIFTS) & 1
+        return bits.reshape(self.in_features, -1)[:, :columns].to(torch.float32) * 2 - 1
+
+
+class LevelIDEncoder(HDEncoder):
+    """
+        Record-based encoding: every feature has a random bipolar ID hypervector,
+        its value is quantized to one of `levels` correlated bipolar level
+        hypervectors, and the sample is the bundle sum_f ID_f * L_level(x_f).
+
+        Level l is the base level hypervector with the first l * D / (2 (levels - 1))
+        positions of a random order flipped. So position j flips for every level
+        >= t_j, and the bundle at j is colsum_j - 2 * sum_f ID_f[j] * [level_f >= t_j].
+        With the positions grouped by t_j, that is one (batch x in_features) @
+        (in_features x group) product per group. In total this is the multiply-adds
+        of one dense projection. Only int8 tables of (in_features + 1) x D are held,
+        a quarter of the float matrix.
+    """
+    TYPE = "level_id"
+
+    def __init__(self, in_features, D, seed=0, levels=16, low=0.0, high=1.0):
+        super(LevelIDEncoder, self).__init__(in_features, D, seed)
+        self.levels = levels
+        self.low = low
+        self.high = high
+        generator = self._generator()
+        ids = torch.randint(0, 2, (in_features, D), generator=generator).to(torch.int8) * 2 - 1
+        base = torch.randint(0, 2, (D,), generator=generator).to(torch.int8) * 2 - 1
+        flip_order = torch.randperm(D, generator=generator)
+
+        # threshold level of every position, 0 for positions that never flip
+        flips_per_level = D // (2 * max(levels - 1, 1))
+        threshold = torch.zeros(D, dtype=torch.long)
+        for level in range(levels - 1, 0, -1):
+            threshold[flip_order[:level * flips_per_level]] = level
+        group_order = torch.argsort(threshold, stable=True)
+        counts = torch.bincount(threshold, minlength=levels)
+
+        self.group_bounds = [0] + torch.cumsum(counts, 0).tolist()
+        self.register_buffer("group_order", group_order)
+        self.register_buffer("ids", ids[:, group_order].contiguous())
+        self.register_buffer("base", base[group_order].contiguous())
+        self.register_buffer("id_colsum", self.ids.sum(dim=0, dtype=torch.int32))
+
+    def encoder_config(self):
+        config = super(LevelIDEncoder, self).encoder_config()
+        config.update({"levels": self.levels, "low": self.low, "high": self.high})
+        return config
+
+    def level_hvs(self):
+        """ (levels, D) bipolar level hypervectors, in the original position order """
+        threshold = torch.empty(self.D, dtype=torch.long)
+        for level in range(self.levels):
+            threshold[self.group_order[self.group_bounds[level]:self.group_bounds[level + 1]]] = level
+        base = torch.empty(self.D, dtype=torch.int8)
+        base[self.group_order] = self.base
+        flipped = (torch.arange(self.levels)[:, None] >= threshold[None, :]) & (threshold[None, :] > 0)
+        return torch.where(flipped, -base, base)
+
+    def forward(self, x):
+        x = x.float().reshape(x.shape[0], -1)
+        scaled = (x - self.low) / (self.high - self.low) * (self.levels - 1)
+        level_idx = scaled.round().clamp(0, self.levels - 1)
+
+        grouped = self.id_colsum.to(torch.float32).repeat(x.shape[0], 1)
+        for level in range(1, self.levels):
+            start, end = self.group_bounds[level], self.group_bounds[level + 1]
+            if start == end:
+                continue
+            flipped = (level_idx >= level).to(torch.float32)
+            grouped[:, start:end] -= 2 * (flipped @ self.ids[:, start:end].to(torch.float32))
+        grouped *= self.base.to(torch.float32)
+
+        out = torch.empty_like(grouped)
+        out[:, self.group_order] = grouped
+        return out
+
+
+ENCODERS = {
+    DenseProjectionEncoder.TYPE: DenseProjectionEncoder,
+    SparseTernaryProjectionEncoder.TYPE: SparseTernaryProjectionEncoder,
+    SeededProjectionEncoder.TYPE: SeededProjectionEncoder,
+    LevelIDEncoder.TYPE: LevelIDEncoder,
+}
+
+
+def build_encoder(config):
+    """ the encoder described by an encoder_config() dict """
+    config = dict(config)
+    encoder_type = config.pop("type")
+    try:
+        encoder_class = ENCODERS[encoder_type]
+    except KeyError:
+        raise ValueError("unknown encoder type: {} (expected one of {})".format(
+            encoder_type, ", ".join(ENCODERS.keys())))
+    return encoder_class(**config)
+
+
+def create_encoder(args, in_features, D):
+    """ encoder selected by args.hd_encoder (default "dense") and args.hd_encoder_seed """
+    encoder_type = getattr(args, "hd_encoder", DenseProjectionEncoder.TYPE)
+    return build_encoder({"type": encoder_type, "in_features": in_features, "D": D,
+                          "seed": getattr(args, "hd_encoder_seed", 0)})
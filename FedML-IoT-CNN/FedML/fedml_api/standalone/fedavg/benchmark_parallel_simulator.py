@@ -0,0 +1,85 @@
+"""
+    Round time of standalone FedAvg with the plain client loop versus the
+    shared-memory simulator at several worker counts, and a check that every
+    run ends with the same global model.
+
+    The clients hold synthetic 28x28 images (CNN_DropOut, as for FEMNIST).
+    The speedup is bounded by the number of cores: run with --workers up to
+    os.cpu_count().
+
+    usage (from the FedML directory):
+        python -m fedml_api.standalone.fedavg.benchmark_parallel_simulator --clients 32 --workers 1 2 4
+"""
+import argparse
+import logging
+import os
+import time
+
+import torch
+import torch.utils.data as data
+import wandb
+
+from fedml_api.model.cv.cnn import CNN_DropOut
+from fedml_api.standalone.fedavg.fedavg_api import FedAvgAPI
+from fedml_api.standalone.fedavg.my_model_trainer_classification import MyModelTrainer
+
+
+def make_dataset(args):
+    generator = torch.Generator().manual_seed(args.seed)
+    centers = torch.randn(10, 28, 28, generator=generator)
+    train_local, test_local, num_local = {}, {}, {}
+    for client_idx in range(args.clients):
+        y = torch.randint(0, 10, (args.samples,), generator=generator)
+        x = centers[y] + torch.randn(args.samples, 28, 28, generator=generator)
+        train_local[client_idx] = data.DataLoader(data.TensorDataset(x, y), batch_size=args.batch_size, shuffle=True)
+        test_local[client_idx] = data.DataLoader(data.TensorDataset(x, y), batch_size=args.batch_size)
+        num_local[client_idx] = args.samples
+    num = args.clients * args.samples
+    return [num, num, None, None, num_local, train_local, test_local, 10]
+
+
+def run(args, dataset, sim_workers):
+    torch.manual_seed(args.seed)
+    model_trainer = MyModelTrainer(CNN_DropOut(only_digits=True))
+    run_args = argparse.Namespace(**vars(args))
+    run_args.sim_workers = sim_workers
+    api = FedAvgAPI(dataset, torch.device("cpu"), run_args, model_trainer)
+    start = time.perf_counter()
+    api.train()
+    elapsed = time.perf_counter() - start
+    return model_trainer.get_model_params(), elapsed / args.comm_round
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32, help='clients, all of them sampled every round')
+    parser.add_argument('--samples', type=int, default=128, help='samples per client')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--comm_round', type=int, default=2)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault("WANDB_MODE", "disabled")
+    wandb.init()
+    train_args = argparse.Namespace(client_num_in_total=args.clients, client_num_per_round=args.clients,
+                                    comm_round=args.comm_round, epochs=args.epochs, batch_size=args.batch_size,
+                                    client_optimizer="sgd", lr=0.03, wd=0.0, frequency_of_the_test=args.comm_round,
+                                    dataset="femnist", ci=0, seed=args.seed)
+    dataset = make_dataset(args)
+
+    print("%d cores, %d clients x %d samples, %d rounds" % (os.cpu_count(), args.clients, args.samples,
+                                                            args.comm_round))
+    reference, serial = run(train_args, dataset, 0)
+    print("%-12s %8.3f s / round" % ("loop", serial))
+    for workers in args.workers:
+        params, elapsed = run(train_args, dataset, workers)
+        identical = all(torch.equal(params[k], reference[k]) for k in reference)
+        print("%-12s %8.3f s / round  speedup %5.2fx  identical to the loop: %s" % (
+            "%d workers" % workers, elapsed, serial / elapsed, identical))
+
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,8 @@ class Client:
     def get_sample_number(self):
         return self.local_sample_number
 
-    def train(self):
+    def train(self, w_global):
+        self.model_trainer.set_model_params(w_global)
         self.model_trainer.train(self.local_training_data, self.device, self.args)
         weights = self.model_trainer.get_model_params()
         return weights
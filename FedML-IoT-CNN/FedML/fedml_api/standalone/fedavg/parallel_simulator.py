@@ -0,0 +1,75 @@
+import torch
+
+try:
+    from fedml_core.trainer.flat_params import FlatParamLayout, weighted_average
+    from fedml_core.trainer.fork_pool import ForkWorkerPool
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamLayout, weighted_average
+    from FedML.fedml_core.trainer.fork_pool import ForkWorkerPool
+
+
+def client_seed(round_idx, client_idx, client_num_in_total):
+    """ the torch seed client_idx trains with in round round_idx """
+    return round_idx * client_num_in_total + int(client_idx)
+
+
+class ParallelClientSimulator(object):
+    """
+        Trains the sampled clients of a standalone FedAvg round in num_workers
+        forked processes (a ForkWorkerPool) instead of one after the other.
+
+        The global model is one shared (torch.multiprocessing) float32 buffer
+        that the workers load before training a client, and every sampled
+        client writes its trained model into its own preallocated shared slot,
+        so only (round, slot, client index) tasks and done notices go through
+        the queues. The sample weighted average of the slots is then written
+        into the global buffer in place, in slot order and with the same
+        float32 operations as FedAvgAPI._aggregate.
+
+        train_client(round_idx, client_idx, model_params) trains a client from
+        model_params with the torch seed client_seed(round_idx, client_idx) and
+        returns its state_dict, so the result depends neither on the worker nor
+        on the number of workers, and is the one of the serial loop (bitwise,
+        for the same intra-op thread count).
+    """
+
+    def __init__(self, train_client, model_params, num_slots, num_workers=1):
+        self.train_client = train_client
+        self.layout = FlatParamLayout.from_state_dict(model_params)
+        self.global_flat = self.layout.flatten(model_params).share_memory_()
+        self.slots = torch.zeros(num_slots, self.layout.numel).share_memory_()
+        self.pool = ForkWorkerPool(self.train_slot, num_workers, "client simulation")
+
+    @classmethod
+    def from_args(cls, args, device, train_client, model_params):
+        """ None unless args.sim_workers is set """
+        num_workers = getattr(args, "sim_workers", 0) or 0
+        if num_workers <= 0:
+            return None
+        num_workers = ForkWorkerPool.usable_workers(num_workers, device, "client simulation")
+        return cls(train_client, model_params, args.client_num_per_round, num_workers)
+
+    def model(self):
+        """ a copy of the global model, as a state_dict """
+        return self.layout.unflatten(self.global_flat.clone())
+
+    def set_model(self, model_params):
+        self.layout.flatten(model_params, out=self.global_flat)
+
+    def train_round(self, round_idx, client_indexes, sample_nums):
+        """ trains client_indexes[i] into slot i and averages the slots into the global model, which is returned """
+        if len(client_indexes) > len(self.slots):
+            raise ValueError("{} clients sampled for {} slots".format(len(client_indexes), len(self.slots)))
+        self.pool.map((round_idx, slot, int(client_idx)) for slot, client_idx in enumerate(client_indexes))
+        self._aggregate(sample_nums)
+        return self.model()
+
+    def train_slot(self, round_idx, slot, client_idx):
+        model_params = self.train_client(round_idx, client_idx, self.layout.unflatten(self.global_flat))
+        self.layout.flatten(model_params, out=self.slots[slot])
+
+    def close(self):
+        self.pool.close()
+
+    def _aggregate(self, sample_nums):
+        weighted_average(self.slots, sample_nums, out=self.global_flat)
@@ -5,9 +5,17 @@ from fedml_api.standalone.fedavg.client import Client
 
 class Client(Client):
 
+    def __init__(self, client_idx, local_training_data, local_test_data, local_sample_number, args, device,
+                 model_trainer):
+        super().__init__(client_idx, local_training_data, local_test_data, local_sample_number, args, device,
+                         model_trainer)
+        self.model = model_trainer.model
+        self.criterion = torch.nn.CrossEntropyLoss().to(device)
+
     def train(self, global_round_idx, group_round_idx, w):
         self.model.load_state_dict(w)
         self.model.to(self.device)
+        self.model.train()
 
         if self.args.client_optimizer == "sgd":
             optimizer = torch.optim.SGD(self.model.parameters(), lr=self.args.lr)
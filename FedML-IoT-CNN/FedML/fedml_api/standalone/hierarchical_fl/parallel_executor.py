@@ -0,0 +1,61 @@
+try:
+    from fedml_core.trainer.flat_params import FlatParamLayout
+    from fedml_core.trainer.fork_pool import ForkWorkerPool
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamLayout
+    from FedML.fedml_core.trainer.fork_pool import ForkWorkerPool
+
+
+class ParallelGroupExecutor(object):
+    """
+        Trains the groups of a hierarchical FL global round in num_workers
+        forked processes (a ForkWorkerPool) instead of one after the other.
+
+        The workers are forked once the groups are set up. The global model is
+        one shared float32 buffer, so a task is only (round, group, sampled
+        clients). A worker runs Group.train as is: the clients of the group
+        one after the other and the group aggregation of every group round. It
+        sends back only the group models, one flat buffer per recorded global
+        epoch.
+
+        A group is the unit of work: its clients depend on the group model of
+        the previous group round, and fanning them out would ship every
+        client model back for the group aggregation.
+
+        Clients train with a seed of their own (see Group.train), so the group
+        models depend neither on the worker nor on the number of workers and
+        are the ones of the sequential loop (bitwise, for the same intra-op
+        thread count).
+    """
+
+    def __init__(self, group_dict, model_params, num_workers=1):
+        self.group_dict = group_dict
+        self.layout = FlatParamLayout.from_state_dict(model_params)
+        self.global_flat = self.layout.flatten(model_params).share_memory_()
+        self.pool = ForkWorkerPool(self.train_group, num_workers, "group training")
+
+    @classmethod
+    def from_args(cls, args, device, group_dict, model_params):
+        """ None unless args.group_workers is set """
+        num_workers = getattr(args, "group_workers", 0) or 0
+        if num_workers <= 0:
+            return None
+        num_workers = ForkWorkerPool.usable_workers(num_workers, device, "group training")
+        return cls(group_dict, model_params, num_workers)
+
+    def train_round(self, global_round_idx, w_global, group_to_client_indexes):
+        """ group_idx -> [(global_epoch, flat group model)] of every group in group_to_client_indexes """
+        self.layout.flatten(w_global, out=self.global_flat)
+        group_indexes = list(group_to_client_indexes.keys())
+        w_group_lists = self.pool.map((global_round_idx, group_idx,
+                                       [int(client_idx) for client_idx in group_to_client_indexes[group_idx]])
+                                      for group_idx in group_indexes)
+        return dict(zip(group_indexes, w_group_lists))
+
+    def train_group(self, global_round_idx, group_idx, client_indexes):
+        w_group_list = self.group_dict[group_idx].train(global_round_idx, self.layout.unflatten(self.global_flat),
+                                                        client_indexes)
+        return [(global_epoch, self.layout.flatten(w)) for global_epoch, w in w_group_list]
+
+    def close(self):
+        self.pool.close()
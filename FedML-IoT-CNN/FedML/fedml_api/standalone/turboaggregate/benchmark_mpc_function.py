@@ -0,0 +1,148 @@
+"""
+    Lagrange coefficients, BGW and LCC encoding and decoding of mpc_function
+    against the per-element loops they replace, for N workers and a model
+    of dimension d (one row of d values per worker, m = K rows for LCC).
+
+    The loop versions are the previous implementations, kept here. They
+    multiply int64 values directly, so they are only exact while
+    p^2 < 2^63 (LCC) and p * N^T < 2^63 (BGW, alpha^t is not reduced): past
+    that, "equal: False" is the loop overflowing, the decoding checks show
+    that the vectorized shares are right. The loop versions are skipped
+    past --max_loop_ops element operations, which they would take minutes for.
+
+    usage (from the FedML directory):
+        python -m fedml_api.standalone.turboaggregate.benchmark_mpc_function --N 50 100 200 500 --d 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from fedml_api.standalone.turboaggregate import mpc_function
+
+
+def loop_modular_inv(a, p):
+    x, y, m = 1, 0, p
+    while a > 1:
+        q = a // m
+        t = m
+        m = np.mod(a, m)
+        a = t
+        t = y
+        y, x = x - np.int64(q) * np.int64(y), t
+        if x < 0:
+            x = np.mod(x, p)
+    return np.mod(x, p)
+
+
+def loop_PI(vals, p):
+    accum = 1
+    for v in vals:
+        accum = np.mod(accum * np.mod(v, p), p)
+    return accum
+
+
+def loop_gen_Lagrange_coeffs(alpha_s, beta_s, p):
+    U = np.zeros((len(alpha_s), len(beta_s)), dtype='int64')
+    for i in range(len(alpha_s)):
+        for j in range(len(beta_s)):
+            cur_beta = beta_s[j]
+            den = np.mod(loop_PI([cur_beta - o for o in beta_s if cur_beta != o], p), p)
+            num = np.mod(loop_PI([alpha_s[i] - o for o in beta_s if cur_beta != o], p), p)
+            U[i][j] = np.mod(np.int64(num) * np.int64(loop_modular_inv(den, p)), p)
+    return U
+
+
+def loop_BGW_encoding(R, alpha_s, p):
+    X_BGW = np.zeros((len(alpha_s),) + R.shape[1:], dtype='int64')
+    for i in range(len(alpha_s)):
+        for t in range(R.shape[0]):
+            X_BGW[i] = np.mod(X_BGW[i] + R[t] * (alpha_s[i] ** t), p)
+    return X_BGW
+
+
+def loop_LCC_encoding(X_sub, U, p):
+    X_LCC = np.zeros((U.shape[0],) + X_sub.shape[1:], dtype='int64')
+    for i in range(U.shape[0]):
+        for j in range(U.shape[1]):
+            X_LCC[i] = np.mod(X_LCC[i] + np.mod(U[i][j] * X_sub[j], p), p)
+    return X_LCC
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def report(name, fast, loop, ops, max_loop_ops):
+    fast_result, fast_time = fast
+    if ops > max_loop_ops:
+        print("  %-22s %9.3f s   loop skipped" % (name, fast_time))
+        return
+    loop_result, loop_time = timed(loop)
+    print("  %-22s %9.3f s   loop %9.3f s   %7.1fx   equal: %s" % (
+        name, fast_time, loop_time, loop_time / fast_time, np.array_equal(fast_result, loop_result)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--N', type=int, nargs='+', default=[50, 100])
+    parser.add_argument('--d', type=int, nargs='+', default=[100000])
+    parser.add_argument('--p', type=int, default=2 ** 15 - 19)
+    parser.add_argument('--T', type=int, default=0, help='privacy threshold, N // 10 by default')
+    parser.add_argument('--max_loop_ops', type=float, default=5e8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    p = args.p
+
+    for N in args.N:
+        T = args.T or max(1, N // 10)
+        K = max(1, N // 10)
+        stt_b, stt_a = -(K + T) // 2, -N // 2
+        alpha_s = np.mod(np.arange(stt_a, stt_a + N), p).astype('int64')
+        beta_s = np.mod(np.arange(stt_b, stt_b + K + T), p).astype('int64')
+        print("N = %d, K = %d, T = %d, p = %d" % (N, K, T, p))
+        report("Lagrange coefficients", timed(lambda: mpc_function.gen_Lagrange_coeffs(alpha_s, beta_s, p)),
+                lambda: loop_gen_Lagrange_coeffs(alpha_s, beta_s, p), N * (K + T) ** 2 * 1000, args.max_loop_ops)
+        report("BGW lambda", timed(lambda: mpc_function.gen_BGW_lambda_s(alpha_s, p)),
+               lambda: loop_gen_Lagrange_coeffs([0], alpha_s, p), N ** 2 * 1000, args.max_loop_ops)
+
+        for d in args.d:
+            np.random.seed(args.seed)
+            X = np.random.randint(p, size=(1, d))
+            print(" d = %d" % d)
+            np.random.seed(args.seed)
+            bgw = timed(lambda: mpc_function.BGW_encoding(X, N, T, p))
+            bgw_alpha = np.arange(1, N + 1, dtype='int64')
+
+            def loop_bgw():
+                # the same random shares as BGW_encoding drew
+                np.random.seed(args.seed)
+                R = np.random.randint(p, size=(T + 1, 1, d))
+                R[0] = X
+                return loop_BGW_encoding(R, bgw_alpha, p)
+            report("BGW encoding", bgw, loop_bgw, N * (T + 1) * d, args.max_loop_ops)
+
+            shares = bgw[0][:T + 1, 0, :]
+            decoded = timed(lambda: mpc_function.BGW_decoding(shares, list(range(T + 1)), p))
+            print("  %-22s %9.3f s   recovers X: %s" % ("BGW decoding", decoded[1],
+                                                        np.array_equal(decoded[0], X)))
+
+            X_lcc = np.random.randint(p, size=(K, d))
+            R_lcc = np.random.randint(p, size=(T, 1, d))
+            lcc = timed(lambda: mpc_function.LCC_encoding_w_Random(X_lcc, R_lcc, N, K, T, p))
+            X_sub = np.concatenate([X_lcc.reshape(K, 1, d), R_lcc])
+            U = mpc_function.gen_Lagrange_coeffs(alpha_s, beta_s, p)
+            report("LCC encoding", lcc, lambda: loop_LCC_encoding(X_sub, U, p), N * (K + T) * d, args.max_loop_ops)
+
+            # any K + T workers interpolate the encoding polynomial back at the data points
+            worker_idx = list(range(N - K - T, N))
+            decoded = timed(lambda: mpc_function.LCC_decoding_with_points(lcc[0][worker_idx, 0, :],
+                                                                          alpha_s[worker_idx], beta_s[:K], p))
+            print("  %-22s %9.3f s   recovers X: %s" % ("LCC decoding", decoded[1],
+                                                        np.array_equal(decoded[0], X_lcc)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import logging
+
+import torch
+
+from ..trainer.flat_params import FlatParamLayout
+
+AGGREGATION_MODES = ("sync", "async", "semi_sync")
+STALENESS_FUNCTIONS = ("constant", "polynomial", "hinge")
+
+
+def staleness_weight(staleness, function="polynomial", a=0.5, b=4):
+    """
+        s(t - tau) of FedAsync (Xie et al.), the discount of an update trained
+        from a global model `staleness` versions old:
+            constant:   1
+            polynomial: (1 + staleness)^-a
+            hinge:      1 up to b versions, 1 / (a * (staleness - b) + 1) beyond
+    """
+    if function == "constant":
+        return 1.0
+    if function == "polynomial":
+        return float((1.0 + staleness) ** -a)
+    if function == "hinge":
+        return 1.0 if staleness <= b else 1.0 / (a * (staleness - b) + 1.0)
+    raise ValueError("unknown staleness function: {} (expected one of {})".format(
+        function, ", ".join(STALENESS_FUNCTIONS)))
+
+
+class AsyncAggregator(object):
+    """
+        Versioned global model for asynchronous and semi-synchronous FedAvg.
+
+        The global model is kept as one flattened float32 buffer and every
+        change to it increments version. An upload trained from version tau
+        has staleness version - tau and is mixed in as
+
+            global = (1 - alpha_t) * global + alpha_t * upload,
+            alpha_t = alpha * staleness_weight(version - tau)
+
+        either on arrival (merge) or, for semi-synchronous rounds, buffered with
+        add() and mixed in as the sample weighted average of the buffer by
+        commit(), with alpha_t the sample weighted mean discount of the buffer.
+        Uploads more than max_staleness versions old are dropped.
+
+        Uploads are either a state_dict (name -> tensor) or a single tensor,
+        as for StreamingAggregator.
+    """
+
+    def __init__(self, alpha=0.6, staleness_function="polynomial", a=0.5, b=4, max_staleness=None,
+                 device=torch.device("cpu")):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError("alpha must be in (0, 1], got {}".format(alpha))
+        staleness_weight(0, staleness_function, a, b)
+        self.alpha = alpha
+        self.staleness_function = staleness_function
+        self.a = a
+        self.b = b
+        self.max_staleness = max_staleness
+        self.device = device
+        self.version = 0
+        self.flat = None
+        self.layout = None
+        self.shape = None
+        self.dtype = None
+        # semi-synchronous buffer
+        self.accumulator = None
+        self.total_weight = 0.0
+        self.total_samples = 0.0
+        self.num_received = 0
+
+    @classmethod
+    def from_args(cls, args):
+        """ None unless args.aggregation_mode is "async" or "semi_sync" """
+        mode = getattr(args, "aggregation_mode", "sync")
+        if mode == "sync":
+            return None
+        if mode not in AGGREGATION_MODES:
+            raise ValueError("unknown aggregation mode: {} (expected one of {})".format(
+                mode, ", ".join(AGGREGATION_MODES)))
+        max_staleness = getattr(args, "max_staleness", -1)
+        # a semi-synchronous round of fresh uploads replaces the global model, as FedAvg
+        default_alpha = 0.6 if mode == "async" else 1.0
+        return cls(alpha=getattr(args, "async_alpha", None) or default_alpha,
+                   staleness_function=getattr(args, "staleness_function", "polynomial"),
+                   a=getattr(args, "staleness_a", 0.5),
+                   b=getattr(args, "staleness_b", 4),
+                   max_staleness=None if max_staleness is None or max_staleness < 0 else max_staleness)
+
+    def has_model(self):
+        return self.flat is not None
+
+    def set_model(self, model_params):
+        """ (re)starts from model_params, without changing the version """
+        if torch.is_tensor(model_params):
+            self.layout = None
+            self.shape = model_params.shape
+            self.dtype = model_params.dtype
+            self.flat = model_params.detach().reshape(-1).to(self.device, torch.float32).clone()
+        else:
+            self.layout = FlatParamLayout.from_state_dict(model_params)
+            self.flat = self.layout.flatten(model_params).to(self.device)
+        self.accumulator = torch.zeros_like(self.flat)
+
+    def model(self):
+        """ the global model in the structure given to set_model """
+        if self.layout is None:
+            return self.flat.clone().view(self.shape).to(self.dtype)
+        return self.layout.unflatten(self.flat.clone())
+
+    def staleness(self, model_version):
+        return max(0, self.version - int(model_version))
+
+    def mixing_weight(self, staleness):
+        """ alpha_t of an upload, 0 when it is too stale to be used """
+        if self.max_staleness is not None and staleness > self.max_staleness:
+            return 0.0
+        return self.alpha * staleness_weight(staleness, self.staleness_function, self.a, self.b)
+
+    def merge(self, model_params, model_version):
+        """ mixes one upload into the global model, returns its alpha_t (0 when it was dropped) """
+        staleness = self.staleness(model_version)
+        alpha_t = self.mixing_weight(staleness)
+        if alpha_t == 0.0:
+            logging.warning("dropping an upload with staleness %d" % staleness)
+            return 0.0
+        self.flat.mul_(1.0 - alpha_t).add_(self._flatten(model_params), alpha=alpha_t)
+        self.version += 1
+        return alpha_t
+
+    def add(self, model_params, sample_num, model_version):
+        """ buffers one upload for commit(), returns its staleness discount (0 when it was dropped) """
+        staleness = self.staleness(model_version)
+        discount = self.mixing_weight(staleness) / self.alpha
+        if discount == 0.0:
+            logging.warning("dropping an upload with staleness %d" % staleness)
+            return 0.0
+        weight = sample_num * discount
+        self.accumulator.add_(self._flatten(model_params), alpha=weight)
+        self.total_weight += weight
+        self.total_samples += sample_num
+        self.num_received += 1
+        return discount
+
+    def commit(self):
+        """ mixes the buffered uploads into the global model, returns alpha_t (0 when nothing was buffered) """
+        if self.num_received == 0 or self.total_weight == 0:
+            return 0.0
+        alpha_t = self.alpha * self.total_weight / self.total_samples
+        self.flat.mul_(1.0 - alpha_t).add_(self.accumulator, alpha=alpha_t / self.total_weight)
+        self.version += 1
+        self.accumulator.zero_()
+        self.total_weight = 0.0
+        self.total_samples = 0.0
+        self.num_received = 0
+        return alpha_t
+
+    def _flatten(self, model_params):
+        if self.layout is None:
+            return model_params.detach().reshape(-1).to(self.flat)
+        return self.layout.flatten(model_params).to(self.flat)
@@ -1,53 +1,46 @@
-import ctypes
 import logging
 import threading
-import time
 import traceback
 
 from ..message import Message
 
 
 class MPISendThread(threading.Thread):
-    def __init__(self, comm, rank, size, name, q):
+    # put on the queue by stop(), everything queued before it is still sent
+    STOP = object()
+
+    def __init__(self, comm, rank, size, name, q, wire_format=None):
         super(MPISendThread, self).__init__()
+        self.daemon = True
         self._stop_event = threading.Event()
         self.comm = comm
         self.rank = rank
         self.size = size
         self.name = name
         self.q = q
+        # None keeps sending the raw params dict through mpi4py's pickle
+        self.wire_format = wire_format
 
     def run(self):
         logging.debug("Starting " + self.name + ". Process ID = " + str(self.rank))
         while True:
+            # blocks until there is something to send, no polling
+            msg = self.q.get()
+            if msg is self.STOP:
+                break
             try:
-                if not self.q.empty():
-                    msg = self.q.get()
-                    dest_id = msg.get(Message.MSG_ARG_KEY_RECEIVER)
+                dest_id = msg.get(Message.MSG_ARG_KEY_RECEIVER)
+                if self.wire_format is None:
                     self.comm.send(msg.to_string(), dest=dest_id)
                 else:
-                    time.sleep(0.3)
+                    self.comm.send(msg.to_payload(self.wire_format), dest=dest_id)
             except Exception:
                 traceback.print_exc()
+        logging.debug("Stopped " + self.name + ". Process ID = " + str(self.rank))
 
     def stop(self):
         self._stop_event.set()
+        self.q.put(self.STOP)
 
     def stopped(self):
         return self._stop_event.is_set()
-
-    def get_id(self):
-        # returns id of the respective thread
-        if hasattr(self, '_thread_id'):
-            return self._thread_id
-        for id, thread in threading._active.items():
-            if thread is self:
-                return id
-
-    def raise_exception(self):
-        thread_id = self.get_id()
-        res = ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id,
-                                                         ctypes.py_object(SystemExit))
-        if res > 1:
-            ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, 0)
-            print('Exception raise failure')
@@ -0,0 +1,267 @@
+import bz2
+import logging
+import lzma
+import struct
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque, namedtuple
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class Compressor(object):
+    """ one compression method, identified on the wire by code """
+
+    def __init__(self, name, code, compress, decompress, default_level):
+        self.name = name
+        self.code = code
+        self._compress = compress
+        self._decompress = decompress
+        self.default_level = default_level
+
+    def compress(self, data, level=None):
+        return self._compress(data, self.default_level if level is None else level)
+
+    def decompress(self, data):
+        return self._decompress(data)
+
+
+COMPRESSORS = OrderedDict()
+
+
+def _register(compressor):
+    COMPRESSORS[compressor.name] = compressor
+
+
+_register(Compressor("none", 0, lambda data, level: data, lambda data: data, None))
+_register(Compressor("zlib", 1, lambda data, level: zlib.compress(data, level), zlib.decompress, 6))
+_register(Compressor("bz2", 2, lambda data, level: bz2.compress(data, level), bz2.decompress, 9))
+_register(Compressor("lzma", 3, lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 6))
+if lz4_frame is not None:
+    _register(Compressor("lz4", 4, lambda data, level: lz4_frame.compress(data, compression_level=level),
+                         lz4_frame.decompress, 0))
+
+_COMPRESSORS_BY_CODE = {c.code: c for c in COMPRESSORS.values()}
+
+
+def get_compressor(name):
+    if name is None:
+        return COMPRESSORS["none"]
+    try:
+        return COMPRESSORS[name]
+    except KeyError:
+        raise ValueError("unknown or unavailable compression: {} (available: {})".format(
+            name, ", ".join(COMPRESSORS.keys())))
+
+
+MessageStats = namedtuple("MessageStats", ["direction", "msg_id", "raw_bytes", "wire_bytes",
+                                           "num_chunks", "seconds"])
+
+
+class PayloadFramer(object):
+    """
+        Compression and chunking of MQTT payloads.
+
+        A message payload (see Message.to_payload) is compressed as a whole and
+        cut into frames of at most chunk_size bytes of data. Every frame carries
+
+            MAGIC (4 bytes) | VERSION (1 byte) | compression code (1 byte) | message id (16 bytes)
+            | chunk index (uint32) | chunk count (uint32) | raw size (uint64) | data
+
+        so the receiver can reassemble frames of several messages interleaved on
+        the same topic. With compression "none" and chunk_size 0 the payload is
+        published unframed, exactly as before, and unframed payloads from peers
+        without framing are always accepted.
+    """
+
+    MAGIC = b"FMLF"
+    VERSION = 1
+    _HEADER = struct.Struct("<4sBB16sIIQ")
+
+    def __init__(self, compression="none", compression_level=None, chunk_size=0):
+        self.compressor = get_compressor(compression)
+        self.compression_level = compression_level
+        self.chunk_size = chunk_size
+
+    def is_enabled(self):
+        return self.compressor.code != 0 or self.chunk_size > 0
+
+    def encode(self, payload):
+        """ returns (list of frames, MessageStats) """
+        start = time.perf_counter()
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        if not self.is_enabled():
+            return [payload], MessageStats("send", None, len(payload), len(payload), 1,
+                                           time.perf_counter() - start)
+
+        data = self.compressor.compress(payload, self.compression_level)
+        if self.chunk_size > 0:
+            chunks = [data[i:i + self.chunk_size] for i in range(0, len(data), self.chunk_size)] or [b""]
+        else:
+            chunks = [data]
+
+        msg_id = uuid.uuid4().bytes
+        frames = []
+        for index, chunk in enumerate(chunks):
+            header = self._HEADER.pack(self.MAGIC, self.VERSION, self.compressor.code, msg_id,
+                                       index, len(chunks), len(payload))
+            frames.append(header + chunk)
+        wire_bytes = sum(len(f) for f in frames)
+        return frames, MessageStats("send", uuid.UUID(bytes=msg_id).hex, len(payload), wire_bytes, len(frames),
+                                    time.perf_counter() - start)
+
+    @classmethod
+    def is_frame(cls, payload):
+        return len(payload) >= cls._HEADER.size and bytes(payload[:len(cls.MAGIC)]) == cls.MAGIC
+
+    @classmethod
+    def parse_frame(cls, frame):
+        magic, version, code, msg_id, index, count, raw_size = cls._HEADER.unpack_from(frame, 0)
+        if version != cls.VERSION:
+            raise ValueError("unsupported frame version: %d" % version)
+        return code, msg_id, index, count, raw_size, memoryview(frame)[cls._HEADER.size:]
+
+
+class FrameReassembler(object):
+    """
+        Collects the frames of chunked messages and returns each payload once
+        its last frame has arrived.
+
+        Receive-side memory is bounded: at most max_pending_messages partially
+        received messages holding at most max_pending_bytes of frame data are
+        kept. The bytes bound is checked for every frame; when a frame would
+        exceed a bound, the oldest other partial messages are dropped first and
+        a message that does not fit on its own is dropped itself. Messages that
+        stay incomplete for longer than timeout seconds (lost frames at QoS 0)
+        are dropped as well. Every drop loses a message of its sender and is
+        logged at error level.
+
+        A receiver that hears from n senders at once, like the server of a
+        round, needs max_pending_messages of at least n, see for_senders().
+    """
+
+    def __init__(self, max_pending_messages=16, max_pending_bytes=512 * 1024 * 1024, timeout=600):
+        self.max_pending_messages = max_pending_messages
+        self.max_pending_bytes = max_pending_bytes
+        self.timeout = timeout
+        # msg_id -> [chunks, num_received, wire_bytes, first_seen, sender]
+        self._pending = OrderedDict()
+        self._pending_bytes = 0
+        # the frames still arriving for a dropped message are ignored rather than collected again
+        self._dropped = deque(maxlen=max(64, 2 * max_pending_messages))
+
+    @classmethod
+    def for_senders(cls, num_senders, max_pending_messages=0, max_pending_bytes=0, timeout=600):
+        """ limits of 0 are the defaults: room for two partial messages per sender, at least 16, and 512 MB """
+        if not max_pending_messages:
+            max_pending_messages = max(16, 2 * num_senders)
+        if not max_pending_bytes:
+            max_pending_bytes = 512 * 1024 * 1024
+        return cls(max_pending_messages, max_pending_bytes, timeout)
+
+    def add(self, payload, sender=None):
+        """
+            returns (payload, MessageStats) when a message is complete, (None, None) otherwise.
+            Unframed payloads are complete messages. sender (e.g. the MQTT topic) only
+            names the message in the log when it is dropped.
+        """
+        if not PayloadFramer.is_frame(payload):
+            return payload, MessageStats("receive", None, len(payload), len(payload), 1, 0.0)
+
+        code, msg_id, index, count, raw_size, chunk = PayloadFramer.parse_frame(payload)
+        now = time.perf_counter()
+        if count == 1:
+            return self._finish(code, msg_id, [chunk], raw_size, len(payload), 1, now)
+
+        entry = self._pending.get(msg_id)
+        if entry is None:
+            if msg_id in self._dropped:
+                return None, None
+            self._drop_timed_out(now)
+            while len(self._pending) >= self.max_pending_messages:
+                self._drop(next(iter(self._pending)), "evicted for a new message")
+            entry = [[None] * count, 0, 0, now, sender]
+            self._pending[msg_id] = entry
+        chunks = entry[0]
+        if chunks[index] is None:
+            if not self._make_room(msg_id, len(chunk)):
+                return None, None
+            chunks[index] = bytes(chunk)
+            entry[1] += 1
+            entry[2] += len(payload)
+            self._pending_bytes += len(chunk)
+
+        if entry[1] < count:
+            return None, None
+        del self._pending[msg_id]
+        self._pending_bytes -= sum(len(c) for c in chunks)
+        return self._finish(code, msg_id, chunks, raw_size, entry[2], count, entry[3])
+
+    def num_pending(self):
+        return len(self._pending)
+
+    def pending_bytes(self):
+        return self._pending_bytes
+
+    def _finish(self, code, msg_id, chunks, raw_size, wire_bytes, num_chunks, first_seen):
+        compressor = _COMPRESSORS_BY_CODE.get(code)
+        if compressor is None:
+            raise ValueError("frame compressed with an unavailable method, code %d" % code)
+        data = b"".join(chunks)
+        payload = compressor.decompress(data)
+        if len(payload) != raw_size:
+            raise ValueError("reassembled payload has %d bytes, expected %d" % (len(payload), raw_size))
+        return payload, MessageStats("receive", uuid.UUID(bytes=msg_id).hex, raw_size, wire_bytes, num_chunks,
+                                     time.perf_counter() - first_seen)
+
+    def _drop_timed_out(self, now):
+        for msg_id in list(self._pending.keys()):
+            if now - self._pending[msg_id][3] > self.timeout:
+                self._drop(msg_id, "timed out")
+
+    def _make_room(self, msg_id, incoming_bytes):
+        """ drops the oldest other messages until incoming_bytes more fit, or msg_id itself if it cannot fit """
+        for other_id in list(self._pending.keys()):
+            if self._pending_bytes + incoming_bytes <= self.max_pending_bytes:
+                return True
+            if other_id != msg_id:
+                self._drop(other_id, "evicted over max_pending_bytes")
+        if self._pending_bytes + incoming_bytes <= self.max_pending_bytes:
+            return True
+        self._drop(msg_id, "larger than max_pending_bytes")
+        return False
+
+    def _drop(self, msg_id, reason):
+        chunks, num_received, sender = self._pending[msg_id][0], self._pending[msg_id][1], self._pending[msg_id][4]
+        self._pending_bytes -= sum(len(c) for c in chunks if c is not None)
+        del self._pending[msg_id]
+        self._dropped.append(msg_id)
+        logging.error("incomplete message %s from %s %s with %d/%d frames, the message is lost" % (
+            uuid.UUID(bytes=msg_id).hex, sender, reason, num_received, len(chunks)))
+
+
+class TransferStats(object):
+    """ raw versus wire bytes of the last messages and running totals per direction """
+
+    def __init__(self, history=100):
+        self.history = deque(maxlen=history)
+        self.totals = {"send": [0, 0, 0], "receive": [0, 0, 0]}
+
+    def record(self, stats):
+        self.history.append(stats)
+        total = self.totals[stats.direction]
+        total[0] += 1
+        total[1] += stats.raw_bytes
+        total[2] += stats.wire_bytes
+        logging.info("%s message %s: raw %d bytes, wire %d bytes (%.1f%%) in %d frame(s), %.3f s" % (
+            stats.direction, stats.msg_id, stats.raw_bytes, stats.wire_bytes,
+            100.0 * stats.wire_bytes / max(stats.raw_bytes, 1), stats.num_chunks, stats.seconds))
+
+    def summary(self):
+        return {direction: {"messages": t[0], "raw_bytes": t[1], "wire_bytes": t[2]}
+                for direction, t in self.totals.items()}
@@ -0,0 +1,174 @@
+import json
+import struct
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+class JsonSerializer(object):
+    """
+        Legacy text wire format.
+
+        Tensors and arrays are flattened into nested lists, so the receiver gets
+        plain python lists back (see utils.transform_list_to_tensor).
+    """
+    name = "json"
+
+    def dumps(self, msg_params):
+        return json.dumps(msg_params, default=_to_json_compatible)
+
+    def loads(self, payload):
+        if isinstance(payload, (bytes, bytearray, memoryview)):
+            payload = str(bytes(payload), encoding='utf-8')
+        return json.loads(payload)
+
+
+class BinarySerializer(object):
+    """
+        Header + raw tensor buffers.
+
+        layout:
+            MAGIC (4 bytes) | VERSION (1 byte) | header length (uint32, little endian) | header (utf-8 json)
+            | padding | tensor buffers, each aligned to ALIGNMENT bytes
+
+        The header holds the message params with every tensor/array replaced by
+        {"__tensor__": idx} and a tensor table with dtype, shape, byte offset and
+        length of each buffer relative to the start of the data section.
+        Decoding copies the payload once into a writable buffer and returns
+        tensors that are views into it, no per-element parsing is involved.
+    """
+    name = "binary"
+
+    MAGIC = b"FMLB"
+    VERSION = 1
+    ALIGNMENT = 64
+    TENSOR_REF_KEY = "__tensor__"
+
+    _PREFIX = struct.Struct("<4sBI")
+
+    def dumps(self, msg_params):
+        tensor_table = []
+        buffers = []
+        params = self._pack(msg_params, tensor_table, buffers)
+
+        header = json.dumps({"params": params, "tensors": tensor_table}).encode('utf-8')
+        data_start = _align(self._PREFIX.size + len(header), self.ALIGNMENT)
+        data_size = tensor_table[-1]["offset"] + tensor_table[-1]["nbytes"] if tensor_table else 0
+
+        payload = bytearray(data_start + data_size)
+        self._PREFIX.pack_into(payload, 0, self.MAGIC, self.VERSION, len(header))
+        payload[self._PREFIX.size:self._PREFIX.size + len(header)] = header
+        view = memoryview(payload)
+        for meta, buf in zip(tensor_table, buffers):
+            start = data_start + meta["offset"]
+            view[start:start + meta["nbytes"]] = buf
+        view.release()
+        return bytes(payload)
+
+    def loads(self, payload):
+        magic, version, header_len = self._PREFIX.unpack_from(payload, 0)
+        if magic != self.MAGIC:
+            raise ValueError("not a binary message payload")
+        if version != self.VERSION:
+            raise ValueError("unsupported binary message version: %d" % version)
+
+        # one copy of the whole frame so that every decoded tensor is a writable view
+        if isinstance(payload, bytearray):
+            buf = payload
+        else:
+            buf = bytearray(payload)
+
+        header_end = self._PREFIX.size + header_len
+        header = json.loads(bytes(buf[self._PREFIX.size:header_end]).decode('utf-8'))
+        data_start = _align(header_end, self.ALIGNMENT)
+
+        tensors = []
+        for meta in header["tensors"]:
+            dtype = np.dtype(meta["dtype"])
+            count = meta["nbytes"] // dtype.itemsize
+            arr = np.frombuffer(buf, dtype=dtype, count=count, offset=data_start + meta["offset"])
+            arr = arr.reshape(meta["shape"])
+            if meta["kind"] == "torch" and torch is not None:
+                arr = torch.from_numpy(arr)
+            tensors.append(arr)
+        return self._unpack(header["params"], tensors)
+
+    def _pack(self, value, tensor_table, buffers):
+        if isinstance(value, dict):
+            return {k: self._pack(v, tensor_table, buffers) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._pack(v, tensor_table, buffers) for v in value]
+        if torch is not None and torch.is_tensor(value):
+            arr = value.detach().cpu().numpy()
+            kind = "torch"
+        elif isinstance(value, np.ndarray):
+            arr = value
+            kind = "numpy"
+        else:
+            return value
+
+        # ascontiguousarray promotes 0-d arrays to 1-d, so keep the original shape
+        shape = list(arr.shape)
+        arr = np.ascontiguousarray(arr)
+        offset = 0
+        if tensor_table:
+            offset = _align(tensor_table[-1]["offset"] + tensor_table[-1]["nbytes"], self.ALIGNMENT)
+        tensor_table.append({"dtype": arr.dtype.str, "shape": shape,
+                             "offset": offset, "nbytes": arr.nbytes, "kind": kind})
+        buffers.append(arr.reshape(-1).view(np.uint8))
+        return {self.TENSOR_REF_KEY: len(tensor_table) - 1}
+
+    def _unpack(self, value, tensors):
+        if isinstance(value, dict):
+            if len(value) == 1 and self.TENSOR_REF_KEY in value:
+                return tensors[value[self.TENSOR_REF_KEY]]
+            return {k: self._unpack(v, tensors) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._unpack(v, tensors) for v in value]
+        return value
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer(),
+    BinarySerializer.name: BinarySerializer(),
+}
+
+
+def get_serializer(name):
+    if name is None:
+        return SERIALIZERS[JsonSerializer.name]
+    if not isinstance(name, str):
+        return name
+    try:
+        return SERIALIZERS[name]
+    except KeyError:
+        raise ValueError("unknown wire format: {}".format(name))
+
+
+def detect_serializer(payload):
+    """
+        Pick the serializer from the payload itself, so a receiver can always
+        read what the peer sent, whichever format the peer was configured with.
+    """
+    if isinstance(payload, (bytes, bytearray, memoryview)) and \
+            bytes(payload[:len(BinarySerializer.MAGIC)]) == BinarySerializer.MAGIC:
+        return SERIALIZERS[BinarySerializer.name]
+    return SERIALIZERS[JsonSerializer.name]
+
+
+def _align(n, alignment):
+    return (n + alignment - 1) // alignment * alignment
+
+
+def _to_json_compatible(value):
+    if torch is not None and torch.is_tensor(value):
+        return value.detach().cpu().numpy().tolist()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
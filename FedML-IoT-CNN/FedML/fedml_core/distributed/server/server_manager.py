@@ -17,15 +17,22 @@ class ServerManager(Observer):
         self.rank = rank
 
         self.backend = backend
+        # "json" or "binary", see communication/serializer.py; receivers accept both
+        wire_format = getattr(args, "wire_format", None)
         if backend == "MPI":
-            self.com_manager = MpiCommunicationManager(comm, rank, size, node_type="server")
+            self.com_manager = MpiCommunicationManager(comm, rank, size, node_type="server", wire_format=wire_format)
         elif backend == "MQTT":
             HOST = mqtt_host
             # HOST = "broker.emqx.io"
             PORT = mqtt_port
-            self.com_manager = MqttCommManager(HOST, PORT, client_id=rank, client_num=size - 1)
+            self.com_manager = MqttCommManager(HOST, PORT, client_id=rank, client_num=size - 1, wire_format=wire_format,
+                                               compression=getattr(args, "mqtt_compression", "none"),
+                                               compression_level=getattr(args, "mqtt_compression_level", None),
+                                               chunk_size=getattr(args, "mqtt_chunk_size", 0),
+                                               max_pending_messages=getattr(args, "mqtt_max_pending_messages", 0),
+                                               max_pending_bytes=getattr(args, "mqtt_max_pending_mb", 0) * 1024 * 1024)
         else:
-            self.com_manager = MpiCommunicationManager(comm, rank, size, node_type="server")
+            self.com_manager = MpiCommunicationManager(comm, rank, size, node_type="server", wire_format=wire_format)
         self.com_manager.add_observer(self)
         self.message_handler_dict = dict()
 
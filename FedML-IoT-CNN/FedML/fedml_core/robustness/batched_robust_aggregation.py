@@ -0,0 +1,225 @@
+import logging
+
+import torch
+
+from ..trainer.flat_params import FlatParamLayout
+from .robust_aggregation import is_weight_param
+
+DEFENSE_TYPES = ("norm_diff_clipping", "weak_dp", "median", "trimmed_mean", "krum", "multi_krum",
+                 "geometric_median")
+
+
+def weight_first_layout(state_dict):
+    """ FlatParamLayout of state_dict with the weights (is_weight_param) first, so that they are its prefix """
+    weights = [(k, v.shape, v.dtype) for k, v in state_dict.items() if is_weight_param(k)]
+    buffers = [(k, v.shape, v.dtype) for k, v in state_dict.items() if not is_weight_param(k)]
+    return FlatParamLayout(weights + buffers, sum(v.numel() for k, v in state_dict.items() if is_weight_param(k)))
+
+
+class BatchedRobustAggregator(object):
+    """
+        Robust aggregation over a (clients x params) matrix of updates.
+
+        Every upload is written into its preallocated row as soon as it
+        arrives, as the weight difference to the global model (the weights
+        are the layout prefix, BatchNorm statistics follow them unchanged),
+        and the upload itself is dropped. aggregate() then works on the whole
+        matrix, one chunk of columns at a time, so that the temporaries of a
+        ResNet with 100+ clients stay at chunk_size elements:
+
+            norm clipping    every row scaled by 1 / max(1, ||diff|| / norm_bound) in one op
+            DP noise         N(0, stddev^2) added to every weight of every row in one op
+            defense          norm_diff_clipping / weak_dp: sample weighted mean
+                             median:             coordinate-wise median
+                             trimmed_mean:       coordinate-wise mean without the trim_ratio
+                                                 largest and smallest values
+                             krum / multi_krum:  the krum_m rows (1 for krum) with the lowest
+                                                 sum of squared distances to their
+                                                 n - byzantine_num - 2 nearest rows, averaged
+                             geometric_median:   sample weighted geometric median, by
+                                                 Weiszfeld iterations
+
+        The new global weights are the global ones plus the aggregated
+        difference; the BatchNorm statistics are the sample weighted mean of
+        the rows the defense keeps (all but the ones krum rejects).
+
+        Uploads are state_dicts, or flat parameter buffers given a layout
+        whose weights are the prefix (FlatParamLayout.from_module).
+    """
+
+    def __init__(self, defense_type="norm_diff_clipping", norm_bound=None, stddev=0.0, trim_ratio=0.1,
+                 byzantine_num=0, krum_m=1, geomed_iters=10, geomed_tol=1e-5, chunk_size=1 << 24, layout=None,
+                 device=torch.device("cpu")):
+        if defense_type not in DEFENSE_TYPES:
+            raise ValueError("unknown defense type: {} (expected one of {})".format(
+                defense_type, ", ".join(DEFENSE_TYPES)))
+        if not 0.0 <= trim_ratio < 0.5:
+            raise ValueError("trim_ratio must be in [0, 0.5), got {}".format(trim_ratio))
+        self.defense_type = defense_type
+        self.norm_bound = norm_bound
+        self.stddev = stddev
+        self.trim_ratio = trim_ratio
+        self.byzantine_num = byzantine_num
+        self.krum_m = krum_m
+        self.geomed_iters = geomed_iters
+        self.geomed_tol = geomed_tol
+        self.chunk_size = chunk_size
+        self.layout = layout
+        self.flat_uploads = layout is not None
+        self.device = device
+        self.global_flat = None
+        self.updates = None
+        self.sample_nums = dict()
+
+    @classmethod
+    def from_args(cls, args, layout=None, device=torch.device("cpu")):
+        defense_type = args.defense_type
+        clipping = defense_type in ("norm_diff_clipping", "weak_dp")
+        return cls(defense_type,
+                   norm_bound=float(args.norm_bound) if clipping else None,
+                   stddev=float(args.stddev) if defense_type == "weak_dp" else 0.0,
+                   trim_ratio=getattr(args, "trim_ratio", 0.1),
+                   byzantine_num=getattr(args, "byzantine_num", 0),
+                   krum_m=1 if defense_type == "krum" else getattr(args, "krum_m", 0) or None,
+                   geomed_iters=getattr(args, "geomed_iters", 10),
+                   chunk_size=getattr(args, "robust_chunk_size", 1 << 24),
+                   layout=layout, device=device)
+
+    def start_round(self, global_params, num_slots):
+        """ the global model of the round and the number of upload slots, e.g. the worker number """
+        if self.layout is None:
+            self.layout = weight_first_layout(global_params)
+        if self.flat_uploads:
+            self.global_flat = global_params.detach().reshape(-1).to(self.device, torch.float32).clone()
+        else:
+            self.global_flat = self.layout.flatten(global_params).to(self.device)
+        if self.updates is None or self.updates.shape[0] != num_slots:
+            self.updates = torch.empty(num_slots, self.layout.numel, dtype=torch.float32, device=self.device)
+        self.sample_nums = dict()
+
+    def add(self, slot, local_params, sample_num):
+        row = self.updates[slot]
+        if self.flat_uploads:
+            row.copy_(local_params.detach().reshape(-1))
+        else:
+            self.layout.flatten(local_params, out=row)
+        num_weights = self.layout.weight_numel
+        row[:num_weights].sub_(self.global_flat[:num_weights])
+        self.sample_nums[slot] = sample_num
+
+    def aggregate(self):
+        """ the new global model from the uploads added since start_round(), in the structure of the uploads """
+        if not self.sample_nums:
+            raise RuntimeError("no model has been added to the aggregator")
+        slots = sorted(self.sample_nums.keys())
+        updates = self.updates if slots == list(range(len(self.updates))) else self.updates[slots]
+        sample_nums = torch.tensor([self.sample_nums[slot] for slot in slots], dtype=torch.float64)
+        weights = (sample_nums / sample_nums.sum()).to(self.device, torch.float32)
+        num_weights = self.layout.weight_numel
+
+        if self.norm_bound is not None:
+            norms = self._squared_norms(updates, num_weights).sqrt_()
+            scale = torch.clamp(norms / self.norm_bound, min=1.0).reciprocal_()
+            logging.info("norm clipping: norms %s, scale %s" % (norms.tolist(), scale.tolist()))
+            for start, end in self._chunks(updates, num_weights):
+                updates[:, start:end].mul_(scale.view(-1, 1))
+        if self.stddev > 0:
+            for start, end in self._chunks(updates, num_weights):
+                chunk = updates[:, start:end]
+                chunk.add_(torch.randn_like(chunk), alpha=self.stddev)
+
+        if self.defense_type in ("norm_diff_clipping", "weak_dp"):
+            diff = self._weighted_sum(updates, weights, 0, num_weights)
+        elif self.defense_type in ("median", "trimmed_mean"):
+            diff = self._coordinate_wise(updates, num_weights)
+        elif self.defense_type in ("krum", "multi_krum"):
+            kept = self._krum(updates, num_weights)
+            logging.info("%s selected uploads %s" % (self.defense_type, [slots[i] for i in kept.tolist()]))
+            # the rejected rows get weight 0 rather than being copied out
+            kept_weights = torch.zeros_like(weights)
+            kept_weights[kept] = weights[kept] / weights[kept].sum()
+            weights = kept_weights
+            diff = self._weighted_sum(updates, weights, 0, num_weights)
+        else:
+            diff = self._geometric_median(updates, weights, num_weights)
+
+        result = self.global_flat.clone()
+        result[:num_weights].add_(diff)
+        if num_weights < self.layout.numel:
+            result[num_weights:] = self._weighted_sum(updates, weights, num_weights, self.layout.numel)
+        self.sample_nums = dict()
+        if self.flat_uploads:
+            return result
+        return self.layout.unflatten(result)
+
+    def _chunks(self, updates, end, start=0):
+        step = max(1, self.chunk_size // max(1, updates.shape[0]))
+        for offset in range(start, end, step):
+            yield offset, min(offset + step, end)
+
+    def _squared_norms(self, updates, num_weights, center=None):
+        """ ||row - center||^2 of every row, over the weights """
+        squared = torch.zeros(updates.shape[0], dtype=torch.float64, device=self.device)
+        for start, end in self._chunks(updates, num_weights):
+            chunk = updates[:, start:end]
+            if center is not None:
+                chunk = chunk - center[start:end]
+            squared.add_(torch.linalg.vector_norm(chunk, dim=1).to(torch.float64).pow_(2))
+        return squared.to(torch.float32)
+
+    def _weighted_sum(self, updates, weights, start, end):
+        out = torch.empty(end - start, dtype=torch.float32, device=self.device)
+        for chunk_start, chunk_end in self._chunks(updates, end, start):
+            torch.mv(updates[:, chunk_start:chunk_end].t(), weights, out=out[chunk_start - start:chunk_end - start])
+        return out
+
+    def _coordinate_wise(self, updates, num_weights):
+        n = updates.shape[0]
+        trim = int(self.trim_ratio * n)
+        out = torch.empty(num_weights, dtype=torch.float32, device=self.device)
+        for start, end in self._chunks(updates, num_weights):
+            chunk = updates[:, start:end]
+            if self.defense_type == "trimmed_mean":
+                if trim == 0:
+                    out[start:end] = chunk.mean(dim=0)
+                else:
+                    # the kept values are averaged directly: subtracting the trimmed ones from the
+                    # full sum would lose the honest values to cancellation next to a huge upload
+                    out[start:end] = chunk.sort(dim=0).values[trim:n - trim].mean(dim=0)
+            elif n % 2:
+                out[start:end] = chunk.median(dim=0).values
+            else:
+                ordered = chunk.sort(dim=0).values
+                out[start:end] = (ordered[n // 2 - 1] + ordered[n // 2]) / 2
+        return out
+
+    def _krum(self, updates, num_weights):
+        """ indexes of the rows multi-Krum selects """
+        n = updates.shape[0]
+        gram = torch.zeros(n, n, dtype=torch.float64, device=self.device)
+        for start, end in self._chunks(updates, num_weights):
+            chunk = updates[:, start:end]
+            gram.add_((chunk @ chunk.t()).to(torch.float64))
+        squared = gram.diagonal()
+        distances = (squared.view(-1, 1) + squared.view(1, -1) - 2 * gram).clamp_(min=0)
+        distances.fill_diagonal_(float("inf"))
+        neighbours = max(1, min(n - 1, n - self.byzantine_num - 2))
+        scores = distances.topk(neighbours, dim=1, largest=False).values.sum(dim=1) if n > 1 \
+            else torch.zeros(1, dtype=torch.float64, device=self.device)
+        num_selected = min(n, self.krum_m or max(1, n - self.byzantine_num))
+        return scores.topk(num_selected, largest=False).indices.sort().values
+
+    def _geometric_median(self, updates, weights, num_weights):
+        median = self._weighted_sum(updates, weights, 0, num_weights)
+        objective = new_objective = None
+        iteration = 0
+        for iteration in range(1, self.geomed_iters + 1):
+            distances = self._squared_norms(updates, num_weights, center=median).sqrt_()
+            new_objective = float((weights * distances).sum())
+            if objective is not None and abs(objective - new_objective) <= self.geomed_tol * new_objective:
+                break
+            objective = new_objective
+            betas = weights / distances.clamp(min=1e-8)
+            median = self._weighted_sum(updates, betas / betas.sum(), 0, num_weights)
+        logging.info("geometric median: %d Weiszfeld iterations, objective %s" % (iteration, new_objective))
+        return median
@@ -0,0 +1,35 @@
+"""
+    Defenses of BatchedRobustAggregator against model replacement uploads.
+
+    usage (from the FedML directory):
+        python -m pytest fedml_core/robustness/test_batched_robust_aggregation.py
+"""
+import torch
+
+from ..trainer.flat_params import FlatParamLayout
+from .batched_robust_aggregation import BatchedRobustAggregator
+
+
+def aggregate(aggregator, global_flat, uploads):
+    aggregator.start_round(global_flat, len(uploads))
+    for slot, upload in enumerate(uploads):
+        aggregator.add(slot, upload, 1)
+    return aggregator.aggregate()
+
+
+def test_trimmed_mean_ignores_large_attacker():
+    torch.manual_seed(0)
+    numel = 1000
+    global_flat = torch.zeros(numel)
+    honest = [0.01 + 0.001 * torch.randn(numel) for _ in range(9)]
+    attacker = 1e9 * torch.randn(numel)
+    layout = FlatParamLayout([("weight", torch.Size([numel]), torch.float32)], numel)
+    aggregator = BatchedRobustAggregator("trimmed_mean", trim_ratio=0.1, layout=layout)
+    result = aggregate(aggregator, global_flat, honest + [attacker])
+
+    # with 10 uploads one value is trimmed at each end, the attacker's is one of them
+    stacked = torch.stack(honest + [attacker])
+    expected = stacked.sort(dim=0).values[1:9].double().mean(dim=0).float()
+    assert torch.allclose(result, expected, rtol=1e-5, atol=1e-7)
+    assert (result - 0.01).abs().max() < 0.005
+
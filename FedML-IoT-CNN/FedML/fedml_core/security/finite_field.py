@@ -0,0 +1,190 @@
+"""
+    Vectorized arithmetic modulo a prime p < 2^62 on int64 numpy arrays, for
+    the secret sharing (BGW, Lagrange coded computing) of TurboAggregate.
+
+    mul_mod          elementwise a * b mod p; split into limbs when (p - 1)^2
+                     does not fit in an int64
+    pow_mod          elementwise square-and-multiply
+    prod_mod         product along an axis, by pairwise (tree) reduction
+    inv_mod          elementwise inverse, Fermat: a^(p - 2)
+    batch_inv_mod    inverses of many values with one exponentiation,
+                     Montgomery's trick
+    matmul_mod       A @ B mod p on the float64 BLAS: the operands are split
+                     into limbs small enough for every partial dot product to
+                     be exact in a double (< 2^53), the limb products are
+                     recombined mod p
+    vandermonde      V[i, t] = points[i]^t mod p
+    lagrange_coeffs  U[i, j] = l_j(alpha_i), the Lagrange basis polynomials of
+                     the points beta evaluated at alpha: interpolating values
+                     at beta and evaluating at alpha is U @ values
+"""
+import numpy as np
+
+# the largest p for which (p - 1)^2 fits in an int64
+_DIRECT_MAX = 3037000499
+# integers up to 2^53 are exact in a float64
+_FLOAT_BITS = 53
+
+
+def _as_field(a, p):
+    return np.mod(np.asarray(a, dtype=np.int64), p)
+
+
+def mul_mod(a, b, p):
+    """ a * b mod p for a, b in [0, p) """
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    if p <= _DIRECT_MAX:
+        return a * b % p
+    # Horner over the limbs of b: a * limb and result * 2^bits both stay below 2^63
+    bits = 63 - p.bit_length()
+    mask = (1 << bits) - 1
+    result = np.zeros(np.broadcast(a, b).shape, dtype=np.int64)
+    for shift in reversed(range(0, p.bit_length(), bits)):
+        result = (result << bits) % p + a * ((b >> shift) & mask) % p
+        result %= p
+    return result
+
+
+def pow_mod(base, exponent, p):
+    """ base^exponent mod p, exponent >= 0 (arrays broadcast) """
+    base = _as_field(base, p)
+    exponent = np.asarray(exponent, dtype=np.int64)
+    result = np.ones(np.broadcast(base, exponent).shape, dtype=np.int64)
+    square = np.broadcast_to(base, result.shape).copy()
+    exponent = np.broadcast_to(exponent, result.shape)
+    for bit in range(int(exponent.max()).bit_length() if exponent.size else 0):
+        odd = ((exponent >> bit) & 1).astype(bool)
+        result[odd] = mul_mod(result[odd], square[odd], p)
+        square = mul_mod(square, square, p)
+    return result
+
+
+def prod_mod(values, p, axis=-1):
+    """ product of values along axis mod p, 1 for an empty axis """
+    values = np.moveaxis(_as_field(values, p), axis, -1)
+    if values.shape[-1] == 0:
+        return np.ones(values.shape[:-1], dtype=np.int64)
+    while values.shape[-1] > 1:
+        if values.shape[-1] % 2:
+            values = np.concatenate([values, np.ones(values.shape[:-1] + (1,), dtype=np.int64)], axis=-1)
+        values = mul_mod(values[..., 0::2], values[..., 1::2], p)
+    return values[..., 0]
+
+
+def inv_mod(a, p):
+    """ elementwise inverse mod p, by Fermat's little theorem """
+    a = _as_field(a, p)
+    if np.any(a == 0):
+        raise ZeroDivisionError("0 has no inverse mod {}".format(p))
+    return pow_mod(a, p - 2, p)
+
+
+def batch_inv_mod(values, p):
+    """
+        Elementwise inverse mod p with a single modular exponentiation
+        (Montgomery's trick): the inverse of the product of all values is
+        unwound into the inverse of every value by prefix products. Python
+        integers, exact for any p.
+    """
+    shape = np.shape(values)
+    flat = [int(v) for v in _as_field(values, p).reshape(-1)]
+    prefix = []
+    accum = 1
+    for v in flat:
+        if v == 0:
+            raise ZeroDivisionError("0 has no inverse mod {}".format(p))
+        prefix.append(accum)
+        accum = accum * v % p
+    inv = pow(accum, p - 2, p)
+    out = [0] * len(flat)
+    for i in reversed(range(len(flat))):
+        out[i] = inv * prefix[i] % p
+        inv = inv * flat[i] % p
+    return np.array(out, dtype=np.int64).reshape(shape)[()]
+
+
+def _limbs(a, bits, count):
+    mask = (1 << bits) - 1
+    return [((a >> (bits * i)) & mask).astype(np.float64) for i in range(count)]
+
+
+def matmul_mod(A, B, p, block=1 << 16):
+    """
+        A @ B mod p for int64 matrices (A of shape (r, k), B of shape (k, ...)),
+        through float64 matrix products that are exact.
+
+        Every partial dot product of an A limb and a B limb is below
+        k * 2^(bits_A + bits_B) <= 2^53. Only B is split when that leaves
+        limbs of a useful width, otherwise both are; the limb count is kept
+        as small as p and k allow (a single product for small p). B is
+        processed block columns at a time.
+    """
+    A = _as_field(A, p)
+    B = _as_field(B, p)
+    shape = B.shape
+    B = B.reshape(shape[0], -1)
+    k = A.shape[-1]
+    p_bits = (p - 1).bit_length()
+    budget = _FLOAT_BITS - max(1, k).bit_length()
+    if budget < 2:
+        raise ValueError("inner dimension {} too large for exact float64 products".format(k))
+
+    # only B split: A limbs of p_bits, B limbs of budget - p_bits bits
+    options = []
+    if budget - p_bits >= 1:
+        bits_b = min(budget - p_bits, p_bits)
+        options.append((1, p_bits, -(-p_bits // bits_b), bits_b))
+    half = budget // 2
+    options.append((-(-p_bits // half), half, -(-p_bits // (budget - half)), budget - half))
+    count_a, bits_a, count_b, bits_b = min(options, key=lambda option: option[0] * option[2])
+
+    limbs_a = _limbs(A, bits_a, count_a)
+    result = np.zeros((A.shape[0], B.shape[1]), dtype=np.int64)
+    # column blocks bound the float64 temporaries, the output is the only full-size array
+    for start in range(0, B.shape[1], block):
+        end = min(start + block, B.shape[1])
+        limbs_b = _limbs(B[:, start:end], bits_b, count_b)
+        out = result[:, start:end]
+        for i, limb_a in enumerate(limbs_a):
+            for j, limb_b in enumerate(limbs_b):
+                partial = np.mod((limb_a @ limb_b).astype(np.int64), p)
+                scale = pow(2, bits_a * i + bits_b * j, p)
+                if scale != 1:
+                    partial = mul_mod(partial, scale, p)
+                out += partial
+                out %= p
+    return result.reshape((A.shape[0],) + shape[1:])
+
+
+def vandermonde(points, num_powers, p):
+    """ V[i, t] = points[i]^t mod p, t < num_powers """
+    points = _as_field(points, p)
+    V = np.ones((len(points), num_powers), dtype=np.int64)
+    for t in range(1, num_powers):
+        V[:, t] = mul_mod(V[:, t - 1], points, p)
+    return V
+
+
+def lagrange_coeffs(alpha_s, beta_s, p):
+    """
+        U[i, j] = prod_{l != j} (alpha_i - beta_l) / (beta_j - beta_l) mod p
+        for distinct beta_s. The numerators are prefix times suffix products
+        over l, one vectorized step per beta; the denominators are inverted
+        together by batch_inv_mod.
+    """
+    alpha_s = _as_field(alpha_s, p).reshape(-1)
+    beta_s = _as_field(beta_s, p).reshape(-1)
+    n = len(beta_s)
+
+    diff = np.mod(beta_s.reshape(-1, 1) - beta_s.reshape(1, -1), p)
+    np.fill_diagonal(diff, 1)
+    den_inv = batch_inv_mod(prod_mod(diff, p, axis=1), p).reshape(n)
+
+    factors = np.mod(alpha_s.reshape(-1, 1) - beta_s.reshape(1, -1), p)
+    prefix = np.ones((len(alpha_s), n), dtype=np.int64)
+    suffix = np.ones((len(alpha_s), n), dtype=np.int64)
+    for j in range(1, n):
+        prefix[:, j] = mul_mod(prefix[:, j - 1], factors[:, j - 1], p)
+        suffix[:, n - 1 - j] = mul_mod(suffix[:, n - j], factors[:, n - j], p)
+    return mul_mod(mul_mod(prefix, suffix, p), den_inv.reshape(1, -1), p)
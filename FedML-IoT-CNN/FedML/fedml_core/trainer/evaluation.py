@@ -0,0 +1,153 @@
+"""
+    Server side evaluation helpers.
+
+    CachedEvalSet    the (selected) batches of a test loader, materialized once
+                     as two tensors and served in large batches.
+    fork_map         per-client evaluations fanned out over forked processes.
+    BackgroundEvaluator
+                     evaluation of a snapshot of the global model in a worker
+                     thread, so that the next round's broadcast does not wait
+                     for it.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class CachedEvalSet(object):
+    """
+        The batches of a deterministic (test) loader, collated once into one x
+        and one y tensor (pinned when CUDA is available) instead of re-running
+        the dataloader transforms every round.
+
+        Iterating yields (x, y) batches of eval_batch_size samples, already on
+        device, so a test() loop over a DataLoader works on it unchanged. Large
+        batches pay off on a GPU. On a CPU, the activations of batches much
+        larger than the loader's fall out of the cache, so the default there is
+        the loader's batch size. Sums over the batches (correct predictions,
+        loss * batch size) are the same as over the original loader. weights
+        holds 1 / (size of the original batch) per sample, to reproduce a sum
+        of per-batch mean losses.
+    """
+
+    def __init__(self, x, y, weights, num_batches, eval_batch_size, device=torch.device("cpu")):
+        self.x = x
+        self.y = y
+        self.weights = weights
+        self.num_batches = num_batches
+        self.eval_batch_size = eval_batch_size
+        self.device = device
+
+    @classmethod
+    def from_loader(cls, loader, batch_selection=None, eval_batch_size=0, device=torch.device("cpu")):
+        """ the batches of loader whose index is in batch_selection (all if None), eval_batch_size 0 for the default """
+        selection = None if batch_selection is None else set(batch_selection)
+        xs, ys, weights = [], [], []
+        for batch_idx, (x, y) in enumerate(loader):
+            if selection is not None and batch_idx not in selection:
+                continue
+            x, y = torch.as_tensor(x), torch.as_tensor(y)
+            xs.append(x)
+            ys.append(y)
+            weights.append(torch.full((len(y),), 1.0 / len(y)))
+        if not xs:
+            raise ValueError("no batch of the loader is selected")
+        x, y, weights = torch.cat(xs), torch.cat(ys), torch.cat(weights)
+        if torch.cuda.is_available():
+            x, y = x.pin_memory(), y.pin_memory()
+        if not eval_batch_size:
+            eval_batch_size = 1024 if torch.device(device).type == "cuda" else len(ys[0])
+        logging.info("cached %d evaluation samples (%d batches)" % (len(y), len(xs)))
+        return cls(x, y, weights, len(xs), eval_batch_size, device)
+
+    def __len__(self):
+        return (len(self.y) + self.eval_batch_size - 1) // self.eval_batch_size
+
+    def __iter__(self):
+        non_blocking = self.x.is_pinned()
+        for start in range(0, len(self.y), self.eval_batch_size):
+            end = start + self.eval_batch_size
+            yield (self.x[start:end].to(self.device, non_blocking=non_blocking),
+                   self.y[start:end].to(self.device, non_blocking=non_blocking))
+
+    def batches(self):
+        """ (x, y, weights) batches, weights of the original batch means """
+        for start, (x, y) in zip(range(0, len(self.y), self.eval_batch_size), self):
+            yield x, y, self.weights[start:start + len(y)].to(self.device)
+
+
+# the function fork_map's workers run, inherited through fork instead of pickled
+_FORK_TASK = None
+
+
+def _run_fork_task(item):
+    return _FORK_TASK(item)
+
+
+def _init_fork_worker():
+    # the processes share the cores, one intra-op thread each
+    torch.set_num_threads(1)
+
+
+def fork_map(fn, items, num_workers):
+    """
+        [fn(item) for item in items] over num_workers forked processes.
+
+        fn may be a closure over the model and the data: the workers inherit
+        them from the fork (copy-on-write), only the items and the results are
+        pickled. Runs serially for num_workers <= 1 and where fork is not
+        available; CUDA state does not survive a fork, so evaluate on the CPU.
+    """
+    global _FORK_TASK
+    items = list(items)
+    if num_workers <= 1 or len(items) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return [fn(item) for item in items]
+    _FORK_TASK = fn
+    try:
+        with multiprocessing.get_context("fork").Pool(min(num_workers, len(items)),
+                                                      initializer=_init_fork_worker) as pool:
+            return pool.map(_run_fork_task, items)
+    finally:
+        _FORK_TASK = None
+
+
+class BackgroundEvaluator(object):
+    """
+        Runs evaluations one at a time, in submission order, in a worker
+        thread. The caller passes a snapshot of the model, so the next round
+        can go on changing the live one.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        future = self.executor.submit(fn, *args)
+        with self.lock:
+            self.pending = [f for f in self.pending if not f.done()] + [future]
+        future.add_done_callback(self._log_error)
+        return future
+
+    def wait(self):
+        """ blocks until every submitted evaluation is done """
+        with self.lock:
+            pending = list(self.pending)
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def shutdown(self):
+        self.wait()
+        self.executor.shutdown(wait=True)
+
+    @staticmethod
+    def _log_error(future):
+        if future.exception() is not None:
+            logging.error("background evaluation failed: %s" % future.exception())
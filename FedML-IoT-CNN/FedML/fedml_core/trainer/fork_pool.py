@@ -0,0 +1,96 @@
+import logging
+import traceback
+
+import torch
+import torch.multiprocessing as mp
+
+
+def _worker_loop(run_task, tasks, results, num_threads):
+    torch.set_num_threads(num_threads)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_idx, task_args = task
+        try:
+            results.put((task_idx, run_task(*task_args), None))
+        except Exception:
+            results.put((task_idx, None, traceback.format_exc()))
+
+
+class ForkWorkerPool(object):
+    """
+        num_workers long-lived processes running run_task(*task_args) for the
+        tasks of map(), e.g. the clients or groups of a simulated round.
+
+        The workers are forked on the first map(), once the caller is set up,
+        and kept until close(): they inherit run_task with its objects (the
+        datasets copy-on-write, their own replica of the model) instead of
+        having them pickled, so only the task arguments and the results go
+        through the queues. State that changes between rounds, like the global
+        model, has to be in torch.multiprocessing shared memory tensors created
+        before the fork.
+
+        Workers get torch.get_num_threads() // num_workers intra-op threads, at
+        least one. num_workers <= 1 runs the tasks in the calling process.
+
+        Unlike evaluation.fork_map, which forks once per call to see the
+        current model, the workers outlive the call.
+    """
+
+    def __init__(self, run_task, num_workers=1, name="task"):
+        self.run_task = run_task
+        self.num_workers = num_workers
+        self.name = name
+        self.workers = []
+        self.tasks = None
+        self.results = None
+
+    @staticmethod
+    def usable_workers(num_workers, device, name="task"):
+        """ num_workers, or 1 where workers cannot be forked: without fork or for a non-CPU device """
+        if num_workers > 1 and (torch.device(device).type != "cpu" or "fork" not in mp.get_all_start_methods()):
+            logging.warning("%s workers need fork and a CPU device, running in the main process" % name)
+            return 1
+        return num_workers
+
+    def map(self, tasks):
+        """ [run_task(*task_args) for task_args in tasks], in task order """
+        tasks = list(tasks)
+        if self.num_workers <= 1:
+            return [self.run_task(*task_args) for task_args in tasks]
+
+        self._start()
+        for task_idx, task_args in enumerate(tasks):
+            self.tasks.put((task_idx, task_args))
+        results, errors = [None] * len(tasks), []
+        for _ in range(len(tasks)):
+            task_idx, result, error = self.results.get()
+            if error is not None:
+                errors.append(error)
+            results[task_idx] = result
+        if errors:
+            raise RuntimeError("%s failed in a worker:\n%s" % (self.name, errors[0]))
+        return results
+
+    def close(self):
+        for _ in self.workers:
+            self.tasks.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+    def _start(self):
+        if self.workers:
+            return
+        context = mp.get_context("fork")
+        self.tasks = context.SimpleQueue()
+        self.results = context.SimpleQueue()
+        num_threads = max(1, torch.get_num_threads() // self.num_workers)
+        for _ in range(self.num_workers):
+            # the target and its arguments are inherited through the fork, not pickled
+            worker = context.Process(target=_worker_loop, args=(self.run_task, self.tasks, self.results, num_threads),
+                                     daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        logging.info("started %d %s workers, %d threads each" % (self.num_workers, self.name, num_threads))
@@ -99,6 +99,18 @@ def add_args(parser):
     parser.add_argument('--gpu_num_per_server', type=int, default=4,
                         help='gpu_num_per_server')
 
+    parser.add_argument('--eval_cache', type=int, default=0,
+                        help='cache the global test set as tensors for the server side evaluation')
+
+    parser.add_argument('--eval_batch_size', type=int, default=0,
+                        help='batch size of the cached evaluation, 0 for 1024 on GPU / the loader batch size on CPU')
+
+    parser.add_argument('--eval_workers', type=int, default=0,
+                        help='processes the per-client evaluations are spread over (CPU only), 0 to run them serially')
+
+    parser.add_argument('--eval_async', type=int, default=0,
+                        help='evaluate a snapshot of the global model while the next round is broadcast')
+
     parser.add_argument('--ci', type=int, default=0,
                         help='CI')
     args = parser.parse_args()
@@ -54,14 +54,32 @@ def add_args(parser):
                         help='partition alpha (default: 0.5)')
 
     parser.add_argument('--defense_type', type=str, default='weak_dp', metavar='N',
-                        help='the robust aggregation method to use on the server side')
+                        help='the robust aggregation method to use on the server side: norm_diff_clipping|weak_dp|'
+                             'median|trimmed_mean|krum|multi_krum|geometric_median')
 
-    parser.add_argument('--norm_bound', type=str, default=30.0, metavar='N',
+    parser.add_argument('--norm_bound', type=float, default=30.0, metavar='N',
                         help='the norm bound of the weight difference in norm clipping defense.')
 
-    parser.add_argument('--stddev', type=str, default=0.025, metavar='N',
+    parser.add_argument('--stddev', type=float, default=0.025, metavar='N',
                         help='the standard deviation of the Gaussian noise added in weak DP defense.')
 
+    parser.add_argument('--trim_ratio', type=float, default=0.1,
+                        help='the fraction of the largest and of the smallest values dropped per coordinate '
+                             'in trimmed_mean defense.')
+
+    parser.add_argument('--byzantine_num', type=int, default=0,
+                        help='the number of byzantine clients tolerated by krum and multi_krum defenses.')
+
+    parser.add_argument('--krum_m', type=int, default=0,
+                        help='the number of uploads averaged by multi_krum defense (0: all but byzantine_num).')
+
+    parser.add_argument('--geomed_iters', type=int, default=10,
+                        help='the maximum number of Weiszfeld iterations of geometric_median defense.')
+
+    parser.add_argument('--robust_chunk_size', type=int, default=1 << 24,
+                        help='the number of (clients x params) matrix elements processed at once by the '
+                             'robust aggregation, bounds its temporary memory.')
+
     parser.add_argument('--client_num_in_total', type=int, default=1000, metavar='NN',
                         help='number of workers in a distributed cluster')
 
@@ -88,6 +88,11 @@ def add_args(parser):
 
     parser.add_argument('--ci', type=int, default=0,
                         help='CI')
+
+    parser.add_argument('--sim_workers', type=int, default=0,
+                        help='train the sampled clients in this many forked processes sharing the global model '
+                             '(1: in this process); every client trains with its own seed, so that the result '
+                             'does not depend on the number of workers; 0 for the plain loop')
     return parser
 
 
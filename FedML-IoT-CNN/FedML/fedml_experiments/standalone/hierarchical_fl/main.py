@@ -10,7 +10,7 @@ import wandb
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), "../../../")))
 
 from fedml_api.standalone.hierarchical_fl.trainer import Trainer
-from fedml_experiments.standalone.fedavg.main_fedavg import add_args, load_data, create_model
+from fedml_experiments.standalone.fedavg.main_fedavg import add_args, load_data, create_model, custom_model_trainer
 
 if __name__ == "__main__":
     logging.basicConfig()
@@ -23,6 +23,10 @@ if __name__ == "__main__":
     parser.add_argument('--global_comm_round', type=int, default=10, help='the number of global communications')
     parser.add_argument('--group_comm_round', type=int, default=10,
                         help='the number of group communications within a global communication')
+    parser.add_argument('--group_workers', type=int, default=0,
+                        help='train the groups of a global round in this many forked processes sharing the datasets '
+                             '(1: in this process); every client trains with its own seed, so that the result '
+                             'does not depend on the number of workers; 0 for the sequential loop')
     args = parser.parse_args()
     logger.info(args)
     device = torch.device("cuda:" + str(args.gpu) if torch.cuda.is_available() else "cpu")
@@ -47,7 +51,8 @@ if __name__ == "__main__":
     # Note if the model is DNN (e.g., ResNet), the training will be very slow.
     # In this case, please use our FedML distributed version (./fedml_experiments/distributed_fedavg)
     model = create_model(args, model_name=args.model, output_dim=dataset[7])
+    model_trainer = custom_model_trainer(args, model)
     logging.info(model)
 
-    trainer = Trainer(dataset, model, device, args)
+    trainer = Trainer(dataset, device, args, model_trainer)
     trainer.train()
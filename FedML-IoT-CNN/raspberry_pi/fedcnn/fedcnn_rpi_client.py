@@ -1,4 +1,5 @@
 import argparse
+import io
 import logging
 import os
 import sys
@@ -23,6 +24,8 @@ from FedML.fedml_api.data_preprocessing.load_data import load_partition_data
 from FedML.fedml_api.data_preprocessing.load_data import load_partition_data_shakespeare
 from FedML.fedml_api.data_preprocessing.load_data import load_partition_data_HAR
 from FedML.fedml_api.data_preprocessing.load_data import load_partition_data_HPWREN
+from FedML.fedml_api.data_preprocessing.load_data import load_partition_data_client
+from FedML.fedml_api.data_preprocessing.tensor_cache import TensorCache
 
 from FedML.fedml_api.model.Baseline.FashionMNIST import FashionMNIST_Net
 from FedML.fedml_api.model.Baseline.MNIST import MNIST_Net
@@ -82,6 +85,23 @@ def register(args, uuid):
             self.mqtt_host = training_task_args['mqtt_host']
             self.mqtt_port = training_task_args['mqtt_port']
             self.method = training_task_args['method']
+            # servers that predate the binary wire format do not send this key
+            self.wire_format = training_task_args.get('wire_format', 'json')
+            self.flat_params = training_task_args.get('flat_params', 0)
+            self.mqtt_compression = training_task_args.get('mqtt_compression', 'none')
+            self.mqtt_compression_level = training_task_args.get('mqtt_compression_level', None)
+            self.mqtt_chunk_size = training_task_args.get('mqtt_chunk_size', 0)
+            self.delta_updates = training_task_args.get('delta_updates', 0)
+            self.delta_quantize_bits = training_task_args.get('delta_quantize_bits', 0)
+            self.delta_topk_ratio = training_task_args.get('delta_topk_ratio', 0.0)
+            self.delta_error_feedback = training_task_args.get('delta_error_feedback', 1)
+            self.partition_seed = training_task_args.get('partition_seed', None)
+            self.pretransformed = training_task_args.get('pretransformed', 0)
+            self.pretransformed_storage = training_task_args.get('pretransformed_storage', 'float32')
+            self.pretransformed_augment = training_task_args.get('pretransformed_augment', 1)
+            self.client_index = client_ID - 1
+            self.partition_plan_url = training_task_args.get('partition_plan_url', None)
+            self.train_data_num = training_task_args.get('train_data_num', None)
 
     args = Args()
     return client_ID, args
@@ -152,13 +172,23 @@ def load_data(args, dataset_name):
             "============================Starting loading {}==========================#".format(
                 args.dataset))
         data_dir = './../data/' + args.dataset
+        if args.partition_plan_url is not None:
+            # the server's partition plan: only this client's indexes, no partitioning here
+            r = requests.get(url=args.partition_plan_url)
+            r.raise_for_status()
+            dataidxs = np.load(io.BytesIO(r.content))
+            return list(load_partition_data_client(args.dataset, data_dir, args.client_index, dataidxs,
+                                                   args.batch_size, args.train_data_num, None,
+                                                   TensorCache.from_args(args)))
         train_data_num, test_data_num, train_data_global, test_data_global, \
         train_data_local_num_dict, train_data_local_dict, test_data_local_dict, \
         class_num = data_loader(args.dataset, data_dir, args.partition_method,
                                 args.partition_label, args.partition_alpha, args.partition_secondary,
                                 args.partition_min_cls, args.partition_max_cls,
                                 args.client_num_in_total, args.batch_size,
-                                args.data_size_per_client)
+                                args.data_size_per_client,
+                                partition_seed=args.partition_seed,
+                                tensor_cache=TensorCache.from_args(args))
         print(
             "================================={} loaded===============================#".format(
                 args.dataset))
@@ -0,0 +1,134 @@
+"""
+    Samples/s of the StackOverflow datasets before and after the h5 handle pool
+    and per-client block cache, on a synthetic local h5 file.
+
+    A file with the StackOverflow layout (examples/<client>/tokens, title, tags)
+    and the word / tag count files are written to a temporary directory; the
+    "before" datasets open the file and read the whole client array on every
+    sample, as the datasets did before h5_pool.py.
+
+    usage (from the FedML directory):
+        python -m fedml_api.data_preprocessing.benchmark_stackoverflow_h5 --clients 4 --samples 200
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import h5py
+import numpy as np
+import torch.utils.data as data
+
+from fedml_api.data_preprocessing.h5_pool import client_blocks
+from fedml_api.data_preprocessing.stackoverflow_lr import utils as lr_utils
+from fedml_api.data_preprocessing.stackoverflow_lr.dataset import StackOverflowDataset as LRDataset
+from fedml_api.data_preprocessing.stackoverflow_nwp import utils as nwp_utils
+from fedml_api.data_preprocessing.stackoverflow_nwp.dataset import StackOverflowDataset as NWPDataset
+
+VOCAB_SIZE = 10000
+TAG_SIZE = 500
+
+
+class LegacyNWPDataset(NWPDataset):
+
+    def __len__(self):
+        with h5py.File(self.h5_path, 'r') as h5_file:
+            return len(h5_file[self._EXAMPLE][self.client_id][self._TOKENS][()])
+
+    def __getitem__(self, idx):
+        with h5py.File(self.h5_path, 'r') as h5_file:
+            sample = h5_file[self._EXAMPLE][self.client_id][self._TOKENS][()][idx].decode('utf8')
+            sample = self.preprocess(sample)
+        return np.asarray(sample[:-1]), np.asarray(sample[1:])
+
+
+class LegacyLRDataset(LRDataset):
+
+    def __len__(self):
+        with h5py.File(self.h5_path, 'r') as h5_file:
+            return len(h5_file[self._EXAMPLE][self.client_id][self._TAGS][()])
+
+    def __getitem__(self, idx):
+        with h5py.File(self.h5_path, 'r') as h5_file:
+            if idx > self.__len__():
+                return None
+            raw_token = h5_file[self._EXAMPLE][self.client_id][self._TOKENS][()][idx].decode('utf8')
+            raw_title = h5_file[self._EXAMPLE][self.client_id][self._TITLE][()][idx].decode('utf8')
+            sample = ' '.join([raw_token, raw_title])
+            tag = h5_file[self._EXAMPLE][self.client_id][self._TAGS][()][idx].decode('utf8')
+            if self.input_fn:
+                sample = self.input_fn(sample)
+            if self.target_fn:
+                tag = self.target_fn(tag)
+        return (sample, tag)
+
+
+def write_synthetic(data_dir, clients, samples, seed=0):
+    rng = random.Random(seed)
+    words = ["w%d" % i for i in range(VOCAB_SIZE + 2000)]
+    tags = ["t%d" % i for i in range(TAG_SIZE + 100)]
+    with open(os.path.join(data_dir, nwp_utils.DEFAULT_WORD_COUNT_FILE), 'w') as f:
+        for i, word in enumerate(words[:VOCAB_SIZE]):
+            f.write("%s %d\n" % (word, VOCAB_SIZE - i))
+    with open(os.path.join(data_dir, lr_utils.DEFAULT_TAG_COUNT_FILE), 'w') as f:
+        json.dump({tag: TAG_SIZE - i for i, tag in enumerate(tags[:TAG_SIZE])}, f)
+
+    path = os.path.join(data_dir, "stackoverflow_synthetic.h5")
+    string_dtype = h5py.special_dtype(vlen=bytes)
+    with h5py.File(path, 'w') as h5_file:
+        for client in range(clients):
+            group = h5_file.create_group("examples/%08d" % client)
+            for name, length, vocabulary in [("tokens", 25, words), ("title", 8, words), ("tags", 3, tags)]:
+                sep = "|" if name == "tags" else " "
+                rows = [sep.join(rng.choice(vocabulary) for _ in range(rng.randint(1, length))).encode('utf8')
+                        for _ in range(samples)]
+                group.create_dataset(name, data=np.array(rows, dtype=object), dtype=string_dtype)
+    return path
+
+
+def samples_per_second(datasets, batch_size, num_workers, epochs):
+    loader = data.DataLoader(data.ConcatDataset(datasets), batch_size=batch_size, shuffle=True,
+                             num_workers=num_workers)
+    start = time.perf_counter()
+    n = 0
+    for _ in range(epochs):
+        for x, _ in loader:
+            n += len(x)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--samples', type=int, default=200, help='samples per client')
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--num_workers', type=int, default=0)
+    parser.add_argument('--epochs', type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = write_synthetic(data_dir, args.clients, args.samples)
+
+        def tokenizer(x):
+            return nwp_utils.tokenizer(x, data_dir)
+        lr_preprocess = {"input": lambda x: lr_utils.preprocess_input(x, data_dir),
+                         "target": lambda y: lr_utils.preprocess_target(y, data_dir)}
+
+        variants = [
+            ("stackoverflow_nwp", lambda cls: [cls(path, i, "train", tokenizer) for i in range(args.clients)],
+             LegacyNWPDataset, NWPDataset),
+            ("stackoverflow_lr", lambda cls: [cls(path, i, "train", lr_preprocess) for i in range(args.clients)],
+             LegacyLRDataset, LRDataset),
+        ]
+        print("{:<20} {:>16} {:>16} {:>8}".format("dataset", "before samples/s", "after samples/s", "speedup"))
+        for name, make, legacy_class, dataset_class in variants:
+            before = samples_per_second(make(legacy_class), args.batch_size, args.num_workers, args.epochs)
+            client_blocks().clear()
+            after = samples_per_second(make(dataset_class), args.batch_size, args.num_workers, args.epochs)
+            print("{:<20} {:>16,.0f} {:>16,.0f} {:>7.1f}x".format(name, before, after, after / before))
+
+
+if __name__ == '__main__':
+    main()
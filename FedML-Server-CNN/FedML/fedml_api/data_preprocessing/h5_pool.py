@@ -0,0 +1,101 @@
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import h5py
+
+
+class H5HandlePool(object):
+    """
+        Read-only h5py.File handles kept open, one per path and process.
+
+        Handles are opened lazily on first use, so a DataLoader worker opens its
+        own handles instead of using ones inherited from the parent. HDF5 handles
+        are not fork-safe: when the pool sees a new pid, the inherited handles
+        are forgotten without being touched and reopened in the new process.
+    """
+
+    def __init__(self):
+        self._pid = os.getpid()
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._files = {}
+            h5_file = self._files.get(path)
+            if h5_file is None:
+                h5_file = h5py.File(path, 'r')
+                self._files[path] = h5_file
+            return h5_file
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                for h5_file in self._files.values():
+                    try:
+                        h5_file.close()
+                    except Exception as e:
+                        logging.debug("H5HandlePool: closing %s failed: %s" % (h5_file, e))
+            self._files = {}
+
+
+class ClientBlockCache(object):
+    """
+        LRU cache of per-client blocks (the whole decoded/preprocessed data of
+        one client), bounded by max_bytes so that iterating a ConcatDataset over
+        many clients does not keep every client in memory.
+
+        load() returns (block, nbytes); a block larger than max_bytes is still
+        returned, it only evicts everything else.
+    """
+
+    def __init__(self, max_bytes=256 << 20):
+        self.max_bytes = max_bytes
+        self._blocks = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        with self._lock:
+            entry = self._blocks.get(key)
+            if entry is not None:
+                self._blocks.move_to_end(key)
+                return entry[0]
+        block, nbytes = load()
+        with self._lock:
+            if key not in self._blocks:
+                self._blocks[key] = (block, nbytes)
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes and len(self._blocks) > 1:
+                    _, (_, evicted) = self._blocks.popitem(last=False)
+                    self._bytes -= evicted
+        return block
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._bytes = 0
+
+
+_pool = H5HandlePool()
+_blocks = ClientBlockCache()
+atexit.register(_pool.close)
+
+
+def get_h5_file(path):
+    """ the pooled read-only handle of path in this process """
+    return _pool.get(path)
+
+
+def client_blocks():
+    """ the process-wide ClientBlockCache """
+    return _blocks
+
+
+def set_block_cache_size(max_bytes):
+    _blocks.max_bytes = max_bytes
@@ -0,0 +1,73 @@
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import torch.utils.data as data
+
+from .tensor_cache import PretransformedDataset, batch_loader
+
+
+class LazyLoaderDict(Mapping):
+    """
+        client index -> DataLoader, built by factory(client_idx) on first access.
+
+        A drop-in for the train_data_local_dict / test_data_local_dict dicts:
+        indexing, len(), iteration, keys() / values() / items() and `in` work
+        as on the dict of all loaders, but only the loaders in use exist. At
+        most max_loaders built loaders are kept; the least recently used one is
+        dropped beyond that and rebuilt if it is accessed again, which is cheap
+        since the loaders are index views of a shared dataset.
+    """
+
+    def __init__(self, keys, factory, max_loaders=64):
+        self._keys = list(keys)
+        self._key_set = set(self._keys)
+        self._factory = factory
+        self.max_loaders = max_loaders
+        self._loaders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, client_idx):
+        with self._lock:
+            loader = self._loaders.get(client_idx)
+            if loader is not None:
+                self._loaders.move_to_end(client_idx)
+                return loader
+            if client_idx not in self._key_set:
+                raise KeyError(client_idx)
+            loader = self._factory(client_idx)
+            self._loaders[client_idx] = loader
+            while self.max_loaders is not None and len(self._loaders) > self.max_loaders:
+                self._loaders.popitem(last=False)
+            return loader
+
+    def __contains__(self, client_idx):
+        return client_idx in self._key_set
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def built(self):
+        """ indexes of the loaders that currently exist """
+        with self._lock:
+            return list(self._loaders.keys())
+
+
+def subset_loader_factory(dataset, dataidx_map, batch_size, shuffle=True, drop_last=True):
+    """
+        factory of LazyLoaderDict: a DataLoader over Subset(dataset, dataidx_map[client_idx]),
+        an index view of the one shared dataset instead of a per-client copy; for a
+        PretransformedDataset, a batch_loader over its subset()
+    """
+    def build(client_idx):
+        if isinstance(dataset, PretransformedDataset):
+            return batch_loader(dataset.subset(dataidx_map[client_idx]), batch_size, shuffle, drop_last)
+        loader = data.DataLoader(dataset=data.Subset(dataset, dataidx_map[client_idx]), batch_size=batch_size,
+                                 shuffle=shuffle, drop_last=drop_last)
+        logging.debug("client_idx = %d, built loader of %d batches" % (client_idx, len(loader)))
+        return loader
+    return build
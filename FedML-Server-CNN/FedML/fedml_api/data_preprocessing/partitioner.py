@@ -0,0 +1,171 @@
+import logging
+
+import numpy as np
+
+
+class Partition(object):
+    """
+        Sample indexes of all clients as one flat array: client j owns
+        indices[offsets[j]:offsets[j + 1]]. counts is the (clients, labels)
+        matrix of per-class sample numbers, labels the label values of its
+        columns.
+    """
+
+    def __init__(self, indices, offsets, counts, labels):
+        self.indices = indices
+        self.offsets = offsets
+        self.counts = counts
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def client(self, client_idx):
+        return self.indices[self.offsets[client_idx]:self.offsets[client_idx + 1]]
+
+    def dataidx_map(self):
+        """ {client: index array} as net_dataidx_map, views of the flat array """
+        return {j: self.client(j) for j in range(len(self))}
+
+    def cls_counts(self):
+        """ {client: {label: count}} of the present labels, as record_net_data_stats """
+        clients, columns = np.nonzero(self.counts)
+        stats = {j: {} for j in range(len(self))}
+        for j, c, n in zip(clients.tolist(), columns.tolist(), self.counts[clients, columns].tolist()):
+            stats[j][self.labels[c]] = n
+        return stats
+
+
+class Partitioner(object):
+    """
+        NumPy partition engine for the iid, bias and noniid distributions of
+        load_data.partition_data.
+
+        Every label has a random permutation of its sample indexes and a
+        cursor; a client's share of a label is the next n entries of it, and
+        a label that runs out starts over from the beginning of the same
+        permutation (the list-based Loader dumps all used data back instead).
+        The (clients, labels) count matrix of a distribution is drawn for all
+        clients at once, and the indexes of every label are scattered into
+        the flat client-major array in one pass, so the cost is linear in
+        n_clients * data_size_per_client.
+
+        All draws come from one np.random.Generator seeded with seed; without
+        a seed, it is drawn from np.random, so np.random.seed() still makes
+        the partition reproducible.
+    """
+
+    def __init__(self, y_train, labels=None, seed=None):
+        self.y_train = np.asarray(y_train)
+        self.labels = np.sort(np.unique(self.y_train)) if labels is None else np.asarray(sorted(labels))
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1)
+        self.rng = np.random.default_rng(seed)
+
+        label_idx = np.searchsorted(self.labels, self.y_train)
+        in_labels = (label_idx < len(self.labels)) & \
+            (self.labels[np.minimum(label_idx, len(self.labels) - 1)] == self.y_train)
+        # per-label permutations, concatenated, with their start offsets
+        order = np.argsort(np.where(in_labels, label_idx, len(self.labels)), kind="stable")
+        self.label_sizes = np.bincount(label_idx[in_labels], minlength=len(self.labels))
+        self.label_starts = np.concatenate([[0], np.cumsum(self.label_sizes)])
+        self.pools = order[:self.label_starts[-1]].copy()
+        for l in range(len(self.labels)):
+            start, end = self.label_starts[l], self.label_starts[l + 1]
+            self.pools[start:end] = self.pools[start:end][self.rng.permutation(end - start)]
+        self.cursors = np.zeros(len(self.labels), dtype=np.int64)
+
+    # count matrices
+
+    def _split_counts(self, totals, k):
+        """ (n, k) near-equal split of every total over k slots, as uniform(), in a random slot order per row """
+        totals = np.asarray(totals, dtype=np.float64)
+        avg = totals[:, None] / k
+        steps = np.arange(k + 1)[None, :]
+        counts = np.diff(np.floor(steps * avg).astype(np.int64), axis=1)
+        return np.take_along_axis(counts, self.rng.random(counts.shape).argsort(axis=1), axis=1)
+
+    def iid_counts(self, n_clients, size):
+        return self._split_counts(np.full(n_clients, size), len(self.labels))
+
+    def bias_counts(self, n_clients, size, alpha, secondary, label_weights):
+        """
+            a majority of size * alpha samples of one preferred label per client, the rest
+            over the others; the preferred labels are drawn with label_weights in a random order
+        """
+        k = len(self.labels)
+        weights = np.asarray(label_weights, dtype=np.float64)[self.rng.permutation(k)]
+        logging.info('Label distribution:  %s' % str(weights.astype(np.int64).tolist()))
+        pref = self.rng.choice(k, n_clients, p=weights / weights.sum())
+        majority = int(size * alpha)
+        minority = size - majority
+
+        if secondary:
+            minor = np.zeros((n_clients, k - 1), dtype=np.int64)
+            minor[np.arange(n_clients), self.rng.integers(0, k - 1, n_clients)] = minority
+        else:
+            minor = self._split_counts(np.full(n_clients, minority), k - 1)
+        # minority slot s is label s below the preferred label and s + 1 from it on
+        counts = np.zeros((n_clients, k), dtype=np.int64)
+        slots = np.arange(k - 1)[None, :]
+        columns = slots + (slots >= pref[:, None])
+        np.put_along_axis(counts, columns, minor, axis=1)
+        counts[np.arange(n_clients), pref] = majority
+        return counts
+
+    def noniid_counts(self, n_clients, size, min_cls, max_cls):
+        """ size samples over cls_num random labels per client, cls_num in [min_cls, max_cls) """
+        k = len(self.labels)
+        cls_num = self.rng.integers(min_cls, max_cls, n_clients)
+        avg = size / cls_num
+        steps = np.arange(k)[None, :]
+        shares = np.floor((steps + 1) * avg[:, None]).astype(np.int64) - np.floor(steps * avg[:, None]).astype(np.int64)
+        shares[steps >= cls_num[:, None]] = 0
+        counts = np.zeros((n_clients, k), dtype=np.int64)
+        np.put_along_axis(counts, self.rng.random((n_clients, k)).argsort(axis=1), shares, axis=1)
+        return counts
+
+    # extraction
+
+    def extract(self, counts):
+        """ Partition of the (clients, labels) count matrix, every client's samples shuffled """
+        counts = np.asarray(counts, dtype=np.int64)
+        n_clients, k = counts.shape
+        offsets = np.concatenate([[0], np.cumsum(counts.sum(axis=1))])
+        indices = np.empty(offsets[-1], dtype=np.int64)
+        # where label l of client j starts in the flat array
+        starts = offsets[:-1, None] + np.cumsum(counts, axis=1) - counts
+
+        for l in range(k):
+            demand = counts[:, l]
+            total = int(demand.sum())
+            if total == 0:
+                continue
+            size = int(self.label_sizes[l])
+            if size == 0:
+                raise ValueError("no samples of label {} to partition".format(self.labels[l]))
+            if total > size - self.cursors[l]:
+                logging.warning('Insufficient data in label: {}, reusing it'.format(self.labels[l]))
+            positions = (self.cursors[l] + np.arange(total)) % size
+            self.cursors[l] = (self.cursors[l] + total) % size
+            within = np.arange(total) - np.repeat(np.cumsum(demand) - demand, demand)
+            indices[np.repeat(starts[:, l], demand) + within] = self.pools[self.label_starts[l] + positions]
+
+        # shuffle inside every client segment: sort by client + a random fraction
+        client_of = np.repeat(np.arange(n_clients, dtype=np.float64), offsets[1:] - offsets[:-1])
+        indices = indices[np.argsort(client_of + self.rng.random(len(indices)))]
+        return Partition(indices, offsets, counts, self.labels.tolist())
+
+
+def partition_counts(y_train, partition):
+    """ (clients, labels) class counts of an existing {client: indexes} map in one bincount pass """
+    y_train = np.asarray(y_train)
+    labels = np.sort(np.unique(y_train))
+    clients = sorted(partition.keys())
+    sizes = np.asarray([len(partition[j]) for j in clients], dtype=np.int64)
+    flat = np.concatenate([np.asarray(partition[j], dtype=np.int64) for j in clients]) \
+        if clients else np.zeros(0, dtype=np.int64)
+    rows = np.repeat(np.arange(len(clients)), sizes)
+    columns = np.searchsorted(labels, y_train[flat])
+    counts = np.bincount(rows * len(labels) + columns, minlength=len(clients) * len(labels))
+    return clients, labels, counts.reshape(len(clients), len(labels))
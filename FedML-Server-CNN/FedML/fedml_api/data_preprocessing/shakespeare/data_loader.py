@@ -7,6 +7,7 @@ import torch
 from torch.utils.data import Dataset
 
 from .language_utils import word_to_indices, VOCAB_SIZE, letter_to_index
+from ..leaf_shards import open_shards
 
 
 def read_data(train_data_dir, test_data_dir):
@@ -87,6 +88,11 @@ def batch_data(data, batch_size):
 
 
 def load_partition_data_shakespeare(batch_size,dataset_dir):
+    # pre-tokenized shards written by leaf_shards.py, if any
+    shards = open_shards(dataset_dir)
+    if shards is not None:
+        return shards.partition(batch_size, VOCAB_SIZE)
+
     train_path = dataset_dir+"/train"
     test_path = dataset_dir+"/test"
     users, groups, train_data, test_data = read_data(train_path, test_path)
@@ -2,6 +2,8 @@ import h5py
 
 import torch.utils.data as data
 
+from ..h5_pool import get_h5_file, client_blocks
+
 class StackOverflowDataset(data.Dataset):
     """StackOverflow dataset"""
 
@@ -30,6 +32,7 @@ class StackOverflowDataset(data.Dataset):
         if preprocess:
             self.input_fn = preprocess["input"]
             self.target_fn = preprocess["target"]
+        self._len = None
 
     def get_client_id_list(self):
         if self.datast == "train":
@@ -47,21 +50,33 @@ class StackOverflowDataset(data.Dataset):
 
 
     def __len__(self):
-        with h5py.File(self.h5_path, 'r') as h5_file:
-            return len(h5_file[self._EXAMPLE][self.client_id][self._TAGS][()])
+        # the shape only, no data is read
+        if self._len is None:
+            self._len = get_h5_file(self.h5_path)[self._EXAMPLE][self.client_id][self._TAGS].shape[0]
+        return self._len
 
     def __getitem__(self, idx):
-        with h5py.File(self.h5_path, 'r') as h5_file:
-            if idx > self.__len__():
-                return None
-            raw_token = h5_file[self._EXAMPLE][self.client_id][self._TOKENS][()][idx].decode('utf8')
-            raw_title = h5_file[self._EXAMPLE][self.client_id][self._TITLE][()][idx].decode('utf8')
-            sample = ' '.join([raw_token, raw_title])
-            tag = h5_file[self._EXAMPLE][self.client_id][self._TAGS][()][idx].decode('utf8')
+        if idx > self.__len__():
+            return None
+        samples, tags = self._block()
+        sample, tag = samples[idx], tags[idx]
+        if self.input_fn:
+            sample = self.input_fn(sample)
+        if self.target_fn:
+            tag = self.target_fn(tag)
+        return (sample, tag)
 
-            if self.input_fn:
-                sample = self.input_fn(sample)
-            if self.target_fn:
-                tag = self.target_fn(tag)
+    def _block(self):
+        return client_blocks().get((self.h5_path, self.client_id), self._load_block)
 
-        return (sample, tag)
\ No newline at end of file
+    def _load_block(self):
+        """
+            the decoded "tokens title" strings and tags of the client, read once;
+            the bag of words vectors are vocabulary sized, so they are built per sample
+        """
+        client = get_h5_file(self.h5_path)[self._EXAMPLE][self.client_id]
+        tokens, titles, tags = client[self._TOKENS][()], client[self._TITLE][()], client[self._TAGS][()]
+        samples = [' '.join([token.decode('utf8'), title.decode('utf8')]) for token, title in zip(tokens, titles)]
+        tags = [tag.decode('utf8') for tag in tags]
+        nbytes = sum(len(sample) for sample in samples) + sum(len(tag) for tag in tags)
+        return (samples, tags), nbytes
\ No newline at end of file
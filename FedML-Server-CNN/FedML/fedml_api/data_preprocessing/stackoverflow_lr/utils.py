@@ -117,10 +117,10 @@ def preprocess_input(sentence, data_dir):
             return len(word_dict)
 
     def to_bag_of_words(sentence):
+        # token counts / number of tokens, the mean of the one-hot rows without building them
         tokens = [word_to_id(token) for token in sentence]
-        onehot = np.zeros((len(tokens), vocab_size + 1))
-        onehot[np.arange(len(tokens)), tokens] = 1
-        return np.mean(onehot, axis=0, dtype=np.float32)[:vocab_size]
+        counts = np.bincount(tokens, minlength=vocab_size + 1)
+        return (counts[:vocab_size] / len(tokens)).astype(np.float32)
 
     return to_bag_of_words(sentence)
 
@@ -139,9 +139,7 @@ def preprocess_target(tag, data_dir):
 
     def to_bag_of_words(tag):
         tag = [tag_to_id(t) for t in tag]
-        onehot = np.zeros((len(tag), tag_size + 1))
-        onehot[np.arange(len(tag)), tag] = 1
-        return np.sum(onehot, axis=0, dtype=np.float32)[:tag_size]
+        return np.bincount(tag, minlength=tag_size + 1)[:tag_size].astype(np.float32)
 
     return to_bag_of_words(tag)
 
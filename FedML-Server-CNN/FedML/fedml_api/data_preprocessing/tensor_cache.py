@@ -0,0 +1,233 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import torch
+import torch.utils.data as data
+import torchvision.transforms as transforms
+
+from .MNIST.data_loader import load_mnist_data, _data_transforms_mnist
+from .FashionMNIST.data_loader import load_fashionmnist_data, _data_transforms_fashionmnist
+from .cifar10.data_loader import load_cifar10_data, _data_transforms_cifar10
+
+# dataset -> (raw data loader, transforms)
+DATASETS = {
+    "mnist": (load_mnist_data, _data_transforms_mnist),
+    "fashionmnist": (load_fashionmnist_data, _data_transforms_fashionmnist),
+    "cifar10": (load_cifar10_data, _data_transforms_cifar10),
+}
+
+# per-sample transforms that are replaced by the vectorized normalization
+_DETERMINISTIC = (transforms.ToPILImage, transforms.ToTensor, transforms.Normalize)
+
+
+def _normalize(transform):
+    """ (mean, std) of the Normalize of a Compose """
+    for t in transform.transforms:
+        if isinstance(t, transforms.Normalize):
+            return t.mean, t.std
+    return [0.0], [1.0]
+
+
+class BatchAugmentation(object):
+    """
+        The random transforms of a train pipeline applied to a whole batch of
+        normalized (B, C, H, W) tensors: RandomCrop with zero padding (the
+        padding is the normalized value of a black pixel, as when cropping the
+        PIL image) and RandomHorizontalFlip, each with a per-sample draw.
+    """
+
+    def __init__(self, transform, mean, std):
+        self.padding = 0
+        self.flip_p = 0.0
+        for t in transform.transforms:
+            if isinstance(t, transforms.RandomCrop):
+                padding = t.padding if isinstance(t.padding, int) else t.padding[0]
+                self.padding = padding or 0
+            elif isinstance(t, transforms.RandomHorizontalFlip):
+                self.flip_p = t.p
+            elif not isinstance(t, _DETERMINISTIC):
+                raise ValueError("{} has no batch-wise implementation".format(type(t).__name__))
+        self.fill = (-torch.tensor(mean, dtype=torch.float32) / torch.tensor(std, dtype=torch.float32)).view(-1, 1, 1)
+
+    def enabled(self):
+        return self.padding > 0 or self.flip_p > 0
+
+    def __call__(self, x):
+        if self.padding > 0:
+            x = self._random_crop(x)
+        if self.flip_p > 0:
+            flip = torch.rand(x.shape[0]) < self.flip_p
+            x = torch.where(flip.view(-1, 1, 1, 1), x.flip(3), x)
+        return x
+
+    def _random_crop(self, x):
+        b, c, h, w = x.shape
+        p = self.padding
+        padded = self.fill.to(x.dtype).expand(c, h + 2 * p, w + 2 * p).repeat(b, 1, 1, 1)
+        padded[:, :, p:p + h, p:p + w] = x
+        top = torch.randint(0, 2 * p + 1, (b,))
+        left = torch.randint(0, 2 * p + 1, (b,))
+        rows = (top[:, None] + torch.arange(h)[None, :])[:, None, :, None].expand(b, c, h, w + 2 * p)
+        padded = padded.gather(2, rows)
+        cols = (left[:, None] + torch.arange(w)[None, :])[:, None, None, :].expand(b, c, h, w)
+        return padded.gather(3, cols)
+
+
+class PretransformedDataset(data.Dataset):
+    """
+        A dataset whose deterministic transforms (ToTensor + Normalize) have
+        been applied once to the whole array: x is a (N, C, H, W) float32 or
+        float16 tensor, y the int64 labels, indices an optional index view.
+
+        dataset[list of indexes] returns a whole (x, y) batch by index slicing,
+        as batch_loader() requests it; single indexes work as usual. Batches
+        are float32, with the batch augmentation applied if there is one.
+    """
+
+    def __init__(self, x, y, indices=None, augmentation=None):
+        self.x = x
+        self.y = y
+        self.indices = indices
+        self.augmentation = augmentation
+
+    def subset(self, indices):
+        """ an index view of the same storage """
+        indices = torch.as_tensor(np.asarray(indices), dtype=torch.long)
+        if self.indices is not None:
+            indices = self.indices[indices]
+        return PretransformedDataset(self.x, self.y, indices, self.augmentation)
+
+    def __len__(self):
+        return len(self.y) if self.indices is None else len(self.indices)
+
+    def __getitem__(self, index):
+        single = isinstance(index, (int, np.integer))
+        rows = torch.as_tensor([index] if single else index, dtype=torch.long)
+        if self.indices is not None:
+            rows = self.indices[rows]
+        x = self.x[rows].float()
+        if self.augmentation is not None:
+            x = self.augmentation(x)
+        y = self.y[rows]
+        if single:
+            return x[0], y[0]
+        return x, y
+
+
+def batch_loader(dataset, batch_size, shuffle, drop_last):
+    """ a DataLoader that fetches whole batches from a PretransformedDataset, no per-item collation """
+    sampler = data.RandomSampler(dataset) if shuffle else data.SequentialSampler(dataset)
+    return data.DataLoader(dataset, sampler=data.BatchSampler(sampler, batch_size, drop_last), batch_size=None)
+
+
+class TensorCache(object):
+    """
+        Tensor-native datasets for mnist, fashionmnist and cifar10.
+
+        The raw uint8 images are normalized once per dataset and split, in one
+        vectorized op, instead of ToPILImage -> ToTensor -> Normalize per sample
+        and epoch, and stored as float32 or float16 (half the memory, batches
+        are converted back to float32). All clients share the one tensor
+        through index views. With cache_dir, the normalized arrays are also
+        written as .npy files and memory-mapped on later runs.
+
+        Random transforms of the train pipeline run batch-wise (see
+        BatchAugmentation) unless augment is off.
+    """
+
+    STORAGES = ("float32", "float16")
+
+    def __init__(self, storage="float32", cache_dir=None, augment=True):
+        if storage not in self.STORAGES:
+            raise ValueError("unknown storage: {} (expected one of {})".format(storage, ", ".join(self.STORAGES)))
+        self.storage = storage
+        self.cache_dir = cache_dir
+        self.augment = augment
+        self._datasets = {}
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_args(cls, args):
+        """ None unless args.pretransformed is set """
+        if not getattr(args, "pretransformed", 0):
+            return None
+        return cls(storage=getattr(args, "pretransformed_storage", "float32"),
+                   cache_dir=getattr(args, "pretransformed_dir", None) or None,
+                   augment=bool(getattr(args, "pretransformed_augment", 1)))
+
+    @staticmethod
+    def supports(dataset):
+        return dataset in DATASETS
+
+    def datasets(self, dataset, datadir):
+        """ the full (train, test) PretransformedDatasets of dataset """
+        key = (dataset, os.path.abspath(datadir))
+        if key not in self._datasets:
+            load_data, data_transforms = DATASETS[dataset]
+            train_transform, test_transform = data_transforms()
+            mean, std = _normalize(test_transform)
+            raw = None
+            splits = []
+            for split, transform in (("train", train_transform), ("test", test_transform)):
+                x, y = self._load(dataset, datadir, split, mean, std)
+                if x is None:
+                    if raw is None:
+                        raw = load_data(datadir)
+                    images, labels = raw[:2] if split == "train" else raw[2:]
+                    x, y = self._store(dataset, datadir, split, mean, std, self._transform(images, mean, std),
+                                       np.asarray(labels))
+                augmentation = None
+                if split == "train" and self.augment:
+                    augmentation = BatchAugmentation(transform, mean, std)
+                    augmentation = augmentation if augmentation.enabled() else None
+                splits.append(PretransformedDataset(x, y, augmentation=augmentation))
+            self._datasets[key] = tuple(splits)
+        return self._datasets[key]
+
+    def get_dataloader(self, dataset, datadir, train_bs, test_bs, dataidxs=None):
+        """ as get_dataloader in load_data, with the same shuffle / drop_last settings """
+        train_ds, test_ds = self.datasets(dataset, datadir)
+        if dataidxs is not None:
+            train_ds = train_ds.subset(dataidxs)
+        return batch_loader(train_ds, train_bs, True, True), batch_loader(test_ds, test_bs, False, True)
+
+    def _transform(self, images, mean, std):
+        """ uint8 (N, H, W) or (N, H, W, C) -> normalized (N, C, H, W), as ToTensor + Normalize """
+        x = torch.as_tensor(np.asarray(images))
+        x = x.unsqueeze(1) if x.dim() == 3 else x.permute(0, 3, 1, 2)
+        x = x.to(torch.float32).div_(255.0)
+        x.sub_(torch.tensor(mean, dtype=torch.float32).view(1, -1, 1, 1))
+        x.div_(torch.tensor(std, dtype=torch.float32).view(1, -1, 1, 1))
+        return x.contiguous()
+
+    def _name(self, dataset, datadir, split, mean, std):
+        config = [dataset, os.path.abspath(datadir), split, list(mean), list(std), self.storage]
+        return hashlib.sha1(json.dumps(config).encode('utf-8')).hexdigest()
+
+    def _store(self, dataset, datadir, split, mean, std, x, y):
+        x = x.to(getattr(torch, self.storage))
+        y = torch.as_tensor(y, dtype=torch.long)
+        if self.cache_dir is None:
+            return x, y
+        base = os.path.join(self.cache_dir, self._name(dataset, datadir, split, mean, std))
+        for path, array in ((base + ".x.npy", x.numpy()), (base + ".y.npy", y.numpy())):
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+        logging.info("tensor cache: stored %s %s (%d samples)" % (dataset, split, len(y)))
+        return self._load(dataset, datadir, split, mean, std)
+
+    def _load(self, dataset, datadir, split, mean, std):
+        if self.cache_dir is None:
+            return None, None
+        base = os.path.join(self.cache_dir, self._name(dataset, datadir, split, mean, std))
+        if not os.path.exists(base + ".y.npy"):
+            return None, None
+        # copy-on-write memory map, pages are read as batches touch them
+        x = torch.from_numpy(np.load(base + ".x.npy", mmap_mode="c"))
+        y = torch.from_numpy(np.load(base + ".y.npy"))
+        return x, y
@@ -0,0 +1,191 @@
+"""
+    Bytes per round and accuracy of the delta update codec against full model uploads.
+
+    The BaselineCNN trainers and aggregator are run in one process for a few
+    rounds; every upload and broadcast is put into a Message and encoded with the
+    wire format to count the bytes that would go over MQTT. Each variant starts
+    from the same initial model and data.
+
+    MNIST is read from --data_dir/MNIST and HAR from --data_dir/HAR (see
+    data/MNIST and data/HAR); with --synthetic, random class-separable data of
+    the same shapes is used instead, so the codec can be compared without the
+    datasets.
+
+    usage (from the FedML directory):
+        python -m fedml_api.distributed.BaselineCNN.benchmark_update_codec --dataset har --rounds 10
+        python -m fedml_api.distributed.BaselineCNN.benchmark_update_codec --dataset mnist --synthetic
+"""
+import argparse
+import copy
+import logging
+
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from fedml_core.distributed.communication.message import Message
+
+from fedml_api.model.Baseline.HAR import HAR_Net, FEATURE_DIM, NUM_CLASSES
+from fedml_api.model.Baseline.MNIST import MNIST_Net
+from fedml_api.distributed.BaselineCNN.cnn_ModelTrainer import MyModelTrainer
+from fedml_api.distributed.BaselineCNN.cnn_Trainer import BaseCNN_Trainer
+from fedml_api.distributed.BaselineCNN.cnnAggregator import BaselineCNNAggregator
+from fedml_api.distributed.BaselineCNN.message_define import MyMessage
+from fedml_api.distributed.BaselineCNN.update_codec import is_encoded_update
+from fedml_api.distributed.BaselineCNN.utils import transform_list_to_tensor
+
+# name, delta_updates, quantize_bits, topk_ratio
+VARIANTS = [
+    ("dense", 0, 0, 0.0),
+    ("delta fp32", 1, 0, 0.0),
+    ("delta 8 bit", 1, 8, 0.0),
+    ("delta 4 bit", 1, 4, 0.0),
+    ("delta 8 bit top 10%", 1, 8, 0.1),
+    ("delta 4 bit top 1%", 1, 4, 0.01),
+]
+
+
+def synthetic_data(dataset, client_num, samples_per_client, test_samples, batch_size, noise, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    if dataset == "mnist":
+        shape, class_num, label_offset = (1, 28, 28), 10, 0
+    else:
+        shape, class_num, label_offset = (FEATURE_DIM,), NUM_CLASSES, 1
+    centers = torch.randn((class_num,) + shape, generator=generator)
+
+    def make(n):
+        y = torch.randint(0, class_num, (n,), generator=generator)
+        x = centers[y] + noise * torch.randn((n,) + shape, generator=generator)
+        return x, y + label_offset
+
+    train_local = {}
+    train_num = {}
+    for client_idx in range(client_num):
+        x, y = make(samples_per_client)
+        train_local[client_idx] = DataLoader(TensorDataset(x, y), batch_size=batch_size, shuffle=True)
+        train_num[client_idx] = samples_per_client
+    x, y = make(test_samples)
+    test_global = DataLoader(TensorDataset(x, y), batch_size=batch_size, drop_last=True)
+    return train_local, train_num, test_global
+
+
+def real_data(args):
+    from fedml_api.data_preprocessing.load_data import load_partition_data, load_partition_data_HAR
+    if args.dataset == "har":
+        _, _, _, test_global, train_num, train_local, _, _ = \
+            load_partition_data_HAR(args.batch_size, args.data_dir + "/HAR")
+    else:
+        _, _, _, test_global, train_num, train_local, _, _ = \
+            load_partition_data(args.dataset, args.data_dir + "/MNIST", "iid", "uniform", 0.5, 0, 1, 10,
+                                args.client_num, args.batch_size, args.samples_per_client)
+    clients = sorted(train_local.keys())[:args.client_num]
+    return {i: train_local[c] for i, c in enumerate(clients)}, \
+           {i: train_num[c] for i, c in enumerate(clients)}, test_global
+
+
+def payload_size(msg_type, key, params, wire_format):
+    message = Message(msg_type, 0, 1)
+    message.add_params(key, params)
+    payload = message.to_payload(wire_format)
+    received = Message()
+    received.init_from_payload(payload.encode('utf-8') if isinstance(payload, str) else payload)
+    return len(payload), received.get(key)
+
+
+def run_variant(args, variant, initial_model, data):
+    name, delta_updates, bits, topk_ratio = variant
+    train_local, train_num, test_global = data
+    run_args = copy.copy(args)
+    run_args.delta_updates = delta_updates
+    run_args.delta_quantize_bits = bits
+    run_args.delta_topk_ratio = topk_ratio
+    device = torch.device("cpu")
+
+    server_trainer = MyModelTrainer(initial_model, run_args, device)
+    aggregator = BaselineCNNAggregator(run_args, None, test_global, 0, train_local, None, train_num,
+                                       args.client_num, device, server_trainer)
+    trainers = [BaseCNN_Trainer(i, train_local, train_num, {i: None for i in train_local}, 0, device, run_args,
+                                MyModelTrainer(initial_model, run_args, device))
+                for i in range(args.client_num)]
+    # the init message: every client starts from the server model
+    aggregator.set_delta_reference(aggregator.get_global_model_params())
+    for trainer in trainers:
+        trainer.update_model(copy.deepcopy(aggregator.get_global_model_params()))
+
+    upload_bytes, download_bytes = [], []
+    for round_idx in range(args.rounds):
+        up = 0
+        for client_idx, trainer in enumerate(trainers):
+            cnn_params, local_sample_num = trainer.train()
+            key = MyMessage.MSG_ARG_KEY_MODEL_UPDATE if is_encoded_update(cnn_params) \
+                else MyMessage.MSG_ARG_KEY_MODEL_PARAMS
+            nbytes, received = payload_size(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER, key, cnn_params,
+                                            args.wire_format)
+            if key == MyMessage.MSG_ARG_KEY_MODEL_PARAMS:
+                received = transform_list_to_tensor(received)
+            aggregator.add_local_trained_result(client_idx, received, local_sample_num)
+            up += nbytes
+        aggregator.check_whether_all_receive()
+        aggregator.aggregate()
+
+        down = 0
+        update = aggregator.get_global_model_update()
+        for trainer in trainers:
+            if update is not None:
+                nbytes, received = payload_size(MyMessage.MSG_TYPE_S2C_SYNC_MODEL_TO_CLIENT,
+                                                MyMessage.MSG_ARG_KEY_MODEL_UPDATE, update, args.wire_format)
+                trainer.apply_model_update(received)
+            else:
+                nbytes, received = payload_size(MyMessage.MSG_TYPE_S2C_SYNC_MODEL_TO_CLIENT,
+                                                MyMessage.MSG_ARG_KEY_MODEL_PARAMS,
+                                                aggregator.get_global_model_params(), args.wire_format)
+                trainer.update_model(transform_list_to_tensor(received))
+            down += nbytes
+        upload_bytes.append(up)
+        download_bytes.append(down)
+
+    _, acc = server_trainer.test(test_global, run_args, list(range(len(test_global))))
+    return sum(upload_bytes) / len(upload_bytes), sum(download_bytes) / len(download_bytes), acc
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, default='har', choices=['har', 'mnist'])
+    parser.add_argument('--data_dir', type=str, default='./data')
+    parser.add_argument('--synthetic', action='store_true', help='use random data of the dataset shapes')
+    parser.add_argument('--noise', type=float, default=14.0, help='noise level of the synthetic data')
+    parser.add_argument('--client_num', type=int, default=4)
+    parser.add_argument('--samples_per_client', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--lr', type=float, default=0.003)
+    parser.add_argument('--wire_format', type=str, default='binary', choices=['binary', 'json'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # fields read by MyModelTrainer
+    args.partition_method = "homo"
+    args.momentum = 0.9
+    args.weight_decay = 0.0
+    args.method = "fedavg"
+    args.flat_params = 0
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.synthetic:
+        data = synthetic_data(args.dataset, args.client_num, args.samples_per_client,
+                              10 * args.batch_size, args.batch_size, args.noise, args.seed)
+    else:
+        data = real_data(args)
+
+    torch.manual_seed(args.seed)
+    initial_model = MNIST_Net() if args.dataset == "mnist" else HAR_Net()
+
+    print("{:<22} {:>16} {:>16} {:>10}".format("variant", "upload B/round", "download B/round", "accuracy"))
+    for variant in VARIANTS:
+        torch.manual_seed(args.seed)
+        up, down, acc = run_variant(args, variant, initial_model, data)
+        print("{:<22} {:>16,.0f} {:>16,.0f} {:>10.4f}".format(variant[0], up, down, acc))
+
+
+if __name__ == '__main__':
+    main()
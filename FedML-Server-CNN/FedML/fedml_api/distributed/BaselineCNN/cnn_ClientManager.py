@@ -16,7 +16,7 @@ from .message_define import MyMessage
 
 
 from .utils import transform_list_to_tensor
-from .utils import transform_tensor_to_list
+from .update_codec import is_encoded_update
 
 
 class BaseCNNClientManager(ClientManager):
@@ -25,6 +25,8 @@ class BaseCNNClientManager(ClientManager):
         self.trainer = trainer
         self.num_rounds = args.comm_round
         self.round_idx = 0
+        # version of the global model being trained from, echoed with the upload
+        self.model_version = 0
 
     def run(self):
         super().run()
@@ -42,6 +44,7 @@ class BaseCNNClientManager(ClientManager):
         global_cnn_params = transform_list_to_tensor(global_cnn_params)
 
         client_index = msg_params.get(MyMessage.MSG_ARG_KEY_CLIENT_INDEX)
+        self.model_version = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_VERSION) or 0
 
         self.trainer.update_model(global_cnn_params)
 
@@ -56,12 +59,16 @@ class BaseCNNClientManager(ClientManager):
 
     def handle_message_receive_model_from_server(self, msg_params):
         logging.info("handle_message_receive_model_from_server.")
-        global_cnn_params = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_PARAMS)
         client_index = msg_params.get(MyMessage.MSG_ARG_KEY_CLIENT_INDEX)
-        
-        global_cnn_params = transform_list_to_tensor(global_cnn_params)
+        self.model_version = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_VERSION) or 0
 
-        self.trainer.update_model(global_cnn_params)
+        model_update = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_UPDATE)
+        if model_update is not None:
+            self.trainer.apply_model_update(model_update)
+        else:
+            global_cnn_params = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_PARAMS)
+            global_cnn_params = transform_list_to_tensor(global_cnn_params)
+            self.trainer.update_model(global_cnn_params)
 
 
         self.round_idx += 1
@@ -70,12 +77,13 @@ class BaseCNNClientManager(ClientManager):
             self.finish()
 
     def send_model_to_server(self, receive_id, cnn_params, local_sample_num):
-        
-        cnn_params = transform_tensor_to_list(cnn_params)
-
         message = Message(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER, self.get_sender_id(), receive_id)
-        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, cnn_params)
+        if is_encoded_update(cnn_params):
+            message.add_params(MyMessage.MSG_ARG_KEY_MODEL_UPDATE, cnn_params)
+        else:
+            message.add_params(MyMessage.MSG_ARG_KEY_MODEL_PARAMS, cnn_params)
         message.add_params(MyMessage.MSG_ARG_KEY_NUM_SAMPLES, local_sample_num)
+        message.add_params(MyMessage.MSG_ARG_KEY_MODEL_VERSION, self.model_version)
         self.send_message(message)
 
     def __train(self):
@@ -0,0 +1,275 @@
+import logging
+import math
+
+import torch
+
+try:
+    from fedml_core.trainer.flat_params import FlatParamLayout
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamLayout
+
+CODEC_NAME = "delta"
+
+
+def is_encoded_update(model_params):
+    return isinstance(model_params, dict) and model_params.get("codec") == CODEC_NAME
+
+
+def flatten_params(model_params, layout=None):
+    """ (flat float32 tensor, layout), layout is None for a flat buffer without a known layout """
+    if torch.is_tensor(model_params):
+        return model_params.detach().reshape(-1).float(), layout
+    if layout is None:
+        layout = FlatParamLayout.from_state_dict(model_params)
+    return layout.flatten(model_params), layout
+
+
+def unflatten_params(flat, layout, as_flat):
+    """ a copy of flat, rebuilt into a state_dict unless the model is exchanged as a flat buffer """
+    if as_flat:
+        return flat.clone()
+    return layout.unflatten(flat.clone())
+
+
+def segment_offsets(layout, numel):
+    """ tensor boundaries in the flat buffer, quantization scales are per segment """
+    if layout is None:
+        return torch.tensor([0, numel], dtype=torch.int64)
+    offsets = [offset for offset, _, _, _ in layout.index.values()] + [layout.numel]
+    return torch.tensor(offsets, dtype=torch.int64)
+
+
+class UpdateCodec(object):
+    """
+        Lossy encoding of a flat model delta.
+
+        quantize_bits: 0 (float32), 8 or 4; values are rounded to signed integers
+                       with one float32 scale per tensor (absmax / (2^(bits-1) - 1)),
+                       4 bit values are packed two per byte.
+        topk_ratio:    0 for dense, otherwise only the ceil(topk_ratio * numel) entries
+                       with the largest magnitude are kept, with int32 indices.
+
+        The encoding is a dict of tensors and scalars, so it goes through either
+        message wire format:
+            {"codec": "delta", "numel", "bits", "offsets", "scales", "indices", "values"}
+    """
+
+    def __init__(self, quantize_bits=0, topk_ratio=0.0):
+        if quantize_bits not in (0, 4, 8):
+            raise ValueError("quantize_bits must be 0, 4 or 8, got {}".format(quantize_bits))
+        if not 0.0 <= topk_ratio <= 1.0:
+            raise ValueError("topk_ratio must be in [0, 1], got {}".format(topk_ratio))
+        self.quantize_bits = quantize_bits
+        self.topk_ratio = topk_ratio
+
+    @classmethod
+    def from_args(cls, args):
+        """ None when the args do not ask for delta updates """
+        if not getattr(args, "delta_updates", 0):
+            return None
+        return cls(getattr(args, "delta_quantize_bits", 0), getattr(args, "delta_topk_ratio", 0.0))
+
+    def encode(self, delta, offsets):
+        numel = delta.numel()
+        encoded = {"codec": CODEC_NAME, "numel": numel, "bits": self.quantize_bits, "offsets": offsets}
+
+        indices = None
+        values = delta
+        if 0.0 < self.topk_ratio < 1.0:
+            k = max(1, int(math.ceil(self.topk_ratio * numel)))
+            indices = torch.topk(delta.abs(), k, sorted=False).indices
+            indices, _ = torch.sort(indices)
+            values = delta[indices]
+            encoded["indices"] = indices.to(torch.int32)
+
+        if self.quantize_bits:
+            qmax = 2 ** (self.quantize_bits - 1) - 1
+            scales = torch.empty(len(offsets) - 1, dtype=torch.float32)
+            for i in range(len(offsets) - 1):
+                segment = delta[int(offsets[i]):int(offsets[i + 1])]
+                absmax = segment.abs().max().item() if segment.numel() else 0.0
+                scales[i] = absmax / qmax if absmax > 0 else 1.0
+            element_scales = self._element_scales(scales, offsets, indices, values.numel())
+            q = torch.clamp(torch.round(values / element_scales), -qmax, qmax).to(torch.int8)
+            encoded["scales"] = scales
+            encoded["values"] = _pack_int4(q) if self.quantize_bits == 4 else q
+        else:
+            encoded["values"] = values.to(torch.float32)
+        return encoded
+
+    @staticmethod
+    def decode_into(out, encoded, alpha=1.0):
+        """ out += alpha * delta, without building the dense delta for sparse updates """
+        numel = int(encoded["numel"])
+        if out.numel() != numel:
+            raise ValueError("update has %d entries, the model has %d" % (numel, out.numel()))
+        bits = int(encoded["bits"])
+        offsets = torch.as_tensor(encoded["offsets"], dtype=torch.int64)
+        indices = encoded.get("indices")
+        if indices is not None:
+            indices = torch.as_tensor(indices).to(torch.int64)
+        count = numel if indices is None else indices.numel()
+
+        if bits == 4:
+            values = _unpack_int4(torch.as_tensor(encoded["values"], dtype=torch.uint8), count).to(out.dtype)
+        elif bits == 8:
+            values = torch.as_tensor(encoded["values"], dtype=torch.int8).to(out.dtype)
+        else:
+            values = torch.as_tensor(encoded["values"], dtype=torch.float32).to(out.dtype)
+
+        if bits:
+            scales = torch.as_tensor(encoded["scales"], dtype=torch.float32)
+            if indices is None:
+                # dense: one scale per segment, applied slice by slice
+                for i in range(len(offsets) - 1):
+                    start, end = int(offsets[i]), int(offsets[i + 1])
+                    out[start:end].add_(values[start:end], alpha=alpha * scales[i].item())
+                return out
+            values = values * UpdateCodec._element_scales(scales, offsets, indices, count)
+
+        if indices is None:
+            out.add_(values, alpha=alpha)
+        else:
+            out.index_add_(0, indices, values * alpha)
+        return out
+
+    @staticmethod
+    def decode(encoded):
+        return UpdateCodec.decode_into(torch.zeros(int(encoded["numel"]), dtype=torch.float32), encoded)
+
+    @staticmethod
+    def encoded_nbytes(encoded):
+        return sum(v.numel() * v.element_size() for v in encoded.values() if torch.is_tensor(v))
+
+    @staticmethod
+    def _element_scales(scales, offsets, indices, count):
+        if indices is None:
+            sizes = offsets[1:] - offsets[:-1]
+            return torch.repeat_interleave(scales, sizes)
+        segment = torch.searchsorted(offsets, indices, right=True) - 1
+        return scales[segment]
+
+
+class DeltaUpdateEncoder(object):
+    """
+        Client side state of the delta update codec.
+
+        reference is the last global model received from the server; uploads are
+        the encoded difference between the locally trained model and it. With
+        error feedback the part of the delta lost to quantization / sparsification
+        is kept in residual and added to the next upload.
+    """
+
+    def __init__(self, codec, error_feedback=True):
+        self.codec = codec
+        self.error_feedback = error_feedback
+        self.reference = None
+        self.layout = None
+        self.as_flat = False
+        self.residual = None
+
+    def has_reference(self):
+        return self.reference is not None
+
+    def set_reference(self, model_params, layout=None):
+        self.as_flat = torch.is_tensor(model_params)
+        self.reference, self.layout = flatten_params(model_params, layout)
+        self.reference = self.reference.clone()
+
+    def apply_update(self, encoded):
+        """ applies a server delta to the reference, returns the new global model """
+        self.codec.decode_into(self.reference, encoded)
+        return unflatten_params(self.reference, self.layout, self.as_flat)
+
+    def encode(self, model_params):
+        flat, _ = flatten_params(model_params, self.layout)
+        delta = flat - self.reference
+        if self.error_feedback and self.residual is not None:
+            delta += self.residual
+        encoded = self.codec.encode(delta, segment_offsets(self.layout, delta.numel()))
+        if self.error_feedback:
+            self.residual = delta - self.codec.decode(encoded)
+        return encoded
+
+
+class DeltaUpdateAggregator(object):
+    """
+        Server side of the delta update codec.
+
+        synced is the global model as the clients hold it. Client deltas are
+        folded into a flat float32 accumulator straight from their encoding, the
+        new global model is synced + weighted average delta. The broadcast is
+        encoded the same way, against synced, with the server-side residual
+        carried to the next round when error feedback is on.
+    """
+
+    def __init__(self, codec, error_feedback=True):
+        self.codec = codec
+        self.error_feedback = error_feedback
+        self.synced = None
+        self.layout = None
+        self.as_flat = False
+        self.residual = None
+        self.accumulator = None
+        self.total_weight = 0.0
+        self.num_received = 0
+
+    def has_reference(self):
+        return self.synced is not None
+
+    def set_reference(self, model_params, layout=None):
+        self.as_flat = torch.is_tensor(model_params)
+        self.synced, self.layout = flatten_params(model_params, layout)
+        self.synced = self.synced.clone()
+        self.accumulator = torch.zeros_like(self.synced)
+        self.residual = None
+
+    def add(self, model_params, weight):
+        if is_encoded_update(model_params):
+            self.codec.decode_into(self.accumulator, model_params, alpha=weight)
+        else:
+            # a client that missed the last broadcast uploads its full model
+            flat, _ = flatten_params(model_params, self.layout)
+            self.accumulator.add_(flat - self.synced, alpha=weight)
+        self.total_weight += weight
+        self.num_received += 1
+
+    def result(self):
+        """ (encoded broadcast update, new global model in the structure given to set_reference) """
+        if self.total_weight == 0:
+            raise RuntimeError("no client update has been added")
+        delta = self.accumulator / self.total_weight
+        if self.error_feedback and self.residual is not None:
+            delta += self.residual
+        encoded = self.codec.encode(delta, segment_offsets(self.layout, delta.numel()))
+        if self.error_feedback:
+            self.residual = delta - self.codec.decode(encoded)
+        # same operation as DeltaUpdateEncoder.apply_update, so both sides stay bitwise identical
+        self.codec.decode_into(self.synced, encoded)
+        return encoded, unflatten_params(self.synced, self.layout, self.as_flat)
+
+    def reset(self):
+        self.accumulator.zero_()
+        self.total_weight = 0.0
+        self.num_received = 0
+
+
+def _pack_int4(q):
+    """ int8 values in [-7, 7] -> uint8, two values per byte """
+    u = (q.to(torch.int16) + 8).to(torch.uint8)
+    if u.numel() % 2:
+        u = torch.cat([u, torch.zeros(1, dtype=torch.uint8)])
+    u = u.view(-1, 2)
+    return u[:, 0] | (u[:, 1] << 4)
+
+
+def _unpack_int4(packed, count):
+    packed = packed.reshape(-1)
+    u = torch.stack([packed & 0x0F, packed >> 4], dim=1).reshape(-1)[:count]
+    return u.to(torch.int8) - 8
+
+
+def log_update_size(prefix, encoded, dense_numel):
+    nbytes = UpdateCodec.encoded_nbytes(encoded)
+    logging.info("%s: %d bytes, %.1f%% of the dense float32 model" % (
+        prefix, nbytes, 100.0 * nbytes / max(dense_numel * 4, 1)))
@@ -9,9 +9,11 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), "../../../")))
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), "../../../../FedML")))
 try:
     from fedml_core.distributed.communication.message import Message
+    from fedml_core.distributed.server.round_scheduler import RoundScheduler
     from fedml_core.distributed.server.server_manager import ServerManager
 except ImportError:
     from FedML.fedml_core.distributed.communication.message import Message
+    from FedML.fedml_core.distributed.server.round_scheduler import RoundScheduler
     from FedML.fedml_core.distributed.server.server_manager import ServerManager
 
 
@@ -24,6 +26,10 @@ class FedAVGServerManager(ServerManager):
         self.round_num = args.comm_round
         self.round_idx = 0
         self.is_preprocessed = is_preprocessed
+        # rounds with a deadline / quorum / over-selection, see round_scheduler.py
+        self.round_scheduler = RoundScheduler.from_args(args, range(1, size))
+        self.client_indexes = None
+        self.finished = False
 
     def run(self):
         super().run()
@@ -33,8 +39,12 @@ class FedAVGServerManager(ServerManager):
         client_indexes = self.aggregator.client_sampling(self.round_idx, self.args.client_num_in_total,
                                                          self.args.client_num_per_round)
         global_model_params = self.aggregator.get_global_model_params()
-        for process_id in range(1, self.size):
+        receivers = range(1, self.size) if self.round_scheduler is None else self.round_scheduler.select()
+        for process_id in receivers:
             self.send_message_init_config(process_id, global_model_params, client_indexes[process_id - 1])
+        if self.round_scheduler is not None:
+            self.client_indexes = client_indexes
+            self.round_scheduler.start_round(self.round_idx, receivers, self._on_round_deadline)
 
     def register_message_receive_handlers(self):
         self.register_message_receive_handler(MyMessage.MSG_TYPE_C2S_SEND_MODEL_TO_SERVER,
@@ -45,6 +55,10 @@ class FedAVGServerManager(ServerManager):
         model_params = msg_params.get(MyMessage.MSG_ARG_KEY_MODEL_PARAMS)
         local_sample_number = msg_params.get(MyMessage.MSG_ARG_KEY_NUM_SAMPLES)
 
+        if self.round_scheduler is not None:
+            self._handle_scheduled_upload(sender_id, model_params, local_sample_number)
+            return
+
         self.aggregator.add_local_trained_result(sender_id - 1, model_params, local_sample_number)
         b_all_received = self.aggregator.check_whether_all_receive()
         logging.info("round={} b_all_received={}".format(self.round_idx, b_all_received))
@@ -60,29 +74,90 @@ class FedAVGServerManager(ServerManager):
                 self.finish()
                 return
 
-            # Note: args.is_preprocessed is used in the case of dynamic local dataset
-            # args.is_preprocessed indicates local dataset is configured in the beginning
-            # for each time stamp
-            # In our case, we use static dataset, so the client_indexes here is not used
-            # after transmitted back to clients
-            if self.is_preprocessed:
-                # sampling has already been done in data preprocessor
-                client_indexes = [self.round_idx] * self.args.client_num_per_round
-                # print('indexes of clients: ' + str(client_indexes))
-            else:
-                # # sampling clients
-                client_indexes = self.aggregator.client_sampling(self.round_idx,
-                                                                 self.args.client_num_in_total,
-                                                                 self.args.client_num_per_round)
-
-            # print("size = %d" % self.size)
-            if self.args.is_mobile == 1:
-                print("transform_tensor_to_list")
-                global_model_params = transform_tensor_to_list(global_model_params)
-
-            for receiver_id in range(1, self.size):
-                self.send_message_sync_model_to_client(receiver_id, global_model_params,
-                                                       client_indexes[receiver_id - 1])
+            self._send_round_model(global_model_params, range(1, self.size))
+
+    def _send_round_model(self, global_model_params, receivers):
+        # Note: args.is_preprocessed is used in the case of dynamic local dataset
+        # args.is_preprocessed indicates local dataset is configured in the beginning
+        # for each time stamp
+        # In our case, we use static dataset, so the client_indexes here is not used
+        # after transmitted back to clients
+        if self.is_preprocessed:
+            # sampling has already been done in data preprocessor
+            client_indexes = [self.round_idx] * self.args.client_num_per_round
+            # print('indexes of clients: ' + str(client_indexes))
+        else:
+            # # sampling clients
+            client_indexes = self.aggregator.client_sampling(self.round_idx,
+                                                             self.args.client_num_in_total,
+                                                             self.args.client_num_per_round)
+        self.client_indexes = client_indexes
+
+        # print("size = %d" % self.size)
+        if self.args.is_mobile == 1:
+            print("transform_tensor_to_list")
+            global_model_params = transform_tensor_to_list(global_model_params)
+
+        for receiver_id in receivers:
+            self.send_message_sync_model_to_client(receiver_id, global_model_params,
+                                                   client_indexes[receiver_id - 1])
+
+    def _handle_scheduled_upload(self, sender_id, model_params, local_sample_number):
+        with self.round_scheduler.lock:
+            if self.finished:
+                return
+            if not self.round_scheduler.record_upload(sender_id):
+                # a straggler of an earlier round, idle again
+                self._send_to_late_joiners(self.round_scheduler.top_up())
+                return
+            self.aggregator.add_local_trained_result(sender_id - 1, model_params, local_sample_number)
+            logging.info("round={} {} of {} uploads".format(self.round_idx, len(self.round_scheduler.arrived),
+                                                           self.round_scheduler.round_target))
+            if self.round_scheduler.round_complete():
+                self._close_scheduled_round()
+
+    def _close_scheduled_round(self):
+        # round_scheduler.lock is held
+        self.round_scheduler.close_round()
+        # whatever arrived, weighted by its sample numbers
+        global_model_params = self.aggregator.aggregate()
+        self.aggregator.test_on_server_for_all_clients(self.round_idx)
+
+        self.round_idx += 1
+        if self.round_idx == self.round_num:
+            self.finish()
+            return
+
+        receivers = self.round_scheduler.select()
+        self._send_round_model(global_model_params, receivers)
+        self.round_scheduler.start_round(self.round_idx, receivers, self._on_round_deadline)
+
+    def _on_round_deadline(self, round_idx):
+        if self.finished:
+            return
+        if self.round_scheduler.has_quorum():
+            logging.info("round %d deadline: aggregating %d uploads" % (round_idx, len(self.round_scheduler.arrived)))
+            self._close_scheduled_round()
+        else:
+            self._send_to_late_joiners(self.round_scheduler.extend())
+
+    def _send_to_late_joiners(self, receivers):
+        """ workers added to the running round get its model and client indexes """
+        global_model_params = self.aggregator.get_global_model_params()
+        if self.args.is_mobile == 1:
+            global_model_params = transform_tensor_to_list(global_model_params)
+        for receiver_id in receivers:
+            self.send_message_sync_model_to_client(receiver_id, global_model_params,
+                                                   self.client_indexes[receiver_id - 1])
+
+    def finish(self):
+        self.finished = True
+        if self.round_scheduler is not None:
+            self.round_scheduler.cancel()
+            logging.info("client latency: %s" % str(self.round_scheduler.latency_summary()))
+        # the last round's evaluation may still be running in the background
+        self.aggregator.finish_evaluation()
+        super().finish()
 
     def send_message_init_config(self, receive_id, global_model_params, client_index):
         message = Message(MyMessage.MSG_TYPE_S2C_INIT_CONFIG, self.get_sender_id(), receive_id)
@@ -8,7 +8,7 @@ import numpy as np
 from torch import nn
 
 from fedml_api.distributed.fedavg.utils import transform_list_to_tensor
-from fedml_core.robustness.robust_aggregation import RobustAggregator, is_weight_param
+from fedml_core.robustness.batched_robust_aggregation import BatchedRobustAggregator
 
 
 def test(model, device, test_loader, criterion, mode="raw-task", dataset="cifar10", poison_type="fashion"):
@@ -130,7 +130,8 @@ class FedAvgRobustAggregator(object):
         self.sample_num_dict = dict()
         self.flag_client_model_uploaded_dict = dict()
 
-        self.robust_aggregator = RobustAggregator(args)
+        # the uploads go straight into the rows of its (clients x params) matrix
+        self.robust_aggregator = BatchedRobustAggregator.from_args(args)
 
         self.targetted_task_test_loader = targetted_task_test_loader
         self.num_dps_poisoned_dataset = num_dps_poisoned_dataset
@@ -140,6 +141,7 @@ class FedAvgRobustAggregator(object):
         for idx in range(self.worker_num):
             self.flag_client_model_uploaded_dict[idx] = False
         self.model, _ = self.init_model(model)
+        self.robust_aggregator.start_round(self.model.state_dict(), self.worker_num)
 
     def init_model(self, model):
         model_params = model.state_dict()
@@ -151,7 +153,9 @@ class FedAvgRobustAggregator(object):
 
     def add_local_trained_result(self, index, model_params, sample_num):
         logging.info("add_model. index = %d" % index)
-        self.model_dict[index] = model_params
+        if self.args.is_mobile == 1:
+            model_params = transform_list_to_tensor(model_params)
+        self.robust_aggregator.add(index, model_params, sample_num)
         self.sample_num_dict[index] = sample_num
         self.flag_client_model_uploaded_dict[index] = True
 
@@ -165,53 +169,13 @@ class FedAvgRobustAggregator(object):
 
     def aggregate(self):
         start_time = time.time()
-        model_list = []
-        training_num = 0
 
-
-        for idx in range(self.worker_num):
-            if self.args.is_mobile == 1:
-                self.model_dict[idx] = transform_list_to_tensor(self.model_dict[idx])
-
-            # conduct the defense here:
-            local_sample_number, local_model_params = self.sample_num_dict[idx], self.model_dict[idx]
-            
-            if self.robust_aggregator.defense_type in ("norm_diff_clipping", "weak_dp"):
-                clipped_local_state_dict = self.robust_aggregator.norm_diff_clipping(
-                                                                    local_model_params,
-                                                                    self.model.state_dict())
-            else:
-                raise NotImplementedError("Non-supported Defense type ... ")
-            model_list.append((local_sample_number, clipped_local_state_dict))
-
-            training_num += self.sample_num_dict[idx]
-
-        logging.info("len of self.model_dict[idx] = " + str(len(self.model_dict)))
-
-
-        # logging.info("################aggregate: %d" % len(model_list))
-        (num0, averaged_params) = model_list[0]
-
-        for k in averaged_params.keys():
-            for i in range(0, len(model_list)):
-                local_sample_number, local_model_params = model_list[i]
-                w = local_sample_number / training_num
-
-                local_layer_update = local_model_params[k]
-
-                if self.robust_aggregator.defense_type == "weak_dp":
-                    if is_weight_param(k):
-                        local_layer_update = self.robust_aggregator.add_noise(
-                                                    local_layer_update,
-                                                    self.device)
-
-                if i == 0:
-                    averaged_params[k] = local_model_params[k] * w
-                else:
-                    averaged_params[k] += local_model_params[k] * w
+        # clipping, noise and the defense over the whole round at once
+        averaged_params = self.robust_aggregator.aggregate()
 
         # update the global model which is cached at the server side
         self.model.load_state_dict(averaged_params)
+        self.robust_aggregator.start_round(self.model.state_dict(), self.worker_num)
 
         end_time = time.time()
         logging.info("aggregate time cost: %d" % (end_time - start_time))
@@ -44,6 +44,9 @@ class GKTServerMananger(ServerManager):
             # start the next round
             self.round_idx += 1
             if self.round_idx == self.round_num:
+                if self.server_trainer.feature_store is not None:
+                    # removes the memory-mapped features of a temporary spill directory
+                    self.server_trainer.feature_store.close()
                 self.finish()
                 return
 
@@ -8,6 +8,7 @@ from torch import nn, optim
 from torch.optim.lr_scheduler import ReduceLROnPlateau
 
 from fedml_api.distributed.fedgkt import utils
+from fedml_api.distributed.fedgkt.feature_store import FeatureStore
 
 
 class GKTServerTrainer(object):
@@ -65,6 +66,11 @@ class GKTServerTrainer(object):
         self.client_extracted_feauture_dict_test = dict()
         self.client_labels_dict_test = dict()
 
+        # columnar store of the uploads (--feature_store), None keeps the per-batch dicts above
+        self.feature_store = FeatureStore.from_args(args)
+        self.server_batch_size = getattr(args, "server_batch_size", 0) or args.batch_size
+        self.feature_prefetch = getattr(args, "feature_prefetch", 2)
+
         self.model_dict = dict()
         self.sample_num_dict = dict()
         self.train_acc_dict = dict()
@@ -79,11 +85,15 @@ class GKTServerTrainer(object):
     def add_local_trained_result(self, index, extracted_feature_dict, logits_dict, labels_dict,
                                  extracted_feature_dict_test, labels_dict_test):
         logging.info("add_model. index = %d" % index)
-        self.client_extracted_feauture_dict[index] = extracted_feature_dict
-        self.client_logits_dict[index] = logits_dict
-        self.client_labels_dict[index] = labels_dict
-        self.client_extracted_feauture_dict_test[index] = extracted_feature_dict_test
-        self.client_labels_dict_test[index] = labels_dict_test
+        if self.feature_store is not None:
+            self.feature_store.put(index, extracted_feature_dict, labels_dict, logits_dict, split="train")
+            self.feature_store.put(index, extracted_feature_dict_test, labels_dict_test, split="test")
+        else:
+            self.client_extracted_feauture_dict[index] = extracted_feature_dict
+            self.client_logits_dict[index] = logits_dict
+            self.client_labels_dict[index] = labels_dict
+            self.client_extracted_feauture_dict_test[index] = extracted_feature_dict_test
+            self.client_labels_dict_test[index] = labels_dict_test
 
         self.flag_client_model_uploaded_dict[index] = True
 
@@ -96,6 +106,7 @@ class GKTServerTrainer(object):
         return True
 
     def get_global_logits(self, client_index):
+        # with the feature store: one (samples, classes) array, in the order of the client's upload
         return self.server_logits_dict[client_index]
 
     def train(self, round_idx):
@@ -231,6 +242,9 @@ class GKTServerTrainer(object):
                     shutil.copyfile(last_path, os.path.join('./checkpoint/', 'best.pth'))
 
     def train_large_model_on_the_server(self):
+        if self.feature_store is not None:
+            return self.train_large_model_on_the_feature_store()
+
         # clear the server side logits
         for key in self.server_logits_dict.keys():
             self.server_logits_dict[key].clear()
@@ -289,7 +303,84 @@ class GKTServerTrainer(object):
         logging.info("- Train metrics: " + metrics_string)
         return train_metrics
 
+    def train_large_model_on_the_feature_store(self):
+        """
+            One epoch over every uploaded sample in shuffled server_batch_size
+            batches; the server logits are written back to one packed array
+            per client.
+        """
+        self.model_global.train()
+
+        loss_avg = utils.RunningAverage()
+        accTop1_avg = utils.RunningAverage()
+        accTop5_avg = utils.RunningAverage()
+
+        server_logits = None
+        loader = self.feature_store.loader("train", self.server_batch_size, shuffle=True, device=self.device,
+                                           prefetch=self.feature_prefetch)
+        for batch_feature_map_x, batch_logits, batch_labels, rows in loader:
+            output_batch = self.model_global(batch_feature_map_x)
+
+            if self.args.whether_distill_on_the_server == 1:
+                loss_kd = self.criterion_KL(output_batch, batch_logits).to(self.device)
+                loss_true = self.criterion_CE(output_batch, batch_labels).to(self.device)
+                loss = loss_kd + self.args.alpha * loss_true
+            else:
+                loss_true = self.criterion_CE(output_batch, batch_labels).to(self.device)
+                loss = loss_true
+
+            self.optimizer.zero_grad()
+            loss.backward()
+            self.optimizer.step()
+
+            metrics = utils.accuracy(output_batch, batch_labels, topk=(1, 5))
+            accTop1_avg.update(metrics[0].item())
+            accTop5_avg.update(metrics[1].item())
+            loss_avg.update(loss.item())
+
+            # as above, the logits of the model.train() mode are the ones sent back to the clients
+            output = output_batch.detach().cpu().numpy()
+            if server_logits is None:
+                server_logits = self.feature_store.new_packed(output.shape[1], "train")
+            self.feature_store.scatter(rows, output, server_logits, "train")
+        self.server_logits_dict = server_logits if server_logits is not None else dict()
+
+        train_metrics = {'train_loss': loss_avg.value(),
+                         'train_accTop1': accTop1_avg.value(),
+                         'train_accTop5': accTop5_avg.value()}
+
+        metrics_string = " ; ".join("{}: {:05.3f}".format(k, v) for k, v in train_metrics.items())
+        logging.info("- Train metrics: " + metrics_string)
+        return train_metrics
+
+    def eval_large_model_on_the_feature_store(self):
+        self.model_global.eval()
+        loss_avg = utils.RunningAverage()
+        accTop1_avg = utils.RunningAverage()
+        accTop5_avg = utils.RunningAverage()
+        loader = self.feature_store.loader("test", self.server_batch_size, shuffle=False, device=self.device,
+                                           prefetch=self.feature_prefetch)
+        with torch.no_grad():
+            for batch_feature_map_x, _, batch_labels, _ in loader:
+                output_batch = self.model_global(batch_feature_map_x)
+                loss = self.criterion_CE(output_batch, batch_labels)
+
+                metrics = utils.accuracy(output_batch, batch_labels, topk=(1, 5))
+                accTop1_avg.update(metrics[0].item())
+                accTop5_avg.update(metrics[1].item())
+                loss_avg.update(loss.item())
+
+        test_metrics = {'test_loss': loss_avg.value(),
+                        'test_accTop1': accTop1_avg.value(),
+                        'test_accTop5': accTop5_avg.value()}
+
+        metrics_string = " ; ".join("{}: {:05.3f}".format(k, v) for k, v in test_metrics.items())
+        logging.info("- Test  metrics: " + metrics_string)
+        return test_metrics
+
     def eval_large_model_on_the_server(self):
+        if self.feature_store is not None:
+            return self.eval_large_model_on_the_feature_store()
 
         # set model to evaluation mode
         self.model_global.eval()
@@ -0,0 +1,109 @@
+"""
+    One server epoch of GKTServerTrainer on synthetic ResNet-8 feature maps
+    (16 x 32 x 32 per sample, as resnet8_56 uploads them), with the per-batch
+    dicts and with the feature store (float32, float16, and float16 under a
+    RAM budget that spills most clients to memory-mapped files).
+
+    It also checks that the packed server logits unpack, on the client side,
+    into the per-batch logits of the client's upload order.
+
+    usage (from the FedML directory):
+        python -m fedml_api.distributed.fedgkt.benchmark_feature_store --clients 8 --samples 1000
+"""
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+import wandb
+
+from fedml_api.distributed.fedgkt.GKTClientTrainer import GKTClientTrainer
+from fedml_api.distributed.fedgkt.GKTServerTrainer import GKTServerTrainer
+from fedml_api.model.cv.resnet56_gkt.resnet_server import resnet56_server
+
+
+def synthetic_uploads(clients, samples, batch_size, classes, seed):
+    rng = np.random.RandomState(seed)
+    uploads = []
+    for client_index in range(clients):
+        features, logits, labels = dict(), dict(), dict()
+        for batch_index, start in enumerate(range(0, samples, batch_size)):
+            num = min(batch_size, samples - start)
+            features[batch_index] = rng.randn(num, 16, 32, 32).astype(np.float32)
+            logits[batch_index] = rng.randn(num, classes).astype(np.float32)
+            labels[batch_index] = rng.randint(classes, size=num).astype(np.int64)
+        uploads.append((features, logits, labels))
+    return uploads
+
+
+def make_args(batch_size, **kwargs):
+    args = SimpleNamespace(multi_gpu_server=False, no_bn_wd=False, optimizer="SGD", lr=0.01, wd=5e-4,
+                           temperature=3.0, whether_distill_on_the_server=1, alpha=1.0, batch_size=batch_size)
+    for k, v in kwargs.items():
+        setattr(args, k, v)
+    return args
+
+
+def run_epoch(name, args, uploads, classes):
+    torch.manual_seed(0)
+    trainer = GKTServerTrainer(len(uploads), torch.device("cpu"), resnet56_server(classes), args)
+    start = time.perf_counter()
+    for client_index, (features, logits, labels) in enumerate(uploads):
+        trainer.add_local_trained_result(client_index, features, logits, labels, features, labels)
+    added = time.perf_counter()
+    metrics = trainer.train_large_model_on_the_server()
+    end = time.perf_counter()
+    store = trainer.feature_store
+    memory = "" if store is None else ", %.0f MB in RAM" % (store.ram_bytes / 2 ** 20)
+    print("%-28s add %7.3f s   epoch %7.3f s   loss %.3f%s" % (name, added - start, end - added,
+                                                              metrics['train_loss'], memory))
+    return trainer
+
+
+def check_logits_round_trip(trainer, uploads, batch_size):
+    client = GKTClientTrainer.__new__(GKTClientTrainer)
+    for client_index, (features, _, _) in enumerate(uploads):
+        client.extracted_batch_sizes = [len(features[b]) for b in sorted(features.keys())]
+        client.update_large_model_logits(trainer.get_global_logits(client_index))
+        if sorted(client.server_logits_dict.keys()) != sorted(features.keys()) or any(
+                len(client.server_logits_dict[b]) != len(features[b]) for b in features):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--samples', type=int, default=1000, help='samples per client')
+    parser.add_argument('--batch_size', type=int, default=64, help='client batch size')
+    parser.add_argument('--server_batch_size', type=int, default=256)
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--ram_mb', type=float, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault("WANDB_MODE", "disabled")
+    wandb.init()
+    torch.set_num_threads(max(1, torch.get_num_threads()))
+
+    uploads = synthetic_uploads(args.clients, args.samples, args.batch_size, args.classes, args.seed)
+    print("%d clients x %d samples, %.0f MB of float32 features" % (
+        args.clients, args.samples, args.clients * args.samples * 16 * 32 * 32 * 4 / 2 ** 20))
+
+    run_epoch("per-batch dicts", make_args(args.batch_size), uploads, args.classes)
+    for name, dtype, ram_mb in (("feature store float32", "float32", 0),
+                                ("feature store float16", "float16", 0),
+                                ("feature store float16 spill", "float16", args.ram_mb)):
+        trainer = run_epoch(name, make_args(args.batch_size, feature_store=1, feature_store_dtype=dtype,
+                                            feature_store_ram_mb=ram_mb, server_batch_size=args.server_batch_size,
+                                            feature_prefetch=2), uploads, args.classes)
+        eval_metrics = trainer.eval_large_model_on_the_server()
+        print("%-28s eval loss %.3f   logits round trip: %s" % (
+            "", eval_metrics['test_loss'], check_logits_round_trip(trainer, uploads, args.batch_size)))
+        trainer.feature_store.close()
+
+
+if __name__ == '__main__':
+    main()
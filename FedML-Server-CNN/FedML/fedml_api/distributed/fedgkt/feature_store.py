@@ -0,0 +1,239 @@
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import torch
+
+
+def _concat(batches):
+    """ a dict batch_index -> array, in batch order, or an already packed array """
+    if isinstance(batches, dict):
+        return [np.asarray(batches[k]) for k in sorted(batches.keys())]
+    return [np.asarray(batches)]
+
+
+class _ClientRows(object):
+    """ one client's rows of a split, each column one contiguous (in RAM or memory-mapped) array """
+
+    def __init__(self, features, labels, logits, batch_sizes, ram_bytes):
+        self.features = features
+        self.labels = labels
+        self.logits = logits
+        self.batch_sizes = batch_sizes
+        self.ram_bytes = ram_bytes
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class FeatureStore(object):
+    """
+        The extracted features, logits and labels FedGKT clients upload, per
+        split ("train", "test") and client, appended to contiguous arrays
+        instead of being kept as a dict of per-batch arrays.
+
+        Features are stored as `dtype` (float16 halves the memory; batches go
+        back to float32 on the device). Arrays stay in RAM up to
+        ram_budget_mb in total; the clients that would go past it are
+        written to memory-mapped .npy files in spill_dir, and pages are read
+        as batches touch them. A client's rows are replaced by its next
+        upload.
+
+        loader() iterates over every sample of a split in large, optionally
+        shuffled, batches that a background thread gathers and moves to the
+        device ahead of use. Rows are numbered globally, clients in index
+        order; scatter() writes per-sample values (the server logits) back
+        into one packed array per client, in the order of its upload.
+    """
+
+    def __init__(self, dtype="float32", ram_budget_mb=0, spill_dir=None):
+        if dtype not in ("float32", "float16"):
+            raise ValueError("unknown feature dtype: {} (expected float32 or float16)".format(dtype))
+        self.dtype = np.dtype(dtype)
+        self.ram_budget = int(ram_budget_mb * 2 ** 20) if ram_budget_mb else None
+        self.spill_dir = spill_dir
+        self._own_spill_dir = False
+        self.splits = {"train": dict(), "test": dict()}
+        self.ram_bytes = 0
+
+    @classmethod
+    def from_args(cls, args):
+        """ None unless args.feature_store is set """
+        if not getattr(args, "feature_store", 0):
+            return None
+        return cls(dtype=getattr(args, "feature_store_dtype", "float32"),
+                   ram_budget_mb=getattr(args, "feature_store_ram_mb", 0),
+                   spill_dir=getattr(args, "feature_store_dir", None) or None)
+
+    def put(self, client_index, features, labels, logits=None, split="train"):
+        """ features / labels / logits: dicts batch_index -> array (as uploaded) or packed arrays """
+        clients = self.splits[split]
+        self._drop(split, client_index)
+
+        feature_batches = _concat(features)
+        batch_sizes = [len(batch) for batch in feature_batches]
+        num = sum(batch_sizes)
+        shape = feature_batches[0].shape[1:]
+        ram_bytes = 0
+        columns = []
+        for name, batches, dtype, row_shape in (
+                ("features", feature_batches, self.dtype, shape),
+                ("labels", _concat(labels), np.dtype(np.int64), ()),
+                ("logits", None if logits is None else _concat(logits), np.dtype(np.float32), None)):
+            if batches is None:
+                columns.append(None)
+                continue
+            row_shape = batches[0].shape[1:] if row_shape is None else row_shape
+            array, in_ram = self._allocate(split, client_index, name, (num,) + tuple(row_shape), dtype)
+            offset = 0
+            for batch in batches:
+                array[offset:offset + len(batch)] = batch
+                offset += len(batch)
+            if in_ram:
+                ram_bytes += array.nbytes
+            else:
+                array.flush()
+            columns.append(array)
+        # _allocate() has already counted ram_bytes against the budget
+        clients[client_index] = _ClientRows(columns[0], columns[1], columns[2], batch_sizes, ram_bytes)
+
+    def num_samples(self, split="train"):
+        return sum(len(rows) for rows in self.splits[split].values())
+
+    def clients(self, split="train"):
+        return sorted(self.splits[split].keys())
+
+    def batch_sizes(self, client_index, split="train"):
+        return self.splits[split][client_index].batch_sizes
+
+    def loader(self, split="train", batch_size=256, shuffle=True, device=torch.device("cpu"), prefetch=2,
+               generator=None):
+        return FeatureLoader(self, split, batch_size, shuffle, device, prefetch, generator)
+
+    def new_packed(self, num_columns, split="train"):
+        """ client -> a (client rows, num_columns) float32 array, for scatter() """
+        return {client_index: np.zeros((len(rows), num_columns), dtype=np.float32)
+                for client_index, rows in self.splits[split].items()}
+
+    def scatter(self, global_rows, values, packed, split="train"):
+        """ packed[client][row] = values[i] for every global row global_rows[i] """
+        for client_index, rows, positions in self._locate(split, global_rows):
+            packed[client_index][rows] = values[positions]
+
+    def gather(self, global_rows, split="train"):
+        """ (features, labels, logits or None) of the global rows, in their order """
+        parts = [(self.splits[split][client_index], rows) for client_index, rows, _ in self._locate(split, global_rows)]
+        features = np.concatenate([client.features[rows] for client, rows in parts])
+        labels = np.concatenate([client.labels[rows] for client, rows in parts])
+        logits = None
+        if all(client.logits is not None for client, _ in parts):
+            logits = np.concatenate([client.logits[rows] for client, rows in parts])
+        return features, labels, logits
+
+    def close(self):
+        for split in self.splits:
+            for client_index in list(self.splits[split].keys()):
+                self._drop(split, client_index)
+        if self._own_spill_dir and self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def _locate(self, split, global_rows):
+        """ (client, local rows, positions in global_rows) per client; global_rows must be sorted """
+        clients = self.clients(split)
+        offsets = np.cumsum([0] + [len(self.splits[split][c]) for c in clients])
+        owners = np.searchsorted(offsets, global_rows, side="right") - 1
+        bounds = np.searchsorted(owners, np.arange(len(clients) + 1))
+        for i, client_index in enumerate(clients):
+            if bounds[i] == bounds[i + 1]:
+                continue
+            positions = np.arange(bounds[i], bounds[i + 1])
+            yield client_index, global_rows[positions] - offsets[i], positions
+
+    def _allocate(self, split, client_index, name, shape, dtype):
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if self.ram_budget is None or self.ram_bytes + nbytes <= self.ram_budget:
+            self.ram_bytes += nbytes
+            return np.empty(shape, dtype=dtype), True
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="fedgkt_features_")
+            self._own_spill_dir = True
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = os.path.join(self.spill_dir, "%s_client%d_%s.npy" % (split, client_index, name))
+        logging.info("feature store: spilling %s of client %d (%.1f MB) to %s" % (name, client_index,
+                                                                                nbytes / 2 ** 20, path))
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape), False
+
+    def _drop(self, split, client_index):
+        rows = self.splits[split].pop(client_index, None)
+        if rows is not None:
+            self.ram_bytes -= rows.ram_bytes
+
+
+class FeatureLoader(object):
+    """
+        Batches of a FeatureStore split: (x, logits or None, labels, global
+        rows) with x as float32 on the device. Each batch is gathered (rows
+        sorted, so that memory-mapped clients are read in order) and copied
+        to the device by a background thread, prefetch batches ahead.
+    """
+
+    def __init__(self, store, split, batch_size, shuffle, device, prefetch=2, generator=None):
+        self.store = store
+        self.split = split
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.device = torch.device(device)
+        self.prefetch = max(1, prefetch)
+        self.generator = generator
+
+    def __len__(self):
+        return (self.store.num_samples(self.split) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        num = self.store.num_samples(self.split)
+        if self.shuffle:
+            order = torch.randperm(num, generator=self.generator).numpy()
+        else:
+            order = np.arange(num)
+        batches = [np.sort(order[start:start + self.batch_size]) for start in range(0, num, self.batch_size)]
+
+        ready = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._produce, args=(batches, ready, stop), daemon=True)
+        worker.start()
+        try:
+            for _ in range(len(batches)):
+                item = ready.get()
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # unblock the producer if it is waiting on a full queue
+            while worker.is_alive():
+                try:
+                    ready.get_nowait()
+                except queue.Empty:
+                    worker.join(0.01)
+
+    def _produce(self, batches, ready, stop):
+        pin = self.device.type == "cuda"
+        try:
+            for rows in batches:
+                if stop.is_set():
+                    return
+                features, labels, logits = self.store.gather(rows, self.split)
+                tensors = [torch.from_numpy(features), torch.from_numpy(labels)]
+                if logits is not None:
+                    tensors.append(torch.from_numpy(logits))
+                if pin:
+                    tensors = [t.pin_memory() for t in tensors]
+                tensors = [t.to(self.device, non_blocking=pin) for t in tensors]
+                x = tensors[0].float()
+                ready.put((x, tensors[2] if logits is not None else None, tensors[1], rows))
+        except BaseException as e:
+            ready.put(e)
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, RandomSampler
+
+
+def encoder_fingerprint(encoder):
+    """
+        hash of the encoder class, config and weights, so a re-generated encoder
+        never hits a stale cache; seeded encoders may hold no weights at all,
+        their config tells them apart
+    """
+    digest = hashlib.sha1(type(encoder).__name__.encode('utf-8'))
+    if hasattr(encoder, "encoder_config"):
+        digest.update(json.dumps(encoder.encoder_config(), sort_keys=True).encode('utf-8'))
+    for name, tensor in sorted(encoder.state_dict().items()):
+        digest.update(name.encode('utf-8'))
+        digest.update(json.dumps([str(tensor.dtype), list(tensor.shape), str(tensor.layout)]).encode('utf-8'))
+        for part in _tensor_parts(tensor.detach().cpu()):
+            digest.update(part.contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _tensor_parts(tensor):
+    """ the dense tensors a (possibly sparse) tensor is stored in """
+    if tensor.layout == torch.sparse_csr:
+        return [tensor.crow_indices(), tensor.col_indices(), tensor.values()]
+    if tensor.layout == torch.sparse_coo:
+        tensor = tensor.coalesce()
+        return [tensor.indices(), tensor.values()]
+    return [tensor]
+
+
+class EncodedData(object):
+    """
+        Encoded hypervectors of one data loader, iterated like the loader.
+
+        x is (samples, D) in the storage dtype (float32, float16, or bit-packed
+        uint8 for bipolar), y the labels, batch_sizes the batch boundaries of the
+        loader. Batches are returned as float32 tensors on the requested device.
+        With shuffle, the samples are permuted at every pass, as a shuffling
+        DataLoader would do.
+    """
+
+    def __init__(self, x, y, batch_sizes, storage, dim, shuffle=False):
+        self.x = x
+        self.y = y
+        self.batch_sizes = batch_sizes
+        self.storage = storage
+        self.dim = dim
+        self.shuffle = shuffle
+        self.device = torch.device("cpu")
+
+    def to(self, device):
+        self.device = device
+        return self
+
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes
+
+    def __len__(self):
+        return len(self.batch_sizes)
+
+    def __iter__(self):
+        order = np.random.permutation(len(self.y)) if self.shuffle else None
+        start = 0
+        for size in self.batch_sizes:
+            if order is None:
+                rows = slice(start, start + size)
+            else:
+                rows = np.sort(order[start:start + size])
+            yield self._decode(self.x[rows]).to(self.device), torch.from_numpy(np.array(self.y[rows]))
+            start += size
+
+    def _decode(self, x):
+        if self.storage == "bipolar":
+            bits = np.unpackbits(np.asarray(x), axis=1, count=self.dim)
+            return torch.from_numpy(bits.astype(np.float32) * 2.0 - 1.0)
+        # a copy, memory-mapped entries are read-only
+        return torch.from_numpy(np.array(x, dtype=np.float32))
+
+
+class EncodedFeatureCache(object):
+    """
+        Cache of encoder outputs for a frozen FedHD encoder.
+
+        The first pass over a data loader runs the encoder batch by batch and
+        stores the hypervectors; later epochs, rounds and evaluations iterate
+        the stored encodings instead of re-running the projection.
+
+        Entries are keyed by (partition configuration, data name, client id,
+        encoder fingerprint). With cache_dir they are written as .npy files and
+        memory-mapped, so they survive restarts and stay out of RAM; without it
+        they are kept in memory and the least recently used entries are dropped
+        beyond max_bytes.
+
+        storage: "float32" (exact), "float16" (half the size) or "bipolar"
+                 (sign only, bit-packed, 1/32 of float32; for bipolar encoders
+                 or classifiers that binarize their input anyway).
+    """
+
+    STORAGES = ("float32", "float16", "bipolar")
+
+    def __init__(self, cache_dir=None, storage="float16", max_bytes=1 << 30):
+        if storage not in self.STORAGES:
+            raise ValueError("unknown storage: {} (expected one of {})".format(storage, ", ".join(self.STORAGES)))
+        self.cache_dir = cache_dir
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_args(cls, args):
+        """ None unless args.hd_encoded_cache is set """
+        if not getattr(args, "hd_encoded_cache", 0):
+            return None
+        return cls(cache_dir=getattr(args, "hd_encoded_cache_dir", None),
+                   storage=getattr(args, "hd_encoded_cache_storage", "float16"),
+                   max_bytes=int(getattr(args, "hd_encoded_cache_max_mb", 1024)) << 20)
+
+    def get(self, key, data_loader, encoder, device):
+        """ EncodedData for data_loader, encoded with encoder on the first call for key """
+        name = self._name(key)
+        shuffle = isinstance(data_loader, DataLoader) and isinstance(data_loader.sampler, RandomSampler)
+
+        entry = self._entries.get(name)
+        if entry is None and self.cache_dir is not None:
+            entry = self._load(name, shuffle)
+        if entry is None:
+            entry = self._encode(data_loader, encoder, device, shuffle)
+            if self.cache_dir is not None:
+                entry = self._save(name, entry)
+            logging.info("encoded feature cache: stored %s (%d samples, %d bytes)" % (
+                "/".join(str(k) for k in key), len(entry.y), entry.nbytes()))
+        self._remember(name, entry)
+        return entry.to(device)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _name(self, key):
+        return hashlib.sha1(json.dumps([str(k) for k in key] + [self.storage]).encode('utf-8')).hexdigest()
+
+    def _encode(self, data_loader, encoder, device, shuffle):
+        xs, ys, batch_sizes = [], [], []
+        dim = None
+        with torch.no_grad():
+            for x, y in data_loader:
+                h = encoder(x.to(device)).detach().cpu()
+                dim = h.shape[1]
+                xs.append(self._encode_storage(h))
+                ys.append(np.asarray(y))
+                batch_sizes.append(h.shape[0])
+        return EncodedData(np.concatenate(xs), np.concatenate(ys), batch_sizes, self.storage, dim, shuffle)
+
+    def _encode_storage(self, h):
+        if self.storage == "bipolar":
+            return np.packbits(h.numpy() >= 0, axis=1)
+        if self.storage == "float16":
+            return h.numpy().astype(np.float16)
+        return h.numpy().astype(np.float32)
+
+    def _remember(self, name, entry):
+        if name in self._entries:
+            self._entries.move_to_end(name)
+            return
+        self._entries[name] = entry
+        if self.cache_dir is not None:
+            # memory-mapped, the page cache bounds the memory
+            return
+        self._bytes += entry.nbytes()
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes()
+
+    def _paths(self, name):
+        base = os.path.join(self.cache_dir, name)
+        return base + ".x.npy", base + ".y.npy", base + ".json"
+
+    def _save(self, name, entry):
+        x_path, y_path, meta_path = self._paths(name)
+        for path, array in [(x_path, entry.x), (y_path, entry.y)]:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        # the metadata is written last, an entry without it is incomplete
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"batch_sizes": entry.batch_sizes, "storage": entry.storage, "dim": entry.dim}, f)
+        os.replace(tmp_path, meta_path)
+        return self._load(name, entry.shuffle)
+
+    def _load(self, name, shuffle):
+        x_path, y_path, meta_path = self._paths(name)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return EncodedData(np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r"),
+                           meta["batch_sizes"], meta["storage"], meta["dim"], shuffle)
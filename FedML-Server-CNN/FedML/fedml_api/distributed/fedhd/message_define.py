@@ -20,6 +20,8 @@ class MyMessage(object):
     MSG_ARG_KEY_NUM_SAMPLES = "num_samples"
     MSG_ARG_KEY_MODEL_PARAMS = "model_params"
     MSG_ARG_KEY_CLIENT_INDEX = "client_idx"
+    # encoder_config() of a seeded encoder (fedml_api/model/hd/encoders.py), sent instead of encoder.ckpt
+    MSG_ARG_KEY_ENCODER_CONFIG = "encoder_config"
 
     MSG_ARG_KEY_TRAIN_CORRECT = "train_correct"
     MSG_ARG_KEY_TRAIN_ERROR = "train_error"
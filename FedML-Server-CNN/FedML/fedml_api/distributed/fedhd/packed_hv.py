@@ -0,0 +1,81 @@
+import numpy as np
+import torch
+
+# key of the message payload holding bit-packed class hypervectors
+PACKED_KEY = "bipolar_packed"
+
+_WORD_BITS = 64
+
+if hasattr(np, "bitwise_count"):
+    def popcount(words):
+        return np.bitwise_count(words)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(words):
+        """ per-word bit count, through a byte lookup table on numpy < 2.0 """
+        counts = _POPCOUNT_TABLE[words.view(np.uint8)]
+        return counts.reshape(words.shape + (words.dtype.itemsize,)).sum(axis=-1, dtype=np.uint32)
+
+
+def pack_bipolar(hvs):
+    """
+        (rows, D) real hypervectors -> (rows, words) uint64, one bit per dimension,
+        set where the value is >= 0 (+1) and clear for -1. D is padded to a
+        multiple of 64 with clear bits, which cancel out in the Hamming distance.
+    """
+    if torch.is_tensor(hvs):
+        hvs = hvs.detach().cpu().numpy()
+    hvs = np.atleast_2d(hvs)
+    dim = hvs.shape[1]
+    padded = -(-dim // _WORD_BITS) * _WORD_BITS
+    bits = np.zeros((hvs.shape[0], padded), dtype=bool)
+    bits[:, :dim] = hvs >= 0
+    # little bit order so that bit i of the vector is bit i of the word stream
+    packed = np.packbits(bits, axis=1, bitorder="little")
+    return packed.view(np.uint64)
+
+
+def unpack_bipolar(packed, dim):
+    """ (rows, words) uint64 -> (rows, D) float32 tensor of +1 / -1 """
+    packed = np.ascontiguousarray(packed, dtype=np.uint64)
+    bits = np.unpackbits(packed.view(np.uint8), axis=1, count=dim, bitorder="little")
+    return torch.from_numpy(bits.astype(np.float32) * 2.0 - 1.0)
+
+
+def hamming_distance(queries, class_hvs, block_size=1024):
+    """
+        (n, words) x (classes, words) packed hypervectors -> (n, classes) Hamming
+        distances, XOR + popcount over 64 bit words, in blocks of queries so the
+        (block, classes, words) intermediate stays small.
+    """
+    out = np.empty((queries.shape[0], class_hvs.shape[0]), dtype=np.uint32)
+    for start in range(0, queries.shape[0], block_size):
+        block = queries[start:start + block_size]
+        diff = np.bitwise_xor(block[:, None, :], class_hvs[None, :, :])
+        out[start:start + block_size] = popcount(diff).sum(axis=2, dtype=np.uint32)
+    return out
+
+
+def classify(queries, class_hvs):
+    """ index of the nearest class hypervector in Hamming distance (= highest bipolar dot product) """
+    return np.argmin(hamming_distance(queries, class_hvs), axis=1)
+
+
+def to_message(class_hvs):
+    """ message payload of bipolar class hypervectors: uint8 bytes, 1/32 of float32 """
+    dim = class_hvs.shape[-1]
+    return {PACKED_KEY: pack_bipolar(class_hvs).view(np.uint8), "dim": int(dim)}
+
+
+def is_packed(model_params):
+    return isinstance(model_params, dict) and PACKED_KEY in model_params
+
+
+def from_message(model_params):
+    """ (packed uint64 class hypervectors, D) from a to_message() payload, from either wire format """
+    packed = model_params[PACKED_KEY]
+    if torch.is_tensor(packed):
+        packed = packed.numpy()
+    packed = np.ascontiguousarray(np.asarray(packed, dtype=np.uint8))
+    return packed.view(np.uint64), int(model_params["dim"])
@@ -1,8 +1,17 @@
 import torch
 import numpy as np
 
+from .packed_hv import is_packed, from_message, unpack_bipolar
+
 
 def transform_list_to_tensor(model_params_list):
+    # bit-packed bipolar class hypervectors, see packed_hv.py
+    if is_packed(model_params_list):
+        packed, dim = from_message(model_params_list)
+        return unpack_bipolar(packed, dim)
+    # binary wire format already delivers a tensor, json delivers nested lists
+    if torch.is_tensor(model_params_list):
+        return model_params_list.float()
     return torch.FloatTensor(model_params_list)
 
 
@@ -0,0 +1,119 @@
+"""
+    Training throughput (samples/s) of distributed SplitNN, lockstep protocol
+    against the pipelined one, on ResNet-56 split after its first layer as
+    main_split_nn.py does.
+
+    Every rank runs in this process on top of LocalComm (the MPI stand-in),
+    one thread per rank, with a simulated link of --latency_ms and
+    --bandwidth_mbps between them. Each client trains --epochs epochs of
+    --batches synthetic CIFAR-10 batches and validates on one batch after
+    each; lockstep serves one client at a time (active_node round-robin),
+    the pipelined protocol serves all of them at once with --micro_batches
+    in flight per batch.
+
+    All ranks share the CPU here, so only the time spent waiting on the link
+    can be overlapped; on separate machines the client and server compute
+    overlap as well.
+
+    usage (from the FedML directory):
+        python -m fedml_api.distributed.split_nn.benchmark_pipeline --clients 2 --micro_batches 2 4 \\
+            --payload float32 float16 int8
+"""
+import argparse
+import copy
+import logging
+import time
+from types import SimpleNamespace
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+
+from fedml_api.distributed.split_nn.client import SplitNN_client
+from fedml_api.distributed.split_nn.client_manager import SplitNNClientManager
+from fedml_api.distributed.split_nn.pipeline import PipelinedSplitNN_client, PipelinedSplitNN_server
+from fedml_api.distributed.split_nn.pipeline_manager import PipelinedSplitNNClientManager, \
+    PipelinedSplitNNServerManager
+from fedml_api.distributed.split_nn.server import SplitNN_server
+from fedml_api.distributed.split_nn.server_manager import SplitNNServerManager
+from fedml_api.model.cv.resnet import resnet56
+from fedml_core.distributed.communication.mpi.local_comm import LocalWorld
+
+
+def split_resnet56(class_num, split_layer=1):
+    model = resnet56(class_num=class_num)
+    model.fc = nn.Sequential(nn.Flatten(), nn.Linear(model.fc.in_features, class_num))
+    client_model = nn.Sequential(*nn.ModuleList(model.children())[:split_layer])
+    server_model = nn.Sequential(*nn.ModuleList(model.children())[split_layer:])
+    return client_model, server_model
+
+
+def run(args, micro_batches, payload):
+    torch.manual_seed(args.seed)
+    client_model, server_model = split_resnet56(10)
+    options = SimpleNamespace(wire_format=args.wire_format, micro_batches=micro_batches, splitnn_payload=payload)
+    pipelined = micro_batches > 0
+    size = args.clients + 1
+    device = torch.device("cpu")
+
+    def rank_fn(comm, rank, size):
+        if rank == 0:
+            arg_dict = {"comm": comm, "model": copy.deepcopy(server_model), "max_rank": size - 1, "rank": rank,
+                        "device": device, "args": options}
+            if pipelined:
+                manager = PipelinedSplitNNServerManager(arg_dict, PipelinedSplitNN_server(arg_dict))
+            else:
+                manager = SplitNNServerManager(arg_dict, SplitNN_server(arg_dict))
+        else:
+            generator = torch.Generator().manual_seed(args.seed + rank)
+            samples = args.batches * args.batch_size
+            train = TensorDataset(torch.randn(samples, 3, 32, 32, generator=generator),
+                                  torch.randint(10, (samples,), generator=generator))
+            test = TensorDataset(torch.randn(args.batch_size, 3, 32, 32, generator=generator),
+                                 torch.randint(10, (args.batch_size,), generator=generator))
+            arg_dict = {"comm": comm, "trainloader": DataLoader(train, batch_size=args.batch_size),
+                        "testloader": DataLoader(test, batch_size=args.batch_size),
+                        "model": copy.deepcopy(client_model), "rank": rank, "server_rank": 0, "max_rank": size - 1,
+                        "epochs": args.epochs, "device": device, "args": options}
+            if pipelined:
+                manager = PipelinedSplitNNClientManager(arg_dict, PipelinedSplitNN_client(arg_dict))
+            else:
+                manager = SplitNNClientManager(arg_dict, SplitNN_client(arg_dict))
+        manager.run()
+
+    world = LocalWorld(size, latency=args.latency_ms / 1000.0,
+                       bandwidth=args.bandwidth_mbps * 1e6 / 8 if args.bandwidth_mbps else None)
+    start = time.perf_counter()
+    world.run(rank_fn)
+    elapsed = time.perf_counter() - start
+    return args.clients * args.epochs * args.batches * args.batch_size / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=2)
+    parser.add_argument('--epochs', type=int, default=1, help='epochs per client')
+    parser.add_argument('--batches', type=int, default=8, help='training batches per client and epoch')
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--micro_batches', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--payload', type=str, nargs='+', default=['float32', 'float16', 'int8'])
+    parser.add_argument('--latency_ms', type=float, default=20.0)
+    parser.add_argument('--bandwidth_mbps', type=float, default=100.0, help='0 for no limit')
+    parser.add_argument('--wire_format', type=str, default='binary')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print("%d clients x %d epochs x %d batches of %d, link %.0f ms / %s Mbit/s" % (
+        args.clients, args.epochs, args.batches, args.batch_size, args.latency_ms, args.bandwidth_mbps or "inf"))
+    throughput, elapsed = run(args, 0, "float32")
+    print("%-34s %8.1f samples/s  (%.1f s)" % ("lockstep", throughput, elapsed))
+    for micro_batches in args.micro_batches:
+        for payload in args.payload:
+            throughput, elapsed = run(args, micro_batches, payload)
+            print("%-34s %8.1f samples/s  (%.1f s)" % ("pipelined, %d micro-batches, %s" % (micro_batches, payload),
+                                                       throughput, elapsed))
+
+
+if __name__ == '__main__':
+    main()
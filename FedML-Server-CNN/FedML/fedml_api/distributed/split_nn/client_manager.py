@@ -59,14 +59,14 @@ class SplitNNClientManager(ClientManager):
         self.trainer.backward_pass(grads)
         if self.trainer.batch_idx == len(self.trainer.trainloader):
             logging.info("Epoch over at node {}".format(self.rank))
-            self.round_idx += 1
             self.run_eval()
         else:
             self.run_forward_pass()
 
     def send_activations_and_labels_to_server(self, acts, labels, receive_id):
         message = Message(MyMessage.MSG_TYPE_C2S_SEND_ACTS, self.get_sender_id(), receive_id)
-        message.add_params(MyMessage.MSG_ARG_KEY_ACTS, (acts, labels))
+        # the autograd graph stays on the client, only the values are sent
+        message.add_params(MyMessage.MSG_ARG_KEY_ACTS, (acts.detach(), labels))
         self.send_message(message)
 
     def send_semaphore_to_client(self, receive_id):
@@ -84,3 +84,8 @@ class SplitNNClientManager(ClientManager):
     def send_finish_to_server(self, receive_id):
         message = Message(MyMessage.MSG_TYPE_C2S_PROTOCOL_FINISHED, self.get_sender_id(), receive_id)
         self.send_message(message)
+
+    def finish(self):
+        # stops the receive loop, the client is done once its last epoch is validated
+        logging.info("__finish client {}".format(self.rank))
+        self.com_manager.stop_receive_message()
@@ -6,8 +6,13 @@ from torchvision import datasets, transforms
 from torch.optim.lr_scheduler import StepLR
 import copy
 
+try:
+    from fedml_core.trainer.flat_params import FlatParamsMixin
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamsMixin
 
-class FashionMNIST_Net(nn.Module):
+
+class FashionMNIST_Net(FlatParamsMixin, nn.Module):
     def __init__(self):
         super(FashionMNIST_Net, self).__init__()
         self.conv1 = nn.Conv2d(1, 20, 5, 1)
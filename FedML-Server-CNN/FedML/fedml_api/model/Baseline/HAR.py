@@ -6,10 +6,15 @@ from torchvision import datasets, transforms
 from torch.optim.lr_scheduler import StepLR
 import copy
 
+try:
+    from fedml_core.trainer.flat_params import FlatParamsMixin
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamsMixin
+
 FEATURE_DIM = 561
 NUM_CLASSES = 6
 
-class HAR_Net(nn.Module):
+class HAR_Net(FlatParamsMixin, nn.Module):
     def __init__(self):
         super(HAR_Net, self).__init__()
         self.fc1 = nn.Linear(FEATURE_DIM, 128)
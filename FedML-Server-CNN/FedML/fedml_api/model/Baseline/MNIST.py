@@ -6,7 +6,12 @@ from torchvision import datasets, transforms
 from torch.optim.lr_scheduler import StepLR
 import copy
 
-class MNIST_Net(nn.Module):
+try:
+    from fedml_core.trainer.flat_params import FlatParamsMixin
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamsMixin
+
+class MNIST_Net(FlatParamsMixin, nn.Module):
     def __init__(self):
         super(MNIST_Net, self).__init__()
         self.conv1 = nn.Conv2d(1, 20, 5, 1)
@@ -0,0 +1,83 @@
+"""
+    Compare the json and binary message wire formats on the Baseline models.
+
+    For every model, the state_dict is put into a Message the way the BaselineCNN
+    managers do it and encoded / decoded with both serializers. The FedHD class
+    hypervector matrix (10 x D) is measured as well.
+
+    usage (from the FedML directory):
+        python -m fedml_api.model.Baseline.benchmark_wire_format --repeat 3
+"""
+import argparse
+import time
+
+import torch
+
+from fedml_core.distributed.communication.message import Message
+
+from fedml_api.model.Baseline.CIFAR10 import CIFAR10_Net
+from fedml_api.model.Baseline.FashionMNIST import FashionMNIST_Net
+from fedml_api.model.Baseline.HAR import HAR_Net
+from fedml_api.model.Baseline.HPWREN import HPWREN_Net
+from fedml_api.model.Baseline.MNIST import MNIST_Net
+from fedml_api.model.Baseline.shakespeare import Shakespeare_Net
+from fedml_api.distributed.BaselineCNN.utils import transform_list_to_tensor
+
+MSG_TYPE_C2S_SEND_MODEL_TO_SERVER = 3
+
+
+def build_message(model_params):
+    message = Message(MSG_TYPE_C2S_SEND_MODEL_TO_SERVER, 1, 0)
+    message.add_params(Message.MSG_ARG_KEY_MODEL_PARAMS, model_params)
+    message.add_params("num_samples", 500)
+    return message
+
+
+def bench(model_params, wire_format, repeat):
+    message = build_message(model_params)
+    encode_time, decode_time = 0.0, 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = message.to_payload(wire_format)
+        encode_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        received = Message()
+        received.init_from_payload(payload.encode('utf-8') if isinstance(payload, str) else payload)
+        params = received.get(Message.MSG_ARG_KEY_MODEL_PARAMS)
+        if isinstance(params, dict):
+            transform_list_to_tensor(params)
+        else:
+            torch.as_tensor(params, dtype=torch.float)
+        decode_time += time.perf_counter() - start
+
+    size = len(payload.encode('utf-8')) if isinstance(payload, str) else len(payload)
+    return size, encode_time / repeat, decode_time / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--D', type=int, default=10000, help='FedHD hypervector dimension')
+    args = parser.parse_args()
+
+    payloads = [
+        ("MNIST_Net", MNIST_Net().state_dict()),
+        ("FashionMNIST_Net", FashionMNIST_Net().state_dict()),
+        ("CIFAR10_Net", CIFAR10_Net().state_dict()),
+        ("Shakespeare_Net", Shakespeare_Net().state_dict()),
+        ("HAR_Net", HAR_Net().state_dict()),
+        ("HPWREN_Net", HPWREN_Net().state_dict()),
+        ("FedHD class_hvs", torch.randn(10, args.D)),
+    ]
+
+    print("{:<18} {:>8} {:>14} {:>12} {:>12}".format("model", "format", "bytes", "encode (s)", "decode (s)"))
+    for name, model_params in payloads:
+        for wire_format in ["json", "binary"]:
+            size, encode_time, decode_time = bench(model_params, wire_format, args.repeat)
+            print("{:<18} {:>8} {:>14,d} {:>12.4f} {:>12.4f}".format(name, wire_format, size,
+                                                                       encode_time, decode_time))
+
+
+if __name__ == '__main__':
+    main()
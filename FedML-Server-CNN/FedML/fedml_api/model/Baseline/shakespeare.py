@@ -6,6 +6,11 @@ from torchvision import datasets, transforms
 from torch.optim.lr_scheduler import StepLR
 import copy
 
+try:
+    from fedml_core.trainer.flat_params import FlatParamsMixin
+except ImportError:
+    from FedML.fedml_core.trainer.flat_params import FlatParamsMixin
+
 
 
 
@@ -13,7 +18,7 @@ SEQ_LEN = 80
 NUM_CLASSES = 80
 NUM_HIDDEN = 100
 
-class Shakespeare_Net(nn.Module):
+class Shakespeare_Net(FlatParamsMixin, nn.Module):
     def __init__(self):
         super(Shakespeare_Net, self).__init__()
         self.seq_len = SEQ_LEN  # window_size?
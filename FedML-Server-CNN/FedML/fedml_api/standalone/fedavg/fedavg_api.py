@@ -7,6 +7,7 @@ import torch
 import wandb
 
 from fedml_api.standalone.fedavg.client import Client
+from fedml_api.standalone.fedavg.parallel_simulator import ParallelClientSimulator, client_seed
 
 
 class FedAvgAPI(object):
@@ -28,6 +29,8 @@ class FedAvgAPI(object):
 
         self.model_trainer = model_trainer
         self._setup_clients(train_data_local_num_dict, train_data_local_dict, test_data_local_dict, model_trainer)
+        self.simulator = ParallelClientSimulator.from_args(args, device, self._train_client,
+                                                           model_trainer.get_model_params())
 
     def _setup_clients(self, train_data_local_num_dict, train_data_local_dict, test_data_local_dict, model_trainer):
         logging.info("############setup_clients (START)#############")
@@ -38,7 +41,15 @@ class FedAvgAPI(object):
         logging.info("############setup_clients (END)#############")
 
     def train(self):
-        w_global = self.model_trainer.get_model_params()
+        try:
+            self._train()
+        finally:
+            if self.simulator is not None:
+                self.simulator.close()
+
+    def _train(self):
+        # a snapshot: the state_dict holds references to the tensors the clients train
+        w_global = copy.deepcopy(self.model_trainer.get_model_params())
         for round_idx in range(self.args.comm_round):
 
             logging.info("################Communication round : {}".format(round_idx))
@@ -53,20 +64,20 @@ class FedAvgAPI(object):
                                                    self.args.client_num_per_round)
             logging.info("client_indexes = " + str(client_indexes))
 
-            for idx, client in enumerate(self.client_list):
-                # update dataset
-                client_idx = client_indexes[idx]
-                client.update_local_dataset(client_idx, self.train_data_local_dict[client_idx],
-                                            self.test_data_local_dict[client_idx],
-                                            self.train_data_local_num_dict[client_idx])
-
-                # train on new dataset
-                w = client.train()
-                # self.logger.info("local weights = " + str(w))
-                w_locals.append((client.get_sample_number(), copy.deepcopy(w)))
-
-            # update global weights
-            w_global = self._aggregate(w_locals)
+            if self.simulator is not None:
+                # the clients are trained by the simulator's workers, and averaged in its shared buffer
+                w_global = self.simulator.train_round(round_idx, client_indexes,
+                                                      [self.train_data_local_num_dict[client_idx]
+                                                       for client_idx in client_indexes])
+            else:
+                for idx, client in enumerate(self.client_list):
+                    # update dataset and train on it, from the global model
+                    w = self._train_client(round_idx, client_indexes[idx], w_global, client)
+                    # self.logger.info("local weights = " + str(w))
+                    w_locals.append((client.get_sample_number(), copy.deepcopy(w)))
+
+                # update global weights
+                w_global = self._aggregate(w_locals)
             self.model_trainer.set_model_params(w_global)
 
             # test results
@@ -80,6 +91,15 @@ class FedAvgAPI(object):
                 else:
                     self._local_test_on_all_clients(round_idx)
 
+    def _train_client(self, round_idx, client_idx, w_global, client=None):
+        """ trains client_idx from w_global with its own seed, so that the result does not depend on the order """
+        client = self.client_list[0] if client is None else client
+        client.update_local_dataset(client_idx, self.train_data_local_dict[client_idx],
+                                    self.test_data_local_dict[client_idx],
+                                    self.train_data_local_num_dict[client_idx])
+        torch.manual_seed(client_seed(round_idx, client_idx, self.args.client_num_in_total))
+        return client.train(w_global)
+
     def _client_sampling(self, round_idx, client_num_in_total, client_num_per_round):
         if client_num_in_total == client_num_per_round:
             client_indexes = [client_index for client_index in range(client_num_in_total)]
@@ -0,0 +1,80 @@
+"""
+    Global round time of standalone hierarchical FL with the sequential
+    group loop versus the parallel group executor at several worker counts,
+    and a check that every run ends with the same global model.
+
+    The clients hold synthetic 28x28 images (CNN_DropOut, as for FEMNIST)
+    and are split into --groups random groups. The speedup is bounded by the
+    number of cores and by the number of groups: run with --workers up to
+    min(os.cpu_count(), --groups).
+
+    usage (from the FedML directory):
+        python -m fedml_api.standalone.hierarchical_fl.benchmark_parallel_groups --groups 10 --workers 1 2 4
+"""
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+import wandb
+
+from fedml_api.model.cv.cnn import CNN_DropOut
+from fedml_api.standalone.fedavg.benchmark_parallel_simulator import make_dataset
+from fedml_api.standalone.fedavg.my_model_trainer_classification import MyModelTrainer
+from fedml_api.standalone.hierarchical_fl.trainer import Trainer
+
+
+def run(args, dataset, group_workers):
+    # the group assignment is drawn from numpy, the initial model from torch
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    model_trainer = MyModelTrainer(CNN_DropOut(only_digits=True))
+    run_args = argparse.Namespace(**vars(args))
+    run_args.group_workers = group_workers
+    trainer = Trainer(dataset, torch.device("cpu"), run_args, model_trainer)
+    start = time.perf_counter()
+    trainer.train()
+    elapsed = time.perf_counter() - start
+    return model_trainer.get_model_params(), elapsed / args.global_comm_round
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=40, help='clients, all of them sampled every round')
+    parser.add_argument('--groups', type=int, default=10)
+    parser.add_argument('--samples', type=int, default=64, help='samples per client')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--global_comm_round', type=int, default=2)
+    parser.add_argument('--group_comm_round', type=int, default=2)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ.setdefault("WANDB_MODE", "disabled")
+    wandb.init()
+    total_epochs = args.global_comm_round * args.group_comm_round * args.epochs
+    train_args = argparse.Namespace(client_num_in_total=args.clients, client_num_per_round=args.clients,
+                                    group_method="random", group_num=args.groups,
+                                    global_comm_round=args.global_comm_round, group_comm_round=args.group_comm_round,
+                                    epochs=args.epochs, batch_size=args.batch_size, client_optimizer="sgd", lr=0.03,
+                                    wd=0.0, frequency_of_the_test=total_epochs, dataset="femnist", ci=1,
+                                    seed=args.seed)
+    dataset = make_dataset(args)
+
+    print("%d cores, %d clients x %d samples in %d groups, %d global x %d group rounds" % (
+        os.cpu_count(), args.clients, args.samples, args.groups, args.global_comm_round, args.group_comm_round))
+    reference, sequential = run(train_args, dataset, 0)
+    print("%-12s %8.3f s / global round" % ("sequential", sequential))
+    for workers in args.workers:
+        params, elapsed = run(train_args, dataset, workers)
+        identical = all(torch.equal(params[k], reference[k]) for k in reference)
+        print("%-12s %8.3f s / global round  speedup %5.2fx  identical to the loop: %s" % (
+            "%d workers" % workers, elapsed, sequential / elapsed, identical))
+
+
+if __name__ == '__main__':
+    main()
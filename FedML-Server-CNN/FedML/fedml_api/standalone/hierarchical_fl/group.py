@@ -1,11 +1,14 @@
 import logging
 
+import torch
+
 from fedml_api.standalone.hierarchical_fl.client import Client
-from fedml_api.standalone.fedavg.fedavg_trainer import FedAvgTrainer
+from fedml_api.standalone.fedavg.fedavg_api import FedAvgAPI
+from fedml_api.standalone.fedavg.parallel_simulator import client_seed
 
-class Group(FedAvgTrainer):
+class Group(FedAvgAPI):
 
-    def __init__(self, idx, total_client_indexes, train_data_local_dict, test_data_local_dict, train_data_local_num_dict, args, device, model):
+    def __init__(self, idx, total_client_indexes, train_data_local_dict, test_data_local_dict, train_data_local_num_dict, args, device, model_trainer):
         self.idx = idx
         self.args = args
         self.device = device
@@ -13,7 +16,7 @@ class Group(FedAvgTrainer):
         self.train_data_local_num_dict = train_data_local_num_dict
         for client_idx in total_client_indexes:
             self.client_dict[client_idx] = Client(client_idx, train_data_local_dict[client_idx], test_data_local_dict[client_idx],
-                       train_data_local_num_dict[client_idx], args, device, model)
+                       train_data_local_num_dict[client_idx], args, device, model_trainer)
 
     def get_sample_number(self, sampled_client_indexes):
         self.group_sample_number = 0
@@ -29,8 +32,10 @@ class Group(FedAvgTrainer):
             logging.info("Group ID : {} / Group Communication Round : {}".format(self.idx, group_round_idx))
             w_locals_dict = {}
 
-            # train each client
+            # train each client, with its own seed so that the result does not depend on the order of the groups
+            round_idx = global_round_idx * self.args.group_comm_round + group_round_idx
             for client in sampled_client_list:
+                torch.manual_seed(client_seed(round_idx, client.client_idx, self.args.client_num_in_total))
                 w_local_list = client.train(global_round_idx, group_round_idx, w_group)
                 for global_epoch, w in w_local_list:
                     if not global_epoch in w_locals_dict: w_locals_dict[global_epoch] = []
@@ -39,7 +44,7 @@ class Group(FedAvgTrainer):
             # aggregate local weights
             for global_epoch in sorted(w_locals_dict.keys()):
                 w_locals = w_locals_dict[global_epoch]
-                w_group_list.append((global_epoch, self.aggregate(w_locals)))
+                w_group_list.append((global_epoch, self._aggregate(w_locals)))
 
             # update the group weight
             w_group = w_group_list[-1][1]
@@ -0,0 +1,117 @@
+import logging
+
+import torch
+
+
+class HDBundler(object):
+    """
+        Bundling of client class hypervector matrices (FedHD aggregation).
+
+        Uploads are copied into a preallocated (clients x classes x D) buffer as
+        they arrive, in the slot of the client index, and bundle() reduces the
+        buffer in one vectorized op per chunk of dimensions, so the temporaries
+        stay at (clients x classes x chunk_size) whatever D is.
+
+        modes:
+            "weighted":   sum_i n_i * H_i / sum_i n_i, n_i the client's sample count
+            "mean":       uniform average over the clients
+            "normalized": every class hypervector is L2 normalized before the
+                          weighted bundling, so no client dominates by magnitude
+
+        bipolar: uploads are binarized to +1/-1 (and stored as int8, a quarter of
+                 the float32 buffer), the bundle is the sign of the weighted vote.
+    """
+
+    MODES = ("weighted", "mean", "normalized")
+
+    def __init__(self, num_clients, mode="weighted", bipolar=False, chunk_size=4096,
+                 device=torch.device("cpu")):
+        if mode not in self.MODES:
+            raise ValueError("unknown bundling mode: {} (expected one of {})".format(mode, ", ".join(self.MODES)))
+        self.num_clients = num_clients
+        self.mode = mode
+        self.bipolar = bipolar
+        self.chunk_size = chunk_size
+        self.device = device
+
+        self.buffer = None
+        self.dtype = None
+        self.weights = torch.zeros(num_clients, dtype=torch.float32, device=device)
+        # 1 / ||H_ic|| per client and class, for the normalized mode
+        self.inv_norms = None
+        self.received = torch.zeros(num_clients, dtype=torch.bool, device=device)
+
+    @classmethod
+    def from_args(cls, args, num_clients, device=torch.device("cpu")):
+        return cls(num_clients,
+                   mode=getattr(args, "hd_bundling", "weighted"),
+                   bipolar=bool(getattr(args, "hd_bipolar", 0)),
+                   chunk_size=getattr(args, "hd_bundle_chunk_size", 4096),
+                   device=device)
+
+    def add(self, index, class_hvs, weight):
+        if self.buffer is None:
+            self._allocate(class_hvs)
+        if class_hvs.shape != self.buffer.shape[1:]:
+            raise ValueError("client %d sent class hypervectors of shape %s, expected %s" % (
+                index, tuple(class_hvs.shape), tuple(self.buffer.shape[1:])))
+
+        class_hvs = class_hvs.detach().to(self.device)
+        if self.bipolar:
+            self.buffer[index].copy_(torch.where(class_hvs >= 0, 1, -1))
+        else:
+            self.buffer[index].copy_(class_hvs)
+        if self.mode == "normalized":
+            norms = torch.linalg.vector_norm(self.buffer[index].float(), dim=1)
+            self.inv_norms[index] = torch.where(norms > 0, 1.0 / norms, torch.zeros_like(norms))
+        self.weights[index] = weight
+        self.received[index] = True
+
+    def num_received(self):
+        return int(self.received.sum().item())
+
+    def bundle(self):
+        """ the bundled (classes x D) class hypervectors, float32 or the upload dtype """
+        if self.num_received() == 0:
+            raise RuntimeError("no class hypervectors have been added")
+
+        index = torch.nonzero(self.received, as_tuple=True)[0]
+        # (n, classes) coefficients of every client's class hypervectors
+        if self.mode == "mean":
+            coef = torch.ones(len(index), device=self.device)
+        else:
+            coef = self.weights[index]
+        if coef.sum() <= 0:
+            raise RuntimeError("the weights of the added class hypervectors sum to zero")
+        coef = (coef / coef.sum()).unsqueeze(1).expand(-1, self.buffer.shape[1])
+        if self.mode == "normalized":
+            coef = coef * self.inv_norms[index]
+        coef = coef.contiguous()
+
+        # with every client in, slice the buffer as is; otherwise gather the received rows chunk by chunk
+        all_received = len(index) == self.num_clients
+        classes, dim = self.buffer.shape[1], self.buffer.shape[2]
+        out = torch.empty(classes, dim, dtype=torch.float32, device=self.device)
+        for start in range(0, dim, self.chunk_size):
+            end = min(start + self.chunk_size, dim)
+            chunk = self.buffer[:, :, start:end] if all_received else self.buffer[index, :, start:end]
+            out[:, start:end] = torch.einsum("nc,ncd->cd", coef, chunk.float())
+
+        if self.bipolar:
+            out = torch.where(out >= 0, 1.0, -1.0)
+        return out if self.bipolar else out.to(self.dtype)
+
+    def reset(self):
+        self.weights.zero_()
+        self.received.zero_()
+        if self.inv_norms is not None:
+            self.inv_norms.zero_()
+
+    def _allocate(self, class_hvs):
+        classes, dim = class_hvs.shape
+        self.dtype = class_hvs.dtype if class_hvs.is_floating_point() else torch.float32
+        storage = torch.int8 if self.bipolar else torch.float32
+        self.buffer = torch.zeros(self.num_clients, classes, dim, dtype=storage, device=self.device)
+        if self.mode == "normalized":
+            self.inv_norms = torch.zeros(self.num_clients, classes, dtype=torch.float32, device=self.device)
+        logging.info("HDBundler: allocated %d x %d x %d %s buffer" % (self.num_clients, classes, dim, storage))
@@ -0,0 +1,75 @@
+import logging
+
+import torch
+
+from ..trainer.flat_params import FlatParamLayout
+
+
+class StreamingAggregator(object):
+    """
+        Online weighted averaging (FedAvg) of client uploads.
+
+        Every upload is folded into a single preallocated, flattened float32
+        accumulator as soon as it arrives, so the server holds one model plus the
+        upload in flight instead of one model per client, and the average is ready
+        when the last client reports.
+
+        Uploads are either a state_dict (name -> tensor) or a single tensor
+        (a flat parameter buffer, or the FedHD class hypervectors). For state_dicts
+        the FlatParamLayout is taken from the first upload of the first round.
+    """
+
+    def __init__(self, device=torch.device("cpu")):
+        self.device = device
+        self.accumulator = None
+        self.layout = None
+        self.shape = None
+        self.dtype = None
+        self.total_weight = 0.0
+        self.num_received = 0
+
+    def add(self, model_params, weight):
+        if self.accumulator is None:
+            self._allocate(model_params)
+
+        if self.layout is None:
+            self.accumulator.add_(model_params.detach().reshape(-1).to(self.accumulator), alpha=weight)
+        else:
+            for k, (offset, numel, shape, dtype) in self.layout.index.items():
+                self.accumulator[offset:offset + numel].add_(
+                    model_params[k].detach().reshape(-1).to(self.accumulator), alpha=weight)
+        self.total_weight += weight
+        self.num_received += 1
+
+    def result(self):
+        """
+            Weighted average of everything added since the last reset(), in the
+            structure (and dtypes) of the uploads.
+        """
+        if self.num_received == 0:
+            raise RuntimeError("no model has been added to the aggregator")
+        if self.total_weight == 0:
+            raise RuntimeError("the weights of the added models sum to zero")
+
+        averaged = self.accumulator / self.total_weight
+        if self.layout is None:
+            return averaged.view(self.shape).to(self.dtype)
+
+        return self.layout.unflatten(averaged)
+
+    def reset(self):
+        if self.accumulator is not None:
+            self.accumulator.zero_()
+        self.total_weight = 0.0
+        self.num_received = 0
+
+    def _allocate(self, model_params):
+        if torch.is_tensor(model_params):
+            self.shape = model_params.shape
+            self.dtype = model_params.dtype
+            total = model_params.numel()
+        else:
+            self.layout = FlatParamLayout.from_state_dict(model_params)
+            total = self.layout.numel
+        self.accumulator = torch.zeros(total, dtype=torch.float32, device=self.device)
+        logging.info("StreamingAggregator: allocated accumulator of %d parameters" % total)
@@ -1,6 +1,9 @@
 import json
+import logging
 import sys
 
+from .serializer import get_serializer, detect_serializer
+
 
 class Message(object):
 
@@ -35,6 +38,15 @@ class Message(object):
         self.receiver_id = self.msg_params[Message.MSG_ARG_KEY_RECEIVER]
         # print("msg_params = " + str(self.msg_params))
 
+    def init_from_payload(self, payload):
+        """
+            Decode a wire payload produced by to_payload(), whichever serializer the sender used.
+        """
+        self.msg_params = detect_serializer(payload).loads(payload)
+        self.type = self.msg_params[Message.MSG_ARG_KEY_TYPE]
+        self.sender_id = self.msg_params[Message.MSG_ARG_KEY_SENDER]
+        self.receiver_id = self.msg_params[Message.MSG_ARG_KEY_RECEIVER]
+
     def get_sender_id(self):
         return self.sender_id
 
@@ -51,7 +63,8 @@ class Message(object):
         self.msg_params[key] = value
 
     def get(self, key):
-        return self.msg_params[key]
+        # None for optional keys the sender did not add
+        return self.msg_params.get(key)
 
     def get_type(self):
         return self.msg_params[Message.MSG_ARG_KEY_TYPE]
@@ -60,10 +73,21 @@ class Message(object):
         return self.msg_params
 
     def to_json(self):
-        json_string = json.dumps(self.msg_params)
+        json_string = get_serializer("json").dumps(self.msg_params)
         print("json string size = " + str(sys.getsizeof(json_string)))
         return json_string
 
+    def to_payload(self, serializer="json"):
+        """
+            Encode the message with the given wire format ("json", "binary" or a serializer object).
+        """
+        serializer = get_serializer(serializer)
+        if serializer.name == "json":
+            return self.to_json()
+        payload = serializer.dumps(self.msg_params)
+        logging.info("%s payload size = %d" % (serializer.name, len(payload)))
+        return payload
+
     def get_content(self):
         print_dict = self.msg_params.copy()
         msg_str = str(self.__to_msg_type_string()) + ": " + str(print_dict)
@@ -0,0 +1,103 @@
+"""
+    Round-trip latency of MpiCommunicationManager.
+
+    Rank 0 (server) sends a message to rank 1 (client), which echoes it back;
+    the time between send_message() on the server and the echo reaching the
+    server's observer is recorded. Both ranks run in this process on top of
+    LocalComm, so no MPI installation is needed and the numbers isolate the
+    cost of the send/receive threads and the dispatch loop.
+
+    usage (from the FedML directory):
+        python -m fedml_core.distributed.communication.mpi.benchmark_latency --rounds 200
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import torch
+
+from ..message import Message
+from ..observer import Observer
+from .com_manager import MpiCommunicationManager
+from .local_comm import LocalComm
+
+MSG_TYPE_PING = 1
+MSG_TYPE_PONG = 2
+
+
+class EchoClient(Observer):
+    def __init__(self, com_manager, rank):
+        self.com_manager = com_manager
+        self.rank = rank
+
+    def receive_message(self, msg_type, msg_params) -> None:
+        if msg_type != MSG_TYPE_PING:
+            return
+        reply = Message(MSG_TYPE_PONG, self.rank, msg_params.get(Message.MSG_ARG_KEY_SENDER))
+        reply.add_params(Message.MSG_ARG_KEY_MODEL_PARAMS, msg_params.get(Message.MSG_ARG_KEY_MODEL_PARAMS))
+        self.com_manager.send_message(reply)
+
+
+class PingServer(Observer):
+    def __init__(self):
+        self.pong = threading.Event()
+
+    def receive_message(self, msg_type, msg_params) -> None:
+        if msg_type == MSG_TYPE_PONG:
+            self.pong.set()
+
+
+def run(rounds, payload_size, wire_format):
+    comms = LocalComm.create_world(2)
+    server = MpiCommunicationManager(comms[0], 0, 2, node_type="server", wire_format=wire_format)
+    client = MpiCommunicationManager(comms[1], 1, 2, node_type="client", wire_format=wire_format)
+
+    ping_server = PingServer()
+    server.add_observer(ping_server)
+    client.add_observer(EchoClient(client, 1))
+
+    loops = [threading.Thread(target=m.handle_receive_message, daemon=True) for m in [server, client]]
+    for t in loops:
+        t.start()
+
+    model_params = torch.zeros(payload_size)
+    latencies = []
+    for _ in range(rounds):
+        ping_server.pong.clear()
+        message = Message(MSG_TYPE_PING, 0, 1)
+        message.add_params(Message.MSG_ARG_KEY_MODEL_PARAMS, model_params)
+        start = time.perf_counter()
+        server.send_message(message)
+        ping_server.pong.wait()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    server.stop_receive_message()
+    client.stop_receive_message()
+    for t in loops:
+        t.join()
+    shutdown = time.perf_counter() - start
+
+    return np.array(latencies) * 1000.0, shutdown * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--payload_size', type=int, default=1000,
+                        help='number of float32 values carried by every message')
+    parser.add_argument('--wire_format', type=str, default='binary',
+                        help='json, binary, or none to send the raw params dict')
+    args = parser.parse_args()
+
+    wire_format = None if args.wire_format == 'none' else args.wire_format
+    latencies, shutdown = run(args.rounds, args.payload_size, wire_format)
+    print("round trips: %d, payload: %d floats, wire format: %s" % (args.rounds, args.payload_size, args.wire_format))
+    print("mean %.3f ms, p50 %.3f ms, p99 %.3f ms, max %.3f ms" % (
+        latencies.mean(), np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max()))
+    print("shutdown: %.3f ms" % shutdown)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,5 @@
 import logging
 import queue
-import time
 from typing import List
 
 from ..base_com_manager import BaseCommunicationManager
@@ -11,10 +10,17 @@ from ..observer import Observer
 
 
 class MpiCommunicationManager(BaseCommunicationManager):
-    def __init__(self, comm, rank, size, node_type="client"):
+    # wakes up handle_receive_message() when stop_receive_message() is called
+    _STOP = object()
+
+    # seconds to wait for a send/receive thread on shutdown, they are daemon threads
+    THREAD_JOIN_TIMEOUT = 10
+
+    def __init__(self, comm, rank, size, node_type="client", wire_format=None):
         self.comm = comm
         self.rank = rank
         self.size = size
+        self.wire_format = wire_format
 
         self._observers: List[Observer] = []
 
@@ -35,7 +41,8 @@ class MpiCommunicationManager(BaseCommunicationManager):
 
     def init_server_communication(self):
         server_send_queue = queue.Queue(0)
-        self.server_send_thread = MPISendThread(self.comm, self.rank, self.size, "ServerSendThread", server_send_queue)
+        self.server_send_thread = MPISendThread(self.comm, self.rank, self.size, "ServerSendThread", server_send_queue,
+                                                self.wire_format)
         self.server_send_thread.start()
 
         server_receive_queue = queue.Queue(0)
@@ -48,7 +55,8 @@ class MpiCommunicationManager(BaseCommunicationManager):
     def init_client_communication(self):
         # SEND
         client_send_queue = queue.Queue(0)
-        self.client_send_thread = MPISendThread(self.comm, self.rank, self.size, "ClientSendThread", client_send_queue)
+        self.client_send_thread = MPISendThread(self.comm, self.rank, self.size, "ClientSendThread", client_send_queue,
+                                                self.wire_format)
         self.client_send_thread.start()
 
         # RECEIVE
@@ -71,15 +79,16 @@ class MpiCommunicationManager(BaseCommunicationManager):
     def handle_receive_message(self):
         self.is_running = True
         while self.is_running:
-            if self.q_receiver.qsize() > 0:
-                msg_params = self.q_receiver.get()
-                self.notify(msg_params)
-
-            time.sleep(0.3)
+            # blocks until the receive thread hands over a message, no polling
+            msg_params = self.q_receiver.get()
+            if msg_params is self._STOP:
+                break
+            self.notify(msg_params)
         logging.info("!!!!!!handle_receive_message stopped!!!")
 
     def stop_receive_message(self):
         self.is_running = False
+        self.q_receiver.put(self._STOP)
         self.__stop_thread(self.server_send_thread)
         self.__stop_thread(self.server_receive_thread)
         self.__stop_thread(self.server_collective_thread)
@@ -94,5 +103,7 @@ class MpiCommunicationManager(BaseCommunicationManager):
 
     def __stop_thread(self, thread):
         if thread:
-            thread.raise_exception()
-            thread.join()
+            thread.stop()
+            thread.join(self.THREAD_JOIN_TIMEOUT)
+            if thread.is_alive():
+                logging.warning("%s did not stop within %d seconds" % (thread.name, self.THREAD_JOIN_TIMEOUT))
@@ -0,0 +1,103 @@
+import pickle
+import queue
+import threading
+import time
+
+
+class LocalRequest(object):
+    """ completed request returned by LocalComm.isend, mirrors mpi4py's Request.wait() """
+
+    def wait(self):
+        return None
+
+    def test(self):
+        return True, None
+
+
+class LocalComm(object):
+    """
+        In-process stand-in for an mpi4py communicator, one instance per rank.
+
+        Covers the calls the communication threads make (send, isend, recv,
+        Get_rank, Get_size), so MpiCommunicationManager can be exercised with
+        threads instead of MPI processes, e.g. for benchmarks. Objects are
+        pickled on send like mpi4py's lowercase methods do, set
+        pickle_messages=False to pass references instead.
+
+        latency (seconds) and bandwidth (bytes per second, None for no
+        limit) stand in for a network link: a message is delivered latency
+        after the sender's link has finished transmitting it, messages of a
+        sender are transmitted one after the other. Sizes are the ones of the
+        pickled or bytes payloads, references count as 0 bytes.
+
+        usage:
+            comms = LocalComm.create_world(2)
+            manager = MpiCommunicationManager(comms[0], 0, 2, node_type="server")
+    """
+
+    def __init__(self, rank, mailboxes, pickle_messages=True, latency=0.0, bandwidth=None):
+        self.rank = rank
+        self.mailboxes = mailboxes
+        self.pickle_messages = pickle_messages
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._link_free = 0.0
+        self._link_lock = threading.Lock()
+
+    @classmethod
+    def create_world(cls, size, pickle_messages=True, latency=0.0, bandwidth=None):
+        mailboxes = [queue.Queue(0) for _ in range(size)]
+        return [cls(rank, mailboxes, pickle_messages, latency, bandwidth) for rank in range(size)]
+
+    def Get_rank(self):
+        return self.rank
+
+    def Get_size(self):
+        return len(self.mailboxes)
+
+    def send(self, obj, dest, tag=0):
+        if self.pickle_messages:
+            obj = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        sent_at = time.perf_counter()
+        if self.bandwidth and isinstance(obj, (bytes, bytearray)):
+            with self._link_lock:
+                self._link_free = max(self._link_free, sent_at) + len(obj) / self.bandwidth
+                sent_at = self._link_free
+        self.mailboxes[dest].put((sent_at + self.latency, obj))
+
+    def isend(self, obj, dest, tag=0):
+        self.send(obj, dest, tag)
+        return LocalRequest()
+
+    def recv(self, buf=None, source=None, tag=None, status=None):
+        deliver_at, obj = self.mailboxes[self.rank].get()
+        # delivery times grow with the send order of a sender, waiting in arrival order is close enough
+        delay = deliver_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if self.pickle_messages:
+            obj = pickle.loads(obj)
+        return obj
+
+    def Barrier(self):
+        pass
+
+
+class LocalWorld(object):
+    """ runs one function per rank in its own thread and collects the return values """
+
+    def __init__(self, size, pickle_messages=True, latency=0.0, bandwidth=None):
+        self.comms = LocalComm.create_world(size, pickle_messages, latency, bandwidth)
+
+    def run(self, fn):
+        results = [None] * len(self.comms)
+
+        def target(rank):
+            results[rank] = fn(self.comms[rank], rank, len(self.comms))
+
+        threads = [threading.Thread(target=target, args=(rank,)) for rank in range(len(self.comms))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
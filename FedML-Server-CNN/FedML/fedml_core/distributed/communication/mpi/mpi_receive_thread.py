@@ -1,4 +1,3 @@
-import ctypes
 import logging
 import threading
 import traceback
@@ -7,9 +6,14 @@ from ..message import Message
 
 
 class MPIReceiveThread(threading.Thread):
+    # sent by a process to itself to release the blocking recv() on shutdown
+    STOP_MESSAGE = "__mpi_receive_thread_stop__"
+
     def __init__(self, comm, rank, size, name, q):
         super(MPIReceiveThread, self).__init__()
+        self.daemon = True
         self._stop_event = threading.Event()
+        self._stop_request = None
         self.comm = comm
         self.rank = rank
         self.size = size
@@ -20,31 +24,30 @@ class MPIReceiveThread(threading.Thread):
         logging.debug("Starting Thread:" + self.name + ". Process ID = " + str(self.rank))
         while True:
             try:
+                # blocks until a message arrives; stop() releases it with STOP_MESSAGE,
+                # which is always consumed here so the self-send can complete
                 msg_str = self.comm.recv()
+                if isinstance(msg_str, str) and msg_str == self.STOP_MESSAGE:
+                    break
                 msg = Message()
-                msg.init(msg_str)
+                if isinstance(msg_str, dict):
+                    msg.init(msg_str)
+                else:
+                    msg.init_from_payload(msg_str)
                 self.q.put(msg)
             except Exception:
                 traceback.print_exc()
+        logging.debug("Stopped Thread:" + self.name + ". Process ID = " + str(self.rank))
 
     def stop(self):
         self._stop_event.set()
+        self._stop_request = self.comm.isend(self.STOP_MESSAGE, dest=self.rank)
 
     def stopped(self):
         return self._stop_event.is_set()
 
-    def get_id(self):
-        # returns id of the respective thread
-        if hasattr(self, '_thread_id'):
-            return self._thread_id
-        for id, thread in threading._active.items():
-            if thread is self:
-                return id
-
-    def raise_exception(self):
-        thread_id = self.get_id()
-        res = ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id,
-                                                         ctypes.py_object(SystemExit))
-        if res > 1:
-            ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, 0)
-            print('Exception raise failure')
\ No newline at end of file
+    def join(self, timeout=None):
+        super(MPIReceiveThread, self).join(timeout)
+        if self._stop_request is not None and not self.is_alive():
+            self._stop_request.wait()
+            self._stop_request = None
@@ -9,10 +9,13 @@ import paho.mqtt.client as mqtt
 from ..base_com_manager import BaseCommunicationManager
 from ..message import Message
 from ..observer import Observer
+from .framing import PayloadFramer, FrameReassembler, TransferStats
 
 
 class MqttCommManager(BaseCommunicationManager):
-    def __init__(self, host, port, topic='fedml', client_id=0, client_num=0):
+    def __init__(self, host, port, topic='fedml', client_id=0, client_num=0, wire_format="json",
+                 compression="none", compression_level=None, chunk_size=0, max_pending_messages=0,
+                 max_pending_bytes=0):
         self._unacked_sub = list()
         self._observers: List[Observer] = []
         self._topic = topic
@@ -21,6 +24,13 @@ class MqttCommManager(BaseCommunicationManager):
         else:
             self._client_id = client_id
         self.client_num = client_num
+        # outgoing format only, incoming payloads are decoded whatever format the peer used
+        self.wire_format = wire_format
+        # outgoing compression / chunking (see framing.py), incoming frames are reassembled in any case
+        self._framer = PayloadFramer(compression, compression_level, chunk_size)
+        # the server reassembles the messages of its client_num clients at once, 0 limits are sized from that
+        self._reassembler = FrameReassembler.for_senders(client_num, max_pending_messages, max_pending_bytes)
+        self.stats = TransferStats()
         # Construct a Client
         self._client = mqtt.Client(client_id=str(self._client_id))
         self._client.on_connect = self._on_connect
@@ -70,9 +80,12 @@ class MqttCommManager(BaseCommunicationManager):
             print(result)
 
     def _on_message(self, client, userdata, msg):
-        msg.payload = str(msg.payload, encoding='utf-8')
         # print("_on_message: " + str(msg.payload))
-        self._notify(str(msg.payload))
+        payload, stats = self._reassembler.add(msg.payload, sender=msg.topic)
+        if payload is None:
+            return
+        self.stats.record(stats)
+        self._notify(payload)
 
     @staticmethod
     def _on_disconnect(client, userdata, rc):
@@ -91,7 +104,7 @@ class MqttCommManager(BaseCommunicationManager):
     def _notify(self, msg):
         # print("_notify: " + msg)
         msg_params = Message()
-        msg_params.init_from_json_string(str(msg))
+        msg_params.init_from_payload(msg)
         msg_type = msg_params.get_type()
         for observer in self._observers:
             observer.receive_message(msg_type, msg_params)
@@ -112,14 +125,19 @@ class MqttCommManager(BaseCommunicationManager):
             receiver_id = msg.get_receiver_id()
             topic = self._topic + str(0) + "_" + str(receiver_id)
             logging.info("topic = %s" % str(topic))
-            payload = msg.to_json()
-            self._client.publish(topic, payload=payload)
+            self._publish(topic, msg)
             logging.info("sent")
         else:
             # client
-            self._client.publish(self._topic + str(self.client_id), payload=msg.to_json())
+            self._publish(self._topic + str(self.client_id), msg)
             logging.info("published")
 
+    def _publish(self, topic, msg):
+        frames, stats = self._framer.encode(msg.to_payload(self.wire_format))
+        for frame in frames:
+            self._client.publish(topic, payload=frame)
+        self.stats.record(stats)
+
     def handle_receive_message(self):
         pass
 
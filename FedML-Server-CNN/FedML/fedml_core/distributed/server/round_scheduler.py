@@ -0,0 +1,194 @@
+import logging
+import math
+import random
+import threading
+import time
+
+import numpy as np
+
+
+class RoundScheduler(object):
+    """
+        Deadline, quorum and straggler bookkeeping of synchronous server rounds.
+
+        Every round, select() picks ceil(round_target * (1 + over_selection))
+        of the idle, non-evicted workers, so that round_target uploads are
+        reached even if some of them straggle. A round is complete as soon as
+        round_target uploads arrived (or every selected worker reported). When
+        the deadline passes first, the round closes with what has arrived if
+        that is at least min_quorum uploads; otherwise idle workers are added
+        to the round and the deadline is re-armed.
+
+        Selected workers that have not reported when a round closes are
+        stragglers: they stay busy (they are still training) and are not
+        selected until their late upload comes in, which is discarded. A
+        worker that straggles max_missed_rounds rounds in a row is evicted and
+        only readmitted if it reports again.
+
+        The dispatch -> upload latency of every upload is recorded;
+        latency_summary() gives its distribution, to tune round_target /
+        client_num_per_round for throughput.
+
+        Worker ids are the ranks of the clients (1 .. size - 1). The server
+        manager holds lock around its message handling, the deadline callback
+        runs with it held.
+    """
+
+    def __init__(self, worker_ids, round_target=0, over_selection=0.0, min_quorum=1, deadline=0,
+                 max_missed_rounds=0, seed=0):
+        self.worker_ids = list(worker_ids)
+        self.round_target = min(round_target, len(self.worker_ids)) if round_target else len(self.worker_ids)
+        self.over_selection = over_selection
+        self.min_quorum = max(1, min(min_quorum, self.round_target))
+        self.deadline = deadline
+        self.max_missed_rounds = max_missed_rounds
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+
+        self.round_idx = None
+        self.participants = set()
+        self.arrived = set()
+        self.dispatch_time = dict()
+        self.busy = set()
+        self.evicted = set()
+        self.missed_rounds = {worker_id: 0 for worker_id in self.worker_ids}
+        self.latencies = {worker_id: [] for worker_id in self.worker_ids}
+        self.round_durations = []
+        self.num_aggregated = 0
+        self.round_start = None
+        self.timer = None
+        self.on_deadline = None
+
+    @classmethod
+    def from_args(cls, args, worker_ids):
+        """ None unless args set a round deadline, target or over-selection """
+        deadline = getattr(args, "round_deadline", 0) or 0
+        round_target = getattr(args, "round_target", 0) or 0
+        over_selection = getattr(args, "round_over_selection", 0.0) or 0.0
+        if deadline <= 0 and round_target <= 0 and over_selection <= 0:
+            return None
+        return cls(worker_ids, round_target=round_target, over_selection=over_selection,
+                   min_quorum=getattr(args, "round_min_quorum", 1) or 1, deadline=deadline,
+                   max_missed_rounds=getattr(args, "max_missed_rounds", 0) or 0)
+
+    def select(self, exclude=()):
+        """ the workers of the next round, at most every idle, non-evicted one """
+        available = self.available(exclude)
+        num = min(len(available), int(math.ceil(self.round_target * (1.0 + self.over_selection))) - len(exclude))
+        return sorted(self.random.sample(available, max(0, num)))
+
+    def available(self, exclude=()):
+        return [w for w in self.worker_ids if w not in self.busy and w not in self.evicted and w not in exclude]
+
+    def start_round(self, round_idx, participants, on_deadline):
+        """ participants have been sent the global model; on_deadline(round_idx) fires when the deadline passes """
+        self.round_idx = round_idx
+        self.participants = set()
+        self.arrived = set()
+        self.round_start = time.time()
+        self.on_deadline = on_deadline
+        self.add_participants(participants)
+        self._arm_timer()
+
+    def add_participants(self, participants):
+        now = time.time()
+        for worker_id in participants:
+            self.participants.add(worker_id)
+            self.busy.add(worker_id)
+            self.dispatch_time[worker_id] = now
+
+    def record_upload(self, worker_id):
+        """ True if the upload belongs to the current round, False for a late or unexpected one """
+        dispatched = self.dispatch_time.pop(worker_id, None)
+        if dispatched is not None:
+            self.latencies.setdefault(worker_id, []).append(time.time() - dispatched)
+        self.busy.discard(worker_id)
+        if worker_id in self.evicted:
+            logging.info("worker %d reported again, readmitting it" % worker_id)
+            self.evicted.discard(worker_id)
+        self.missed_rounds[worker_id] = 0
+
+        if worker_id not in self.participants or worker_id in self.arrived:
+            logging.info("discarding a late upload of worker %d" % worker_id)
+            return False
+        self.arrived.add(worker_id)
+        return True
+
+    def round_complete(self):
+        return len(self.arrived) >= self.round_target or self.arrived == self.participants
+
+    def has_quorum(self):
+        return len(self.arrived) >= self.min_quorum
+
+    def top_up(self):
+        """ idle workers added to a round that has fewer participants than it should, e.g. after a late upload """
+        if self.round_idx is None:
+            return []
+        extra = self.select(exclude=self.participants)
+        self.add_participants(extra)
+        return extra
+
+    def extend(self):
+        """ deadline passed without quorum: every idle worker joins the round and the deadline is re-armed """
+        extra = self.available(exclude=self.participants)
+        self.add_participants(extra)
+        logging.warning("round %d: %d of %d uploads at the deadline, below the quorum of %d; adding workers %s" % (
+            self.round_idx, len(self.arrived), len(self.participants), self.min_quorum, extra))
+        self._arm_timer()
+        return extra
+
+    def close_round(self):
+        """ ends the round, returns its stragglers """
+        self._cancel_timer()
+        self.round_durations.append(time.time() - self.round_start)
+        self.num_aggregated += len(self.arrived)
+        stragglers = sorted(self.participants - self.arrived)
+        for worker_id in stragglers:
+            self.missed_rounds[worker_id] = self.missed_rounds.get(worker_id, 0) + 1
+            if self.max_missed_rounds and self.missed_rounds[worker_id] >= self.max_missed_rounds:
+                logging.warning("evicting worker %d after %d missed rounds" % (
+                    worker_id, self.missed_rounds[worker_id]))
+                self.evicted.add(worker_id)
+        logging.info("round %d closed: %d uploads, stragglers %s, %.2f s" % (
+            self.round_idx, len(self.arrived), stragglers, self.round_durations[-1]))
+        self.round_idx = None
+        self.participants = set()
+        return stragglers
+
+    def cancel(self):
+        self._cancel_timer()
+
+    def latency_summary(self):
+        """ dispatch -> upload latency distribution, overall and per worker, in seconds """
+        samples = np.asarray([v for values in self.latencies.values() for v in values], dtype=np.float64)
+        summary = {"uploads": int(len(samples)), "evicted": sorted(self.evicted)}
+        if len(samples):
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+            summary.update({"mean": float(samples.mean()), "p50": float(p50), "p90": float(p90),
+                            "p99": float(p99), "max": float(samples.max())})
+        if self.round_durations:
+            # aggregated uploads per second of round time
+            summary["round_mean"] = float(np.mean(self.round_durations))
+            summary["throughput"] = float(self.num_aggregated / np.sum(self.round_durations))
+        summary["workers"] = {worker_id: {"uploads": len(values), "mean": float(np.mean(values)),
+                                          "max": float(np.max(values))}
+                              for worker_id, values in self.latencies.items() if values}
+        return summary
+
+    def _arm_timer(self):
+        self._cancel_timer()
+        if self.deadline > 0:
+            self.timer = threading.Timer(self.deadline, self._fire, args=(self.round_idx,))
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    def _fire(self, round_idx):
+        with self.lock:
+            if round_idx != self.round_idx or self.on_deadline is None:
+                return
+            self.on_deadline(round_idx)
@@ -0,0 +1,92 @@
+"""
+    Round time of every defense of BatchedRobustAggregator on ResNet-56
+    uploads, against the per-upload norm_diff_clipping loop it replaces.
+
+    The uploads are the global model plus Gaussian noise, a few of them
+    scaled up as model replacement attacks. The per-upload loop clips one
+    state_dict at a time (flatten, norm, rebuild the dict) and averages the
+    dicts key by key; it only runs for norm_diff_clipping.
+
+    usage (from the FedML directory):
+        python -m fedml_core.robustness.benchmark_robust_aggregation --clients 100
+"""
+import argparse
+import time
+
+import torch
+
+from fedml_api.model.cv.resnet import resnet56
+from fedml_core.robustness.batched_robust_aggregation import BatchedRobustAggregator, DEFENSE_TYPES
+from fedml_core.robustness.robust_aggregation import is_weight_param
+
+
+def per_upload_clipping(global_params, uploads, sample_nums, norm_bound):
+    vec_global = torch.cat([v.reshape(-1) for k, v in global_params.items() if is_weight_param(k)])
+    clipped = []
+    for local_params in uploads:
+        diff = torch.cat([v.reshape(-1) for k, v in local_params.items() if is_weight_param(k)]) - vec_global
+        diff = diff / max(1, torch.norm(diff).item() / norm_bound)
+        local_clipped, offset = {}, 0
+        for k, v in local_params.items():
+            if is_weight_param(k):
+                local_clipped[k] = diff[offset:offset + v.numel()].view(v.size()) + global_params[k]
+                offset += v.numel()
+            else:
+                local_clipped[k] = v
+        clipped.append(local_clipped)
+    training_num = sum(sample_nums)
+    averaged = {}
+    for k in clipped[0].keys():
+        for i, local_params in enumerate(clipped):
+            w = sample_nums[i] / training_num
+            averaged[k] = local_params[k] * w if i == 0 else averaged[k] + local_params[k] * w
+    return averaged
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--attackers', type=int, default=5)
+    parser.add_argument('--chunk_size', type=int, default=1 << 24)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    global_params = resnet56(10).state_dict()
+    uploads, sample_nums = [], []
+    for i in range(args.clients):
+        scale = 20.0 if i < args.attackers else 1.0
+        uploads.append({k: v + scale * 0.01 * torch.randn_like(v) if v.is_floating_point() else v
+                        for k, v in global_params.items()})
+        sample_nums.append(100 + i)
+    num_params = sum(v.numel() for v in global_params.values())
+    print("ResNet-56, %d parameters, %d clients (%d attackers), update matrix %.0f MB" % (
+        num_params, args.clients, args.attackers, 4.0 * num_params * args.clients / 2 ** 20))
+
+    start = time.perf_counter()
+    reference = per_upload_clipping(global_params, uploads, sample_nums, 30.0)
+    print("%-20s %8.3f s" % ("per-upload clipping", time.perf_counter() - start))
+
+    for defense_type in DEFENSE_TYPES:
+        aggregator = BatchedRobustAggregator(defense_type, norm_bound=30.0 if "dp" in defense_type or
+                                             "clipping" in defense_type else None,
+                                             stddev=0.025 if defense_type == "weak_dp" else 0.0,
+                                             byzantine_num=args.attackers, krum_m=None if defense_type ==
+                                             "multi_krum" else 1, chunk_size=args.chunk_size)
+        aggregator.start_round(global_params, args.clients)
+        start = time.perf_counter()
+        for i, local_params in enumerate(uploads):
+            aggregator.add(i, local_params, sample_nums[i])
+        added = time.perf_counter()
+        result = aggregator.aggregate()
+        end = time.perf_counter()
+        line = "%-20s %8.3f s  (add %.3f s, aggregate %.3f s)" % (defense_type, end - start, added - start,
+                                                                 end - added)
+        if defense_type == "norm_diff_clipping":
+            line += "  max |diff| to the loop %.2e" % max(
+                (result[k].float() - reference[k].float()).abs().max().item() for k in reference)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
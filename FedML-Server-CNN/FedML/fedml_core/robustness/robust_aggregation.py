@@ -1,7 +1,10 @@
 import torch
 
 
-def vectorize_weight(state_dict):
+def vectorize_weight(state_dict, layout=None):
+    if torch.is_tensor(state_dict):
+        # flat parameter buffer: the weights are its prefix, no concatenation needed
+        return state_dict[:layout.weight_numel] if layout is not None else state_dict
     weight_list = []
     for (k, v) in state_dict.items():
         if is_weight_param(k):
@@ -9,10 +12,16 @@ def vectorize_weight(state_dict):
     return torch.cat(weight_list)
 
 
-def load_model_weight_diff(local_state_dict, weight_diff, global_state_dict):
+def load_model_weight_diff(local_state_dict, weight_diff, global_state_dict, layout=None):
     """
     load rule: w_t + clipped(w^{local}_t - w_t)
     """
+    if torch.is_tensor(local_state_dict):
+        # flat parameter buffer: rebuild the weight prefix, keep the local buffers
+        weight_numel = layout.weight_numel if layout is not None else local_state_dict.numel()
+        recons_local_flat = local_state_dict.clone()
+        torch.add(global_state_dict[:weight_numel], weight_diff, out=recons_local_flat[:weight_numel])
+        return recons_local_flat
     recons_local_state_dict = {}
     index_bias = 0
     for item_index, (k, v) in enumerate(local_state_dict.state_dict().items()):
@@ -30,14 +39,16 @@ def is_weight_param(k):
 
 
 class RobustAggregator(object):
-    def __init__(self, args):
+    def __init__(self, args, layout=None):
+        # FlatParamLayout of the model when updates are flat parameter buffers
+        self.layout = layout
         self.defense_type = args.defense_type
         self.norm_bound = args.norm_bound  # for norm diff clipping and weak DP defenses
         self.stddev = args.stddev  # for weak DP defenses
 
     def norm_diff_clipping(self, local_state_dict, global_state_dict):
-        vec_local_weight = vectorize_weight(local_state_dict)
-        vec_global_weight = vectorize_weight(global_state_dict)
+        vec_local_weight = vectorize_weight(local_state_dict, self.layout)
+        vec_global_weight = vectorize_weight(global_state_dict, self.layout)
 
         # clip the norm diff
         vec_diff = vec_local_weight - vec_global_weight
@@ -45,7 +56,8 @@ class RobustAggregator(object):
         clipped_weight_diff = vec_diff / max(1, weight_diff_norm / self.norm_bound)
         clipped_local_state_dict = load_model_weight_diff(local_state_dict,
                                                           clipped_weight_diff,
-                                                          global_state_dict)
+                                                          global_state_dict,
+                                                          self.layout)
         return clipped_local_state_dict
 
     def add_noise(self, local_weight, device):
@@ -0,0 +1,166 @@
+import copy
+from collections import OrderedDict
+
+import torch
+
+
+class FlatParamLayout(object):
+    """
+        Cached index of a model's tensors inside one contiguous 1-D float32 buffer.
+
+        index: name -> (offset, numel, shape, dtype), in buffer order.
+        When the layout is built from a module, parameters come first and buffers
+        after them, so the trainable weights are the prefix flat[:weight_numel].
+    """
+
+    def __init__(self, entries, weight_numel=None):
+        self.index = OrderedDict()
+        offset = 0
+        for name, shape, dtype in entries:
+            numel = 1
+            for dim in shape:
+                numel *= dim
+            self.index[name] = (offset, numel, torch.Size(shape), dtype)
+            offset += numel
+        self.numel = offset
+        self.weight_numel = offset if weight_numel is None else weight_numel
+
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        return cls([(k, v.shape, v.dtype) for k, v in state_dict.items()])
+
+    @classmethod
+    def from_module(cls, module):
+        """
+            Floating point parameters and buffers only: integer buffers such as
+            BatchNorm's num_batches_tracked are local counters and stay out of the buffer.
+        """
+        params = [(k, v.shape, v.dtype) for k, v in module.named_parameters()]
+        buffers = [(k, v.shape, v.dtype) for k, v in module.named_buffers() if v.is_floating_point()]
+        weight_numel = sum(v.numel() for _, v in module.named_parameters())
+        return cls(params + buffers, weight_numel)
+
+    def names(self):
+        return list(self.index.keys())
+
+    def flatten(self, state_dict, out=None):
+        if out is None:
+            out = torch.empty(self.numel, dtype=torch.float32)
+        for k, (offset, numel, shape, dtype) in self.index.items():
+            out[offset:offset + numel].copy_(state_dict[k].detach().reshape(-1))
+        return out
+
+    def unflatten(self, flat):
+        """
+            name -> tensor. Float32 entries are views into flat, other dtypes are cast copies.
+        """
+        state_dict = OrderedDict()
+        for k, (offset, numel, shape, dtype) in self.index.items():
+            state_dict[k] = flat[offset:offset + numel].view(shape).to(dtype)
+        return state_dict
+
+
+def weighted_average(flats, sample_nums, out=None):
+    """
+        sum_i flats[i] * sample_nums[i] / sum(sample_nums) for flat buffers
+        (or the rows of a matrix), accumulated in order with the float32
+        multiply-then-add of the state_dict FedAvg aggregation, so that the
+        result is bitwise the one it gives per tensor.
+    """
+    training_num = sum(sample_nums)
+    weighted = None
+    for i, sample_num in enumerate(sample_nums):
+        w = sample_num / training_num
+        if i == 0:
+            out = torch.mul(flats[0], w) if out is None else torch.mul(flats[0], w, out=out)
+        else:
+            if weighted is None:
+                weighted = torch.empty_like(out)
+            torch.mul(flats[i], w, out=weighted)
+            out.add_(weighted)
+    return out
+
+
+class FlatParamsMixin(object):
+    """
+        Optional "flat parameter" mode for nn.Module subclasses.
+
+        After enable_flat_params(), every floating point parameter and buffer is a
+        view into self.flat_params, a single contiguous 1-D tensor, and
+        self.flat_layout maps names to their position. Snapshots, averaging,
+        diffing and transmission of the model are then single-buffer operations.
+
+        The optimizer keeps working since the Parameter objects are unchanged,
+        only their .data is rebound. Moving the module to another device rebuilds
+        the buffer there; deepcopy returns a flat copy.
+
+        Must come before nn.Module in the bases so that _apply is overridden.
+    """
+
+    def enable_flat_params(self):
+        layout = FlatParamLayout.from_module(self)
+        tensors = dict(self.named_parameters())
+        tensors.update(dict(self.named_buffers()))
+
+        device = next(iter(tensors.values())).device
+        flat = torch.empty(layout.numel, dtype=torch.float32, device=device)
+        for k, (offset, numel, shape, dtype) in layout.index.items():
+            view = flat[offset:offset + numel].view(shape)
+            view.copy_(tensors[k].detach())
+            self._rebind_tensor(k, view)
+
+        self._flat_params = flat
+        self._flat_layout = layout
+        return self
+
+    @property
+    def flat_params(self):
+        return getattr(self, "_flat_params", None)
+
+    @property
+    def flat_layout(self):
+        return getattr(self, "_flat_layout", None)
+
+    def is_flat(self):
+        return self.flat_params is not None
+
+    def get_flat_params(self, device=None):
+        """ a detached snapshot of every floating point parameter and buffer, optionally on another device """
+        flat = self.flat_params.detach()
+        return flat.to(flat.device if device is None else device, copy=True)
+
+    def set_flat_params(self, flat):
+        with torch.no_grad():
+            self.flat_params.copy_(flat.reshape(-1))
+
+    def _apply(self, fn, *args, **kwargs):
+        module = super(FlatParamsMixin, self)._apply(fn, *args, **kwargs)
+        if self.is_flat():
+            first = next(self.parameters())
+            if first.device != self._flat_params.device or \
+                    first.data_ptr() != self._flat_params.data_ptr():
+                # device change: the parameters are no longer views into the buffer
+                self.enable_flat_params()
+        return module
+
+    def __deepcopy__(self, memo):
+        # the default deepcopy clones every parameter on its own, so the copy has to be re-flattened
+        self.__deepcopy__ = None
+        try:
+            copied = copy.deepcopy(self, memo)
+        finally:
+            del self.__deepcopy__
+        del copied.__deepcopy__
+        if copied.is_flat():
+            copied.enable_flat_params()
+        return copied
+
+    def _rebind_tensor(self, name, value):
+        module = self
+        if "." in name:
+            module_path, name = name.rsplit(".", 1)
+            module = self.get_submodule(module_path)
+        if name in module._parameters:
+            module._parameters[name].data = value
+        else:
+            module._buffers[name] = value
@@ -94,6 +94,21 @@ def add_args(parser):
     parser.add_argument('--test', action='store_true',
                         help='test mode, only run 1-2 epochs to test the bug of the program')
 
+    # server feature store
+    parser.add_argument('--feature_store', default=0, type=int,
+                        help='keep the uploaded features in contiguous per-client arrays and train the server '
+                             'model on shuffled batches of all of them')
+    parser.add_argument('--feature_store_dtype', default="float32", type=str,
+                        help='feature storage type: float32 or float16')
+    parser.add_argument('--feature_store_ram_mb', default=0, type=float,
+                        help='RAM budget of the feature store in MB, past it features are memory-mapped (0: no limit)')
+    parser.add_argument('--feature_store_dir', default="", type=str,
+                        help='directory of the memory-mapped features, a temporary one by default')
+    parser.add_argument('--server_batch_size', default=0, type=int,
+                        help='batch size of the server model on the feature store (0: --batch_size)')
+    parser.add_argument('--feature_prefetch', default=2, type=int,
+                        help='batches the feature store loader prepares ahead')
+
     parser.add_argument('--gpu_num_per_server', type=int, default=8,
                         help='gpu_num_per_server')
 
@@ -54,6 +54,13 @@ def add_args(parser):
     parser.add_argument('--epochs', type=int, default=5, metavar='EP',
                         help='how many epochs will be trained locally')
 
+    parser.add_argument('--micro_batches', type=int, default=0, metavar='K',
+                        help='pipelined protocol: micro-batches in flight per batch, all clients train at once '
+                             '(0: lockstep protocol, one client at a time)')
+
+    parser.add_argument('--splitnn_payload', type=str, default='float32',
+                        help='pipelined protocol: activation and gradient encoding, float32, float16 or int8')
+
     parser.add_argument('--local_points', type=int, default=5000, metavar='LP',
                         help='the approximate fixed number of data points we will have on each local worker')
 
@@ -1,6 +1,8 @@
 
+import io
 import logging
 import os
+import re
 import sys
 
 import argparse
@@ -24,11 +26,13 @@ from FedML.fedml_api.data_preprocessing.load_data import load_partition_data
 from FedML.fedml_api.data_preprocessing.load_data import load_partition_data_shakespeare
 from FedML.fedml_api.data_preprocessing.load_data import load_partition_data_HAR
 from FedML.fedml_api.data_preprocessing.load_data import load_partition_data_HPWREN
+from FedML.fedml_api.data_preprocessing.partition_plan import PartitionPlanCache, plan_key
+from FedML.fedml_api.data_preprocessing.tensor_cache import TensorCache
 
 
 from FedML.fedml_core.distributed.communication.observer import Observer
 
-from flask import Flask, request, jsonify, send_from_directory, abort
+from flask import Flask, Response, request, jsonify, send_from_directory, abort
 
 from FedML.fedml_api.model.Baseline.FashionMNIST import FashionMNIST_Net
 from FedML.fedml_api.model.Baseline.MNIST import MNIST_Net
@@ -128,6 +132,108 @@ def add_args(parser):
     parser.add_argument('--mqtt_port', type=int, default=61613,
                         help='host port in MQTT')
 
+    parser.add_argument('--wire_format', type=str, default='binary',
+                        choices=['binary', 'json'],
+                        help='message encoding for model payloads, json is the legacy fallback')
+
+    parser.add_argument('--flat_params', type=int, default=0,
+                        help='keep the model in one contiguous parameter buffer and exchange it as a single tensor')
+
+    parser.add_argument('--mqtt_compression', type=str, default='none',
+                        help='compression of MQTT payloads: none, zlib, bz2, lzma (or lz4 when installed)')
+
+    parser.add_argument('--mqtt_compression_level', type=int, default=None,
+                        help='compression level, the default of the method when not set')
+
+    parser.add_argument('--mqtt_chunk_size', type=int, default=0,
+                        help='split MQTT payloads into frames of at most this many bytes, 0 to publish them whole')
+
+    parser.add_argument('--mqtt_max_pending_messages', type=int, default=0,
+                        help='partially received chunked messages kept per receiver, '
+                             '0 for two per client of the round (at least 16)')
+
+    parser.add_argument('--mqtt_max_pending_mb', type=int, default=0,
+                        help='MB of frames of partially received messages kept per receiver, 0 for 512')
+
+    parser.add_argument('--delta_updates', type=int, default=0,
+                        help='exchange model deltas against the last synced global model instead of full models')
+
+    parser.add_argument('--delta_quantize_bits', type=int, default=0, choices=[0, 4, 8],
+                        help='quantize the deltas to 8 or 4 bits with a per-tensor scale, 0 keeps float32')
+
+    parser.add_argument('--delta_topk_ratio', type=float, default=0.0,
+                        help='only send this fraction of the delta entries with the largest magnitude, 0 for dense')
+
+    parser.add_argument('--delta_error_feedback', type=int, default=1,
+                        help='carry the compression error of the deltas over to the next round')
+
+    parser.add_argument('--aggregation_mode', type=str, default='sync', choices=['sync', 'async', 'semi_sync'],
+                        help='sync: wait for every client; async: merge every upload on arrival; '
+                             'semi_sync: close a round after semi_sync_k uploads or round_deadline seconds')
+
+    parser.add_argument('--async_alpha', type=float, default=0.0,
+                        help='mixing weight of a fresh upload, 0 for the default (0.6 async, 1.0 semi_sync)')
+
+    parser.add_argument('--staleness_function', type=str, default='polynomial',
+                        choices=['constant', 'polynomial', 'hinge'],
+                        help='discount of stale uploads')
+
+    parser.add_argument('--staleness_a', type=float, default=0.5,
+                        help='exponent of the polynomial / slope of the hinge staleness discount')
+
+    parser.add_argument('--staleness_b', type=int, default=4,
+                        help='staleness up to which the hinge discount is 1')
+
+    parser.add_argument('--max_staleness', type=int, default=-1,
+                        help='drop uploads trained from a global model more versions old, -1 to keep all')
+
+    parser.add_argument('--semi_sync_k', type=int, default=0,
+                        help='uploads that close a semi_sync round, 0 for client_num_per_round')
+
+    parser.add_argument('--round_deadline', type=float, default=0,
+                        help='seconds after which a round closes with the uploads it has (sync: at least '
+                             'round_min_quorum of them), 0 for none')
+
+    parser.add_argument('--round_target', type=int, default=0,
+                        help='sync: uploads that complete a round, 0 for every client')
+
+    parser.add_argument('--round_over_selection', type=float, default=0.0,
+                        help='sync: select this fraction more clients than round_target per round')
+
+    parser.add_argument('--round_min_quorum', type=int, default=1,
+                        help='sync: uploads needed to aggregate at the deadline, more clients are added below it')
+
+    parser.add_argument('--max_missed_rounds', type=int, default=0,
+                        help='sync: evict clients that missed this many rounds in a row, 0 to keep them')
+
+    parser.add_argument('--partition_seed', type=int, default=0,
+                        help='seed of the data partition')
+
+    parser.add_argument('--partition_plan_dir', type=str, default='./partition_plans/',
+                        help='directory the partition plans are stored in and served from, empty to partition '
+                             'without a plan')
+
+    parser.add_argument('--pretransformed', type=int, default=0,
+                        help='normalize mnist / fashionmnist / cifar10 once and serve tensor batches')
+
+    parser.add_argument('--pretransformed_storage', type=str, default='float32', choices=['float32', 'float16'],
+                        help='dtype the normalized images are kept in')
+
+    parser.add_argument('--pretransformed_dir', type=str, default='',
+                        help='directory to keep the normalized images in as memory-mapped files, empty for RAM')
+
+    parser.add_argument('--pretransformed_augment', type=int, default=1,
+                        help='apply the random train transforms batch-wise')
+
+    parser.add_argument('--eval_cache', type=int, default=0,
+                        help='cache the selected test batches as tensors for the server side evaluation')
+
+    parser.add_argument('--eval_batch_size', type=int, default=0,
+                        help='batch size of the cached evaluation, 0 for 1024 on GPU / the loader batch size on CPU')
+
+    parser.add_argument('--eval_async', type=int, default=0,
+                        help='evaluate a snapshot of the global model while the next round is broadcast')
+
     parser.add_argument('--server_ip', type=str, default='132.239.17.132',
                         help='server IP in Flask')
 
@@ -158,6 +264,15 @@ args = add_args(parser)
 device_id_to_client_id_dict = dict()
 
 
+def get_partition_plan_key(args):
+    # only the partitioned datasets have a plan; LEAF datasets come partitioned by user
+    if not args.partition_plan_dir or args.dataset not in ("mnist", "fashionmnist", "cifar10"):
+        return None
+    return plan_key(args.dataset, args.partition_method, args.partition_label, args.partition_alpha,
+                    args.partition_secondary, args.partition_min_cls, args.partition_max_cls,
+                    args.client_num_in_total, args.data_size_per_client, args.partition_seed)
+
+
 @app.route('/', methods=['GET'])
 def index():
     return 'backend service for Fed_mobile'
@@ -176,6 +291,23 @@ def get_preprocessed_data(dataset_name):
         abort(404)
 
 
+@app.route('/get-partition-plan/<plan_key>/<int:client_idx>', methods=['GET'])
+def get_partition_plan(plan_key, client_idx):
+    """ the sample indexes of one client as a .npy file """
+    if not args.partition_plan_dir or not re.fullmatch('[0-9a-f]+', plan_key):
+        abort(404)
+    cache = PartitionPlanCache(args.partition_plan_dir)
+    if not cache.exists(plan_key):
+        abort(404)
+    try:
+        indices = cache.client_slice(plan_key, client_idx)
+    except IndexError:
+        abort(404)
+    buffer = io.BytesIO()
+    np.save(buffer, indices)
+    return Response(buffer.getvalue(), mimetype='application/octet-stream')
+
+
 @app.route('/api/register', methods=['POST'])
 def register_device():
     global device_id_to_client_id_dict
@@ -199,6 +331,10 @@ def register_device():
                           "weight_decay": args.weight_decay,
                           'partition_min_cls' : args.partition_min_cls,
                           'partition_max_cls': args.partition_max_cls,
+                          'partition_seed': args.partition_seed,
+                          'pretransformed': args.pretransformed,
+                          'pretransformed_storage': args.pretransformed_storage,
+                          'pretransformed_augment': args.pretransformed_augment,
                           "client_num_per_round": args.client_num_per_round,
                           "client_num_in_total": args.client_num_in_total,
 
@@ -218,7 +354,23 @@ def register_device():
 
                           'backend': args.backend,
                           'mqtt_host': args.mqtt_host,
-                          'mqtt_port': args.mqtt_port}
+                          'mqtt_port': args.mqtt_port,
+                          'wire_format': args.wire_format,
+                          'flat_params': args.flat_params,
+                          'mqtt_compression': args.mqtt_compression,
+                          'mqtt_compression_level': args.mqtt_compression_level,
+                          'mqtt_chunk_size': args.mqtt_chunk_size,
+                          'delta_updates': args.delta_updates,
+                          'delta_quantize_bits': args.delta_quantize_bits,
+                          'delta_topk_ratio': args.delta_topk_ratio,
+                          'delta_error_feedback': args.delta_error_feedback}
+
+    partition_plan_key = get_partition_plan_key(args)
+    if partition_plan_key is not None:
+        # the client downloads its slice of the plan instead of partitioning the dataset itself
+        training_task_args['partition_plan_url'] = '{}get-partition-plan/{}/{}'.format(
+            request.url_root, partition_plan_key, client_id - 1)
+        training_task_args['train_data_num'] = args.client_num_in_total * args.data_size_per_client
 
 
     return jsonify({"errno": 0,
@@ -283,7 +435,10 @@ def load_data(args, dataset_name):
                                 args.partition_label, args.partition_alpha, args.partition_secondary,
                                 args.partition_min_cls, args.partition_max_cls,
                                 args.client_num_in_total, args.batch_size,
-                                args.data_size_per_client)
+                                args.data_size_per_client,
+                                partition_seed=args.partition_seed,
+                                partition_plan_dir=args.partition_plan_dir or None,
+                                tensor_cache=TensorCache.from_args(args))
         print(
             "================================={} loaded===============================#".format(
                 args.dataset))